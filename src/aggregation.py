@@ -0,0 +1,201 @@
+"""Flat-buffer aggregation with vectorized robust aggregators.
+
+fluke's `Server.aggregate` averages the client models tensor by tensor, one
+client at a time: a Python loop of ``clients x tensors`` in-place additions.
+`FlatAggregationMixin` instead works on one ``[clients x parameters]``
+matrix. Every client model's parameters are re-backed, the first time it is
+aggregated, by a single contiguous vector (`flat_parameters`). Training,
+``load_state_dict`` and the optimizers all update parameters in place, so the
+backing survives from round to round and a client model is read as one
+vector, without a per-tensor loop. The vectors are stacked into a matrix kept
+by the server between rounds, and aggregated in a few vectorized operations:
+
+* ``fedavg``: the weighted average, a single matrix-vector product with the
+  clients' weights (``weighted`` data sizes, as in fluke). It is fluke's
+  aggregation up to floating-point summation order.
+* ``median``: the coordinate-wise median (the mean of the two middle values
+  for an even number of clients).
+* ``trimmed_mean``: the coordinate-wise mean without the ``trim_ratio``
+  largest and smallest values of every coordinate (the sum minus two
+  ``topk``, rather than a full sort).
+* ``krum`` [Blanchard et al., 2017]: the model whose summed squared distance
+  to its ``n - byzantine - 2`` nearest neighbours is smallest, from one Gram
+  matrix of the rows; ``multi_krum`` > 1 averages that many best-scored models.
+  The Gram matrix makes it quadratic in the number of clients.
+
+The last three ignore the clients' weights: a site with a lot of data, or one
+claiming to have it, must not be able to outvote the others. The result is
+applied as fluke does, ``global.lerp(aggregate, lr)``. Buffers (e.g. batch
+normalization statistics) are averaged with the clients' weights, and
+``num_batches_tracked`` takes the maximum, as in fluke.
+"""
+
+from typing import Iterable, Optional, Sequence
+
+import torch
+from fluke import DDict
+from fluke.client import Client
+
+
+def fedavg(updates: torch.Tensor, weights: torch.Tensor, **_) -> torch.Tensor:
+    return weights @ updates
+
+
+def median(updates: torch.Tensor, weights: torch.Tensor, **_) -> torch.Tensor:
+    lower = updates.median(dim=0).values
+    if updates.shape[0] % 2:
+        return lower
+    # torch's median is the lower middle value; the upper one is minus that of -updates
+    return (lower - (-updates).median(dim=0).values) / 2
+
+
+def trimmed_mean(
+    updates: torch.Tensor, weights: torch.Tensor, trim_ratio: float = 0.1, **_
+) -> torch.Tensor:
+    n = updates.shape[0]
+    k = int(n * trim_ratio)
+    if n - 2 * k < 1:
+        raise ValueError(f"trim_ratio={trim_ratio} trims all of the {n} clients")
+    if k == 0:
+        return updates.mean(dim=0)
+    # Clients along the contiguous dimension: topk is faster there
+    by_coordinate = updates.T.contiguous()
+    largest = by_coordinate.topk(k, dim=1).values.sum(dim=1)
+    smallest = by_coordinate.topk(k, dim=1, largest=False).values.sum(dim=1)
+    return (by_coordinate.sum(dim=1) - largest - smallest) / (n - 2 * k)
+
+
+def krum_scores(updates: torch.Tensor, byzantine: int) -> torch.Tensor:
+    """Summed squared distance of every row to its ``n - byzantine - 2`` nearest other rows."""
+    n = updates.shape[0]
+    neighbours = n - byzantine - 2
+    if neighbours < 1:
+        raise ValueError(f"Krum needs more than byzantine + 2 clients ({n} for byzantine={byzantine})")
+    squared = (updates * updates).sum(dim=1)
+    distances = (squared[:, None] + squared[None, :] - 2 * updates @ updates.T).clamp_min_(0)
+    distances.fill_diagonal_(0)
+    # The nearest neighbours are the n - 1 others but the byzantine + 1 farthest
+    return distances.sum(dim=1) - distances.topk(byzantine + 1, dim=1).values.sum(dim=1)
+
+
+def krum(
+    updates: torch.Tensor, weights: torch.Tensor, byzantine: int = 1, multi_krum: int = 1, **_
+) -> torch.Tensor:
+    selected = krum_scores(updates, byzantine).topk(multi_krum, largest=False).indices
+    return updates[selected].mean(dim=0)
+
+
+AGGREGATORS = {
+    "fedavg": fedavg,
+    "median": median,
+    "trimmed_mean": trimmed_mean,
+    "krum": krum,
+}
+
+
+def flat_parameters(model: torch.nn.Module) -> torch.Tensor:
+    """One contiguous vector whose slices are ``model``'s parameters.
+
+    The first call copies the parameters into a new vector and points them
+    (``param.data``) at its slices. Later calls return the same vector for as
+    long as the parameters still live there, checked from their storage
+    addresses only (no module traversal). Parameters must therefore be updated
+    in place or through ``.data`` (as training, ``load_state_dict`` and
+    ``.to()`` do); a module attribute replaced by a new `Parameter` goes unnoticed.
+    """
+    views = model.__dict__.get("_flat_views")
+    if views is not None and tuple(p.data_ptr() for p in views) == model._flat_pointers:
+        return model._flat_parameters
+
+    params = list(model.parameters())
+    flat = torch.cat([p.detach().reshape(-1) for p in params])
+    offset = 0
+    for p in params:
+        p.data = flat[offset : offset + p.numel()].view_as(p)
+        offset += p.numel()
+    model._flat_parameters = flat
+    model._flat_views = tuple(params)
+    model._flat_pointers = tuple(p.data_ptr() for p in params)
+    return flat
+
+
+@torch.no_grad()
+def aggregate_flat(
+    target: torch.nn.Module,
+    models: Iterable[torch.nn.Module],
+    weights: Sequence[float],
+    lr: float,
+    aggregation: DDict,
+    out: Optional[torch.Tensor] = None,
+) -> torch.Tensor:
+    """Aggregate ``models`` into ``target`` in place, like fluke's `aggregate_models`.
+
+    Args:
+        target: The global model.
+        models: The client models, one per weight.
+        weights: The clients' aggregation weights (summing to 1).
+        lr: The server learning rate: ``target`` moves to ``lr`` of the way to the aggregate.
+        aggregation: The aggregator's configuration (see `FlatAggregationMixin`).
+        out: A ``[clients x parameters]`` matrix to stack the client models into
+            (reused across rounds; allocated when ``None`` or of another shape).
+
+    Returns:
+        torch.Tensor: The matrix of the client models, for reuse as ``out``.
+    """
+    flat = flat_parameters(target)
+    buffer_names = [name for name, _ in target.named_buffers()]
+    rows, buffers = [], []
+    for model in models:
+        rows.append(flat_parameters(model).to(flat.device))
+        if buffer_names:
+            buffers.append(dict(model.named_buffers()))
+    shape = (len(rows), flat.numel())
+    if out is None or out.shape != shape or out.dtype != flat.dtype or out.device != flat.device:
+        out = torch.empty(shape, dtype=flat.dtype, device=flat.device)
+    updates = torch.stack(rows, out=out)
+
+    weights = torch.tensor(weights, dtype=updates.dtype, device=updates.device)
+    aggregated = AGGREGATORS[aggregation.method](
+        updates,
+        weights,
+        trim_ratio=aggregation.trim_ratio,
+        byzantine=aggregation.byzantine,
+        multi_krum=aggregation.multi_krum,
+    )
+
+    flat.lerp_(aggregated, lr)
+
+    for name, buffer in target.named_buffers():
+        values = [b[name] for b in buffers]
+        if "num_batches_tracked" in name:
+            buffer.fill_(max(int(v) for v in values))
+        else:
+            average = sum(w * v.to(buffer.device) for w, v in zip(weights.tolist(), values))
+            buffer.lerp_(average, lr)
+    return updates
+
+
+class FlatAggregationMixin:
+    """Server mixin aggregating a ``[clients x parameters]`` matrix (see the module docstring).
+
+    Args:
+        aggregation: ``DDict(method="fedavg", trim_ratio=0.1, byzantine=1, multi_krum=1)``;
+            ``method`` is one of `AGGREGATORS`.
+    """
+
+    def __init__(self, *args, aggregation: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        cfg = DDict(method="fedavg", trim_ratio=0.1, byzantine=1, multi_krum=1)
+        cfg.update(aggregation or {})
+        if cfg.method not in AGGREGATORS:
+            raise ValueError(
+                f"Unknown aggregation {cfg.method!r} (expected one of {list(AGGREGATORS)})"
+            )
+        self.aggregation = cfg
+        self._updates: Optional[torch.Tensor] = None
+
+    def aggregate(self, eligible: Sequence[Client], client_models: Iterable) -> None:
+        weights = self._get_client_weights(eligible)
+        self._updates = aggregate_flat(
+            self.model, client_models, weights, self.hyper_params.lr, self.aggregation, self._updates
+        )
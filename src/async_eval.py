@@ -0,0 +1,119 @@
+"""Global-model evaluation in a background thread.
+
+With ``eval_every=1`` fluke's `Server` scores the test set at the end of every
+round before the next one can start. `AsyncEvalMixin` instead snapshots the
+global model (a deep copy) and submits its evaluation to a single worker
+thread, and the next round starts straight away. A thread rather than a
+process shares the evaluator and the test set without pickling them, and the
+torch kernels release the GIL while they run.
+
+Results are delivered on the server thread, in round order, as the usual
+``server_evaluation`` events carrying the round they were computed for: any
+finished evaluation at the start of the next one, and all of them when
+training ends (before ``finished`` is notified). At most ``eval_queue_size``
+snapshots are in flight; the server waits for the oldest one beyond that.
+Observers that report at ``end_round`` therefore see a round's global metrics
+only later, but the metrics tracker records them under the right round.
+
+The worker uses its own copy of the evaluator, so its metric objects are
+never shared with evaluations on the server thread (e.g. the final one in
+`run_experiment`), and its own shallow copy of the test loader for every
+job, so iterating it does not race with the server thread. Client-side
+("locals") evaluation stays synchronous.
+"""
+
+import copy
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Optional, Sequence, Tuple
+
+from fluke import FlukeENV
+from fluke.client import Client
+from fluke.evaluation import Evaluator
+
+
+class AsyncEvalMixin:
+    """Server mixin evaluating the global model in a background thread.
+
+    Args:
+        eval_queue_size: Maximum number of model snapshots awaiting evaluation.
+    """
+
+    def __init__(self, *args, eval_queue_size: int = 2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.eval_queue_size = max(1, eval_queue_size)
+        self._eval_executor: Optional[ThreadPoolExecutor] = None
+        self._eval_evaluator: Optional[Evaluator] = None
+        self._pending_evals: Deque[Tuple[int, Future]] = deque()
+
+    def _deliver_evaluations(self, wait: int = 0) -> None:
+        """Notify the finished evaluations in round order, waiting for the ``wait`` oldest."""
+        while self._pending_evals:
+            round, future = self._pending_evals[0]
+            if wait <= 0 and not future.done():
+                break
+            evals = future.result()
+            self._pending_evals.popleft()
+            wait -= 1
+            if evals:
+                self.notify(event="server_evaluation", round=round, eval_type="global", evals=evals)
+
+    def flush_evaluations(self) -> None:
+        """Wait for every in-flight evaluation and deliver its results."""
+        self._deliver_evaluations(wait=len(self._pending_evals))
+
+    def _submit_evaluation(self, evaluator: Evaluator, round: int) -> None:
+        if self.test_set is None:
+            return
+        if self._eval_executor is None:
+            self._eval_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="eval")
+            self._eval_evaluator = copy.deepcopy(evaluator)
+
+        overflow = len(self._pending_evals) - self.eval_queue_size + 1
+        self._deliver_evaluations(wait=overflow)
+
+        snapshot = copy.deepcopy(self.model)
+        # A shallow copy of the loader: the job iterates it while the server thread
+        # may iterate the original (e.g. the clients' "locals" evaluation). Its
+        # cursor is rebound on the copy, the tensors are shared
+        loader = copy.copy(self.test_set)
+        future = self._eval_executor.submit(
+            self._eval_evaluator.evaluate,
+            round,
+            snapshot,
+            loader,
+            loss_fn=None,
+            device=self.device,
+        )
+        self._pending_evals.append((round, future))
+
+    def _compute_evaluation(self, round: int, eligible: Sequence[Client]) -> None:
+        self._deliver_evaluations()
+        evaluator = FlukeENV().get_evaluator()
+
+        if FlukeENV().get_eval_cfg().locals:
+            client_evals = {
+                client.index: client.evaluate(evaluator, self.test_set) for client in eligible
+            }
+            self.notify(
+                event="server_evaluation", round=round + 1, eval_type="locals", evals=client_evals
+            )
+
+        if FlukeENV().get_eval_cfg().server:
+            self._submit_evaluation(evaluator, round + 1)
+
+    def finalize(self) -> None:
+        try:
+            super().finalize()
+        finally:
+            self.flush_evaluations()
+
+    def fit(self, *args, **kwargs) -> None:
+        try:
+            super().fit(*args, **kwargs)
+            self.flush_evaluations()
+        finally:
+            if self._eval_executor is not None:
+                self._eval_executor.shutdown(wait=True, cancel_futures=True)
+                self._eval_executor = None
+                self._pending_evals.clear()
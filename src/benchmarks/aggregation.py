@@ -0,0 +1,89 @@
+"""Aggregation time of fluke's per-tensor FedAvg vs the flat-buffer aggregators.
+
+Builds ``--clients`` copies of the `BinaryClassifier` (``--input-dim`` features,
+as after preprocessing), each the global model plus small Gaussian noise.
+With ``--bad`` of them ("bad sites"), the noise is 100 times larger and shifted.
+Each aggregator is timed over ``--repeats`` runs (median): fluke's
+`aggregate_models` and `aggregate_flat` with ``fedavg``, ``median``,
+``trimmed_mean`` and ``krum``. As on a server, the flat aggregators reuse the
+update matrix between runs, and the client models are re-backed by flat
+vectors once, before timing (``first (ms)`` is that first aggregation). The report also gives how far each aggregate
+lands from the mean of the honest clients, relative to the spread of the
+honest models; fluke's average and flat FedAvg should agree to float rounding.
+Usage::
+
+    uv run -m src.benchmarks.aggregation --clients 10 100 1000 5000 --bad 1
+"""
+
+import argparse
+import copy
+import statistics
+import time
+
+METHODS = ["fluke", "fedavg", "median", "trimmed_mean", "krum"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--input-dim", type=int, default=111)
+    parser.add_argument("--bad", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    import torch
+    from fluke import DDict
+    from fluke.utils.model import aggregate_models
+    from torch.nn.utils import parameters_to_vector
+
+    from src.aggregation import aggregate_flat
+    from src.models import BinaryClassifier
+
+    torch.manual_seed(0)
+    base = BinaryClassifier(args.input_dim)
+    n_params = sum(p.numel() for p in base.parameters())
+    print(f"{n_params} parameters per model, {args.bad} bad client(s)")
+    print(
+        f"{'clients':>8} {'aggregator':<13} {'first (ms)':>11} {'time (ms)':>10}"
+        f" {'vs fluke':>9} {'error':>9}"
+    )
+
+    for n_clients in args.clients:
+        models = []
+        with torch.no_grad():
+            for i in range(n_clients):
+                model = copy.deepcopy(base)
+                scale, shift = (1.0, 0.0) if i >= args.bad else (100.0, 1.0)
+                for p in model.parameters():
+                    p.add_(scale * 0.01 * torch.randn_like(p) + shift)
+                models.append(model)
+        weights = [1.0 / n_clients] * n_clients
+        honest = torch.stack([parameters_to_vector(m.parameters()) for m in models[args.bad :]])
+        honest_mean, spread = honest.mean(0), honest.std(0).norm()
+
+        reference, out = None, None
+        for method in METHODS:
+            if method == "krum" and n_clients <= args.bad + 2:
+                continue
+            cfg = DDict(method=method, trim_ratio=0.1, byzantine=args.bad, multi_krum=1)
+            seconds = []
+            for _ in range(args.repeats + 1):
+                target = copy.deepcopy(base)
+                start = time.perf_counter()
+                if method == "fluke":
+                    aggregate_models(target, models, weights, 1.0, inplace=True)
+                else:
+                    out = aggregate_flat(target, models, weights, 1.0, cfg, out)
+                seconds.append(time.perf_counter() - start)
+            first, seconds = seconds[0], statistics.median(seconds[1:])
+            reference = reference or seconds
+            result = parameters_to_vector(target.parameters()).detach()
+            error = float((result - honest_mean).norm() / spread)
+            print(
+                f"{n_clients:>8} {method:<13} {first * 1e3:>11.2f} {seconds * 1e3:>10.2f}"
+                f" {reference / seconds:>8.1f}x {error:>9.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
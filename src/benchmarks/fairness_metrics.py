@@ -0,0 +1,67 @@
+"""Update/compute time of the fused `GroupFairness` metric vs the two legacy metrics.
+
+Feeds random logits, labels and a binary protected column in batches of
+``--batch-size`` to `DemographicParity` + `EqualOpportunity` and to one
+`GroupFairness`, reports the time per batch and checks that the two give the
+same gaps. A last run groups by ``--groups`` one-hot columns. Usage::
+
+    uv run -m src.benchmarks.fairness_metrics --batch-size 32 4096 --batches 2000
+"""
+
+import argparse
+import time
+
+import torch
+
+
+def _time(update, compute, batches):
+    for preds, target, inputs in batches[:10]:
+        update(preds, target, inputs)
+    start = time.perf_counter()
+    for preds, target, inputs in batches:
+        update(preds, target, inputs)
+    result = compute()
+    return (time.perf_counter() - start) / len(batches), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[32, 4096])
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--groups", type=int, default=6)
+    args = parser.parse_args()
+
+    from src.fairness.metrics import DemographicParity, EqualOpportunity, GroupFairness
+
+    torch.manual_seed(0)
+    print(f"{'batch':>6} {'legacy (us)':>12} {'fused (us)':>11} {'speedup':>8} {'one-hot (us)':>13} {'max |diff|':>11}")
+    for batch_size in args.batch_size:
+        batches = []
+        for _ in range(args.batches):
+            inputs = torch.zeros(batch_size, args.groups)
+            inputs[torch.arange(batch_size), torch.randint(0, args.groups, (batch_size,))] = 1.0
+            batches.append((torch.randn(batch_size, 2), torch.randint(0, 2, (batch_size,)), inputs))
+
+        dp, eo = DemographicParity(0, 0), EqualOpportunity(0, 0)
+        legacy, (dp_value, eo_value) = _time(
+            lambda *b: (dp.update(*b), eo.update(*b)), lambda: (dp.compute(), eo.compute()), batches
+        )
+
+        fused_metric = GroupFairness(0, group_values=(0,))
+        fused, result = _time(fused_metric.update, fused_metric.compute, batches)
+
+        one_hot_metric = GroupFairness(range(args.groups))
+        one_hot, _ = _time(one_hot_metric.update, one_hot_metric.compute, batches)
+
+        diff = max(
+            abs(dp_value - result["demographic_parity"]).item(),
+            abs(eo_value - result["equal_opportunity"]).item(),
+        )
+        print(
+            f"{batch_size:>6} {legacy * 1e6:>12.1f} {fused * 1e6:>11.1f} "
+            f"{legacy / fused:>8.2f} {one_hot * 1e6:>13.1f} {diff:>11.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
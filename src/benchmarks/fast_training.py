@@ -0,0 +1,106 @@
+"""Local training throughput of FairClient's usual loop vs its fast path.
+
+Runs FairFedAVG (``fairness_lambda=0.5``, every client every round) with the
+usual training loop and with ``fast_training`` alone, with ``bf16``, with
+``compile_model`` and with both. Each local update is timed from the clients'
+``start_fit``/``end_fit`` notifications. The report gives the training
+examples processed per second of local training over rounds 2 onwards
+(throughput per client epoch), the speedup over the usual loop, the time of
+the first round's local updates (which pays the compilation), the final
+accuracy, and the largest parameter difference from the usual loop's model
+(0 for the plain fast path on CPU). Usage::
+
+    uv run -m src.benchmarks.fast_training --rounds 5 --batch-size 32 128
+"""
+
+import argparse
+import time
+
+VARIANTS = {
+    "usual": {},
+    "fast": {"fast_training": True},
+    "fast+bf16": {"fast_training": True, "bf16": True},
+    "fast+compile": {"fast_training": True, "compile_model": True},
+    "fast+compile+bf16": {"fast_training": True, "compile_model": True, "bf16": True},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--clients", type=int, default=5)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[32])
+    parser.add_argument("--sample-size", type=int, default=None)
+    parser.add_argument("--variants", nargs="+", default=list(VARIANTS), choices=list(VARIANTS))
+    args = parser.parse_args()
+
+    import torch
+    from fluke.utils import ClientObserver
+
+    from src.fairness.algorithm import FairFedAVG
+    from src.simulation import DataOptions, run_experiment
+
+    class FitTimer(ClientObserver):
+        def __init__(self):
+            self.seconds = {}
+            self._start = {}
+
+        def start_fit(self, round, client_id, model, **kwargs):
+            self._start[client_id] = time.perf_counter()
+
+        def end_fit(self, round, client_id, model, loss, **kwargs):
+            elapsed = time.perf_counter() - self._start.pop(client_id)
+            self.seconds[round] = self.seconds.get(round, 0.0) + elapsed
+
+    rows = []
+    for batch_size in args.batch_size:
+        reference = None
+        for name in args.variants:
+            timer = FitTimer()
+            algo, metrics = run_experiment(
+                algorithm_class=FairFedAVG,
+                n_clients=args.clients,
+                n_rounds=args.rounds,
+                batch_size=batch_size,
+                epochs=args.epochs,
+                sample_size=args.sample_size,
+                extra_client_params=dict(fairness_lambda=0.5, **VARIANTS[name]),
+                callbacks=[timer],
+                data=DataOptions(filepath=args.data),
+            )
+            params = [p.detach().clone() for p in algo.server.model.parameters()]
+            if reference is None:
+                reference = params
+            diff = max(float((p - r).abs().max()) for p, r in zip(params, reference))
+            # Every client trains every round: the same examples per round
+            per_round = metrics["client_samples"] / metrics["rounds"]
+            steady = [s for r, s in timer.seconds.items() if r > 1] or list(timer.seconds.values())
+            rows.append(
+                (
+                    batch_size,
+                    name,
+                    per_round * len(steady) / sum(steady),
+                    timer.seconds[min(timer.seconds)],
+                    metrics["accuracy"],
+                    diff,
+                )
+            )
+
+    print(f"\ntorch {torch.__version__}, {torch.get_num_threads()} threads")
+    print(
+        f"{'batch':>6} {'variant':<18} {'samples/s':>11} {'speedup':>8} {'round 1 (s)':>12}"
+        f" {'accuracy':>9} {'max |diff|':>11}"
+    )
+    baseline = {}
+    for batch_size, name, throughput, first, accuracy, diff in rows:
+        baseline.setdefault(batch_size, throughput)
+        print(
+            f"{batch_size:>6} {name:<18} {throughput:>11.0f} {throughput / baseline[batch_size]:>7.2f}x"
+            f" {first:>12.3f} {accuracy:>9.4f} {diff:>11.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Resident memory per client: in-memory copies vs the memory-mapped feature store.
+
+Runs the 50-client scalability scenario of ``src/main.py`` (FedAVG, IID, 20%
+participation) once with fluke's copying ``DataSplitter`` and once with
+``mmap=True`` (index views over the memory-mapped cache entry), each in a fresh
+process. Memory is read from ``/proc/self/status`` (Linux): ``RssAnon`` is
+private to the process, ``RssFile`` are file-backed pages shared with every
+other process mapping the same cache entry. Usage::
+
+    uv run -m src.benchmarks.feature_store --replicate 10
+"""
+
+import argparse
+import multiprocessing as mp
+import shutil
+import tempfile
+from pathlib import Path
+
+from src.benchmarks.preprocessing import replicate_csv
+
+
+VARIANTS = {"copy": False, "mmap": True}
+
+
+def read_rss() -> dict[str, float]:
+    """Return ``VmRSS``, ``RssAnon`` and ``RssFile`` of the current process in MiB."""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "RssAnon", "RssFile"):
+                fields[name] = int(value.split()[0]) / 1024
+    return fields
+
+
+def _measure(mmap: bool, path: Path, cache_dir: str, args, queue: mp.Queue) -> None:
+    from fluke.algorithms.fedavg import FedAVG
+
+    from src.simulation import DataOptions, run_experiment
+
+    before = read_rss()
+    algo, _ = run_experiment(
+        algorithm_class=FedAVG,
+        distribution="iid",
+        n_clients=args.clients,
+        n_rounds=args.rounds,
+        batch_size=32,
+        lr=0.01,
+        epochs=1,
+        seed=42,
+        eligible_perc=0.2,
+        data=DataOptions(filepath=path, cache_dir=cache_dir, mmap=mmap),
+    )
+    after = read_rss()
+    del algo
+    queue.put((before, after))
+
+
+def run(mmap: bool, path: Path, cache_dir: str, args) -> tuple:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(mmap, path, cache_dir, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--replicate", type=int, default=1)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    from src.cache import PreprocessingCache
+    from src.dataset import _resolve_filepath, load_and_preprocess_data
+
+    path = _resolve_filepath(args.data)
+    tmp_dir = Path(tempfile.mkdtemp(prefix="fl-bench-"))
+    try:
+        if args.replicate > 1:
+            path = replicate_csv(path, args.replicate, tmp_dir)
+        cache_dir = str(tmp_dir / "cache")
+        # Warm the cache up front so preprocessing temporaries are not measured
+        load_and_preprocess_data(path, cache=PreprocessingCache(cache_dir), mmap=True)
+
+        print(
+            f"{'variant':<8} {'RSS before':>11} {'RSS after':>10} {'anon/client':>12} "
+            f"{'file/client':>12} {'RSS/client':>11}   (MiB, {args.clients} clients)"
+        )
+        for name, mmap in VARIANTS.items():
+            before, after = run(mmap, path, cache_dir, args)
+            per_client = {k: (after[k] - before[k]) / args.clients for k in after}
+            print(
+                f"{name:<8} {before['VmRSS']:>11.1f} {after['VmRSS']:>10.1f} "
+                f"{per_client['RssAnon']:>12.3f} {per_client['RssFile']:>12.3f} "
+                f"{per_client['VmRSS']:>11.3f}"
+            )
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Round wall-time against the number of client worker processes.
+
+Runs the 50-client scalability scenario (FedAVG, IID, 20% participation) with
+``client_workers`` in ``--workers`` (0 = seeded sequential updates in the server
+process) and reports the mean time of a round, the first round apart since it
+also starts the worker pool. It also checks that every worker count produces
+the same global model as the sequential run. Usage::
+
+    uv run -m src.benchmarks.parallel_rounds --workers 0 1 2 4 --rounds 5
+"""
+
+import argparse
+import time
+
+import torch
+from fluke.utils import ServerObserver
+
+
+class RoundTimer(ServerObserver):
+    def __init__(self):
+        self.durations = []
+        self._start = None
+
+    def start_round(self, round, global_model):
+        self._start = time.perf_counter()
+
+    def end_round(self, round):
+        self.durations.append(time.perf_counter() - self._start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--eligible-perc", type=float, default=0.2)
+    parser.add_argument("--sample-size", type=int, default=None)
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    args = parser.parse_args()
+
+    from fluke.algorithms.fedavg import FedAVG
+
+    from src.simulation import DataOptions, ServerOptions, run_experiment
+
+    # Sequential runs use the same thread count as a worker so results compare exactly
+    torch.set_num_threads(args.threads_per_worker)
+
+    rows = []
+    reference = None
+    for workers in args.workers:
+        timer = RoundTimer()
+        algo, _ = run_experiment(
+            algorithm_class=FedAVG,
+            distribution="iid",
+            n_clients=args.clients,
+            n_rounds=args.rounds,
+            epochs=args.epochs,
+            seed=42,
+            sample_size=args.sample_size,
+            eligible_perc=args.eligible_perc,
+            data=DataOptions(mmap=True),
+            server=ServerOptions(
+                client_workers=workers, threads_per_worker=args.threads_per_worker
+            ),
+            callbacks=[timer],
+        )
+        params = [p.detach().clone() for p in algo.server.model.parameters()]
+        if reference is None:
+            reference = params
+        identical = all(torch.equal(a, b) for a, b in zip(reference, params))
+        later = timer.durations[1:] or timer.durations
+        rows.append((workers, timer.durations[0], sum(later) / len(later), identical))
+
+    base = rows[0][2]
+    print(f"\n{'workers':>7} {'round 1 (s)':>12} {'mean round (s)':>15} {'speedup':>8} {'same model':>11}")
+    for workers, first, mean, identical in rows:
+        print(f"{workers:>7} {first:>12.3f} {mean:>15.3f} {base / mean:>8.2f} {str(identical):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Partitioning time of fluke's distribution functions vs the native vectorized partitioner.
+
+Draws ``--rows`` synthetic rows (binary labels, 45% positive, and a source
+column with ``--groups`` values of Zipf-like sizes) and splits them over
+``--clients`` clients with ``iid``, ``dir`` (``beta=0.5``), ``qnt`` and
+``natural``. For each, the report gives the time of `partition` (cold), of a
+`PartitionCache` miss (partition and write) and of a hit (memory-mapped
+load), the smallest and largest client, and the time of fluke's function of
+the same name (``DataSplitter.iid``, ``label_dirichlet_skew`` and
+``quantity_skew``, on the row indices, as `IndexedDataSplitter` calls them)
+up to ``--fluke-rows`` rows. Usage::
+
+    uv run -m src.benchmarks.partition --rows 1000000 5000000 --clients 100 10000
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+METHODS = ["iid", "dir", "qnt", "natural"]
+FLUKE = {"iid": "iid", "dir": "label_dirichlet_skew", "qnt": "quantity_skew"}
+DIST_ARGS = {"dir": {"beta": 0.5, "min_ex_class": 1}, "qnt": {"min_quantity": 2, "alpha": 4.0}}
+
+
+def _timed(fn, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 5_000_000])
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 10_000])
+    parser.add_argument("--groups", type=int, default=20_000)
+    parser.add_argument("--fluke-rows", type=int, default=200_000)
+    parser.add_argument("--methods", nargs="+", default=METHODS, choices=METHODS)
+    args = parser.parse_args()
+
+    import torch
+    from fluke.data import DataSplitter
+
+    from src.partition import PartitionCache, partition
+
+    print(
+        f"{'rows':>9} {'clients':>8} {'method':<8} {'native (s)':>11} {'miss (s)':>9}"
+        f" {'hit (s)':>8} {'min':>7} {'max':>8} {'fluke (s)':>10}"
+    )
+    rng = np.random.default_rng(0)
+    for n_rows in args.rows:
+        labels = (rng.random(n_rows) < 0.45).astype(np.int64)
+        # Source sizes proportional to 1 / rank, as hospitals or admission sources
+        weights = 1.0 / np.arange(1, args.groups + 1)
+        groups = rng.choice(args.groups, size=n_rows, p=weights / weights.sum())
+        for n_clients in args.clients:
+            for method in args.methods:
+                dist_args = DIST_ARGS.get(method, {})
+                source = groups if method == "natural" else None
+                result, native = _timed(
+                    partition, labels, n_clients, method, 0, 0.2, source, **dist_args
+                )
+                directory = tempfile.mkdtemp()
+                try:
+                    cache = PartitionCache(directory)
+                    _, miss = _timed(
+                        cache.partition, labels, n_clients, method, 0, 0.2, source, **dist_args
+                    )
+                    _, hit = _timed(
+                        cache.partition, labels, n_clients, method, 0, 0.2, source, **dist_args
+                    )
+                finally:
+                    shutil.rmtree(directory)
+
+                fluke = "-"
+                if method in FLUKE and n_rows <= args.fluke_rows:
+                    rows, y = torch.arange(n_rows), torch.from_numpy(labels)
+                    function = getattr(DataSplitter, FLUKE[method])
+                    _, seconds = _timed(function, rows, y, None, None, n_clients, **dist_args)
+                    fluke = f"{seconds:.3f}"
+                sizes = result.sizes()
+                print(
+                    f"{n_rows:>9} {n_clients:>8} {method:<8} {native:>11.3f} {miss:>9.3f}"
+                    f" {hit:>8.4f} {sizes.min():>7} {sizes.max():>8} {fluke:>10}"
+                )
+
+
+if __name__ == "__main__":
+    main()
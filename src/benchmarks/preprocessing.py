@@ -0,0 +1,101 @@
+"""Benchmark the legacy pandas preprocessing against the vectorized loader.
+
+Each measurement runs in a fresh process so peak RSS is not polluted by earlier
+runs. Usage::
+
+    uv run -m src.benchmarks.preprocessing --data diabetic_data.csv --replicate 10
+"""
+
+import argparse
+import multiprocessing as mp
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _legacy(path: Path) -> np.ndarray:
+    from src.dataset import TARGET_MAP, _load_diabetes_dataframe, _prepare_features
+
+    df = _prepare_features(_load_diabetes_dataframe(path))
+    df = df[df["readmitted"].isin(list(TARGET_MAP))]
+    df.pop("readmitted")
+    return df.to_numpy(dtype=np.float32)
+
+
+def _vectorized(path: Path) -> np.ndarray:
+    from src.dataset import _load_feature_matrix
+
+    return _load_feature_matrix(path)[0]
+
+
+VARIANTS = {"legacy": _legacy, "vectorized": _vectorized}
+
+
+def _measure(variant: str, path: Path, queue: mp.Queue) -> None:
+    import src.dataset  # noqa: F401  (import cost is not part of the measurement)
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    X = VARIANTS[variant](path)
+    elapsed = time.perf_counter() - start
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, (rss_after - rss_before) / 1024, X.shape))
+
+
+def run(variant: str, path: Path) -> tuple[float, float, tuple]:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(variant, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def replicate_csv(path: Path, factor: int, out_dir: Path) -> Path:
+    out = out_dir / f"{path.stem}_x{factor}.csv"
+    with open(path, "rb") as src, open(out, "wb") as dst:
+        header = src.readline()
+        body = src.read()
+        if not body.endswith(b"\n"):
+            body += b"\n"
+        dst.write(header)
+        for _ in range(factor):
+            dst.write(body)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--replicate", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from src.dataset import _resolve_filepath
+
+    path = _resolve_filepath(args.data)
+    tmp_dir = Path(tempfile.mkdtemp(prefix="fl-bench-"))
+    try:
+        datasets = {"x1": path}
+        if args.replicate > 1:
+            datasets[f"x{args.replicate}"] = replicate_csv(path, args.replicate, tmp_dir)
+
+        print(f"{'dataset':<8} {'variant':<11} {'rows x cols':>14} {'time (s)':>9} {'peak +RSS (MiB)':>16}")
+        for name, data_path in datasets.items():
+            for variant in VARIANTS:
+                runs = [run(variant, data_path) for _ in range(args.repeat)]
+                best_time = min(r[0] for r in runs)
+                peak = max(r[1] for r in runs)
+                shape = f"{runs[0][2][0]} x {runs[0][2][1]}"
+                print(f"{name:<8} {variant:<11} {shape:>14} {best_time:>9.3f} {peak:>16.1f}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Write and query time of the results store vs scraping the printed log.
+
+Generates ``--runs`` synthetic runs (random algorithm, client count and seed,
+the metrics printed by `run_experiment`, ``--rounds`` rounds of per-round
+metrics each) and appends them to a fresh `ResultsDB` in batches of
+``--batch`` runs per transaction. It then times two reports, "best macro F1
+per algorithm" and "mean runtime per client count", answered by the store's
+query API and by re-parsing the same runs from a ``RESULTS.log``-style text
+log, and checks that both agree. Usage::
+
+    uv run -m src.benchmarks.results_store --runs 5000 --rounds 20
+"""
+
+import argparse
+import ast
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+ALGORITHMS = ["FedAVG", "FedProx", "FastDPFedAVG", "FairFedAVG"]
+METRICS = ["accuracy", "macro_precision", "macro_recall", "macro_f1", "micro_f1"]
+
+
+def synthetic_runs(n_runs: int, n_rounds: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    runs = []
+    for i in range(n_runs):
+        config = dict(
+            algorithm=ALGORITHMS[rng.integers(len(ALGORITHMS))],
+            n_clients=int(rng.choice([5, 50, 200, 1000])),
+            distribution="iid" if rng.random() < 0.5 else "dir",
+            n_rounds=n_rounds,
+            seed=int(rng.integers(100)),
+        )
+        metrics = {name: round(float(rng.uniform(0.5, 0.7)), 5) for name in METRICS}
+        metrics["runtime_seconds"] = round(float(rng.uniform(10, 100)), 2)
+        rounds = {
+            r: {name: float(rng.uniform(0.4, 0.7)) for name in METRICS} for r in range(1, n_rounds + 1)
+        }
+        runs.append(dict(name=f"run{i}", config=config, metrics=metrics, rounds=rounds))
+    return runs
+
+
+def write_log(runs: list, path: str) -> None:
+    # The lines `run_experiment` prints for a run (see RESULTS.log)
+    with open(path, "w") as f:
+        for run in runs:
+            c = run["config"]
+            f.write(f"\n[{run['name']}] {c['algorithm']} {c['distribution']} seed={c['seed']}\n")
+            f.write(f"Initializing {c['algorithm']} with {c['n_clients']} clients...\n")
+            for r, values in run["rounds"].items():
+                f.write(f"Round {r}: {values}\n")
+            f.write(f"Final Global Metrics: {run['metrics']}\n")
+            f.write(f"{c['algorithm']} Experiment finished in {run['metrics']['runtime_seconds']}s.\n")
+
+
+def scrape_log(path: str) -> tuple:
+    best, runtimes = {}, {}
+    init = re.compile(r"Initializing (\w+) with (\d+) clients")
+    with open(path) as f:
+        for line in f:
+            match = init.match(line)
+            if match:
+                algorithm, n_clients = match.group(1), int(match.group(2))
+            elif line.startswith("Final Global Metrics: "):
+                metrics = ast.literal_eval(line[len("Final Global Metrics: ") :])
+                best[algorithm] = max(best.get(algorithm, -1.0), metrics["macro_f1"])
+                runtimes.setdefault(n_clients, []).append(metrics["runtime_seconds"])
+    return best, {n: sum(v) / len(v) for n, v in runtimes.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args()
+
+    from src.results import ResultsDB
+
+    runs = synthetic_runs(args.runs, args.rounds)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path, log_path = os.path.join(tmp, "results.sqlite"), os.path.join(tmp, "RESULTS.log")
+        write_log(runs, log_path)
+
+        with ResultsDB(db_path) as db:
+            start = time.perf_counter()
+            for i in range(0, len(runs), args.batch):
+                db.add_runs(runs[i : i + args.batch])
+            write_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        log_best, log_runtimes = scrape_log(log_path)
+        scrape_seconds = time.perf_counter() - start
+
+        # A fresh connection, as a report script would open
+        start = time.perf_counter()
+        with ResultsDB(db_path) as db:
+            best = {row["algorithm"]: row["macro_f1"] for row in db.best("macro_f1")}
+            runtimes = {row["n_clients"]: row["mean"] for row in db.trend("n_clients", "runtime_seconds")}
+        query_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ResultsDB(db_path) as db:
+            loaded = db.runs()
+        load_seconds = time.perf_counter() - start
+
+        db_mib = os.path.getsize(db_path) / 2**20
+        log_mib = os.path.getsize(log_path) / 2**20
+
+    agree = best == log_best and all(
+        abs(runtimes[n] - log_runtimes[n]) < 1e-9 for n in log_runtimes
+    )
+    print(f"{args.runs} runs x {args.rounds} rounds, batches of {args.batch} runs")
+    print(f"{'write (s)':>10} {'store MiB':>10} {'log MiB':>8} {'query (s)':>10} {'scrape (s)':>11} {'speedup':>8} {'load all (s)':>13}")
+    print(
+        f"{write_seconds:>10.3f} {db_mib:>10.1f} {log_mib:>8.1f} {query_seconds:>10.4f}"
+        f" {scrape_seconds:>11.4f} {scrape_seconds / query_seconds:>7.0f}x {load_seconds:>13.4f}"
+    )
+    print(f"Loaded {len(loaded)} runs; reports agree with the log: {agree}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Scaling benchmark suite: throughput, round latency and peak memory of run_experiment.
+
+Runs `run_experiment` over a grid of algorithms (FedAVG, FedProx, DPFedAVG
+(``FastDPFedAVG``), FairFedAVG), ``n_clients``, ``eligible_perc``,
+``batch_size`` and ``sample_size``. Each case runs in a fresh process with
+CUDA hidden, so the numbers are CPU-only and the peak RSS (``VmHWM``) is the
+case's own. Per case it records:
+
+* ``samples_per_sec``: training examples processed by the clients
+  (``client_samples``) per second of training;
+* ``round_p50``/``round_p90``/``round_max``: round latency percentiles, in seconds
+  (the first round, which pays the warm-up costs, included);
+* ``peak_rss_mib``, and the final accuracy (a sanity check, not a performance metric).
+
+``--profile quick`` is a smoke check of a few seconds per case; ``--profile full``
+spans 5 to 1000 clients. The grid axes can be overridden one by one. Results
+are written as JSON (``--save``, by default ``results/benchmarks/scaling_<profile>.json``)
+with the machine and library versions. ``--baseline`` compares them to a previous
+file: a case whose throughput drops, or whose median round latency or peak
+memory grows, by more than ``--threshold`` (10% by default) is flagged, and the
+exit status is 1. ``--compare A B`` compares two saved files without running
+anything. Usage::
+
+    uv run -m src.benchmarks.scaling --profile quick --save baseline.json
+    uv run -m src.benchmarks.scaling --profile quick --baseline baseline.json
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+PROFILES = {
+    "quick": dict(
+        algorithms=["fedavg", "fedprox", "dpfedavg", "fairfedavg"],
+        clients=[5, 50],
+        eligible_perc=[0.2],
+        batch_size=[32],
+        sample_size=[2000],
+        rounds=2,
+    ),
+    "full": dict(
+        algorithms=["fedavg", "fedprox", "dpfedavg", "fairfedavg"],
+        clients=[5, 50, 200, 1000],
+        eligible_perc=[0.2, 1.0],
+        batch_size=[32, 128],
+        sample_size=[10000, 0],  # 0: the whole dataset
+        rounds=5,
+    ),
+}
+
+# metric: whether higher is better (for the regression check)
+COMPARED = {"samples_per_sec": True, "round_p50": False, "peak_rss_mib": False}
+
+
+def _algorithm(name: str) -> tuple:
+    from fluke.algorithms.fedavg import FedAVG
+    from fluke.algorithms.fedprox import FedProx
+
+    from src.fairness.algorithm import FairFedAVG
+    from src.privacy import FastDPFedAVG
+
+    return {
+        "fedavg": (FedAVG, {}),
+        "fedprox": (FedProx, {"mu": 0.1}),
+        "dpfedavg": (FastDPFedAVG, {"noise_mul": 1.0, "max_grad_norm": 1.0, "clipping": 1.0}),
+        "fairfedavg": (FairFedAVG, {"fairness_lambda": 0.5}),
+    }[name]
+
+
+def case_key(case: Dict[str, Any]) -> str:
+    return "{algorithm}/c{n_clients}/p{eligible_perc}/b{batch_size}/s{sample_size}".format(**case)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def _measure(case: Dict[str, Any], data: str, rounds: int, queue: mp.Queue) -> None:
+    from fluke.utils import ServerObserver
+
+    from src.simulation import DataOptions, run_experiment
+    from src.tracing import memory_mib
+
+    class RoundTimer(ServerObserver):
+        def __init__(self):
+            self.seconds, self._start = [], None
+
+        def start_round(self, round, global_model):
+            self._start = time.perf_counter()
+
+        def end_round(self, round):
+            self.seconds.append(time.perf_counter() - self._start)
+
+    timer = RoundTimer()
+    algorithm_class, client_params = _algorithm(case["algorithm"])
+    _, metrics = run_experiment(
+        algorithm_class=algorithm_class,
+        distribution="iid",
+        n_clients=case["n_clients"],
+        n_rounds=rounds,
+        batch_size=case["batch_size"],
+        eligible_perc=case["eligible_perc"],
+        sample_size=case["sample_size"] or None,
+        seed=42,
+        extra_client_params=client_params,
+        callbacks=[timer],
+        data=DataOptions(filepath=data),
+    )
+    queue.put(
+        {
+            "samples_per_sec": metrics["client_samples"] / max(sum(timer.seconds), 1e-9),
+            "round_p50": percentile(timer.seconds, 0.5),
+            "round_p90": percentile(timer.seconds, 0.9),
+            "round_max": max(timer.seconds),
+            "peak_rss_mib": memory_mib()["peak_rss"],
+            "accuracy": metrics["accuracy"],
+        }
+    )
+
+
+def run_case(case: Dict[str, Any], data: str, rounds: int) -> Dict[str, Any]:
+    # CPU only: the child must not see a GPU (the environment is inherited by spawn)
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(case, data, rounds, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        raise RuntimeError(f"Case {case_key(case)} failed (exit code {proc.exitcode})")
+    return queue.get()
+
+
+def machine_info() -> Dict[str, Any]:
+    import torch
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> tuple:
+    """Report lines (one per case and metric, regressions marked) and the regression count."""
+    lines, regressions = [], 0
+    header = f"{'case':<36} {'metric':<16} {'baseline':>11} {'current':>11} {'change':>8}"
+    lines += [header, "-" * len(header)]
+    for key, result in current["cases"].items():
+        if key not in baseline["cases"]:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = baseline["cases"][key][metric], result[metric]
+            change = (new - old) / old if old else 0.0
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag, regressions = "  REGRESSION", regressions + 1
+            lines.append(f"{key:<36} {metric:<16} {old:>11.3f} {new:>11.3f} {change:>+8.1%}{flag}")
+    lines.append(f"\n{regressions} regression(s) beyond {threshold:.0%}")
+    return lines, regressions
+
+
+def format_results(results: Dict[str, Any]) -> str:
+    header = (
+        f"{'case':<36} {'samples/s':>11} {'p50 s':>8} {'p90 s':>8} {'max s':>8}"
+        f" {'peak MiB':>9} {'accuracy':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for key, r in results["cases"].items():
+        lines.append(
+            f"{key:<36} {r['samples_per_sec']:>11.0f} {r['round_p50']:>8.3f} {r['round_p90']:>8.3f}"
+            f" {r['round_max']:>8.3f} {r['peak_rss_mib']:>9.0f} {r['accuracy']:>9.4f}"
+        )
+    return "\n".join(lines)
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick")
+    parser.add_argument("--algorithms", nargs="+", default=None)
+    parser.add_argument("--clients", type=int, nargs="+", default=None)
+    parser.add_argument("--eligible-perc", type=float, nargs="+", default=None)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=None)
+    parser.add_argument("--sample-size", type=int, nargs="+", default=None)
+    parser.add_argument("--rounds", type=int, default=None)
+    parser.add_argument("--save", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), default=None)
+    args = parser.parse_args()
+
+    if args.compare:
+        lines, regressions = compare(_load(args.compare[1]), _load(args.compare[0]), args.threshold)
+        print("\n".join(lines))
+        return 1 if regressions else 0
+
+    profile = dict(PROFILES[args.profile])
+    for name in ("algorithms", "clients", "eligible_perc", "batch_size", "sample_size", "rounds"):
+        if getattr(args, name) is not None:
+            profile[name] = getattr(args, name)
+
+    from src.cache import PreprocessingCache
+    from src.dataset import load_and_preprocess_data
+
+    # Preprocess once up front so every case hits the cache
+    load_and_preprocess_data(args.data, cache=PreprocessingCache())
+
+    cases = [
+        dict(algorithm=a, n_clients=c, eligible_perc=p, batch_size=b, sample_size=s)
+        for a, c, p, b, s in itertools.product(
+            profile["algorithms"],
+            profile["clients"],
+            profile["eligible_perc"],
+            profile["batch_size"],
+            profile["sample_size"],
+        )
+    ]
+    results = {"profile": args.profile, "rounds": profile["rounds"], "machine": machine_info()}
+    results["cases"] = {}
+    for i, case in enumerate(cases, 1):
+        print(f"[{i}/{len(cases)}] {case_key(case)}", file=sys.stderr)
+        results["cases"][case_key(case)] = dict(
+            run_case(case, args.data, profile["rounds"]), **case
+        )
+
+    print(f"\n{format_results(results)}")
+    save = Path(args.save or f"results/benchmarks/scaling_{args.profile}.json")
+    save.parent.mkdir(parents=True, exist_ok=True)
+    with open(save, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {save}")
+
+    if args.baseline:
+        lines, regressions = compare(results, _load(args.baseline), args.threshold)
+        print("\n" + "\n".join(lines))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
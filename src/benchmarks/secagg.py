@@ -0,0 +1,165 @@
+"""Overhead of secure aggregation (pairwise masking) over plain FedAVG.
+
+Two measurements:
+
+* masking alone, for ``--mask-clients`` clients of a round with the
+  `BinaryClassifier` (``--input-dim`` features): the pairwise masks expanded
+  by `SecAggServer` (`add_masks`: vectorized splitmix64 blocks, each pair's mask once) vs
+  a naive implementation with one seeded ``torch.Generator`` per client, pair
+  and parameter tensor (every mask drawn by both ends of its pair);
+* full runs of the 50-client scenario of ``src/main.py`` (IID, 20% of the
+  clients per round) and of the same federation with every client in every
+  round, with FedAVG and SecAggFedAVG (without dropout, with ``--dropout``,
+  and with ``--neighbours`` mask neighbours). Each run is in a fresh process,
+  so its peak RSS is its own. The report gives the seconds per round, what
+  secure aggregation adds to them, its masking and unmasking seconds and
+  int64 working memory per round, the peak RSS and the final accuracy.
+
+Usage::
+
+    uv run -m src.benchmarks.secagg --rounds 5 --mask-clients 10 50 200
+"""
+
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+SCENARIOS = {"50 clients, 20%": 0.2, "50 clients, all": 1.0}
+
+
+def naive_masks(updates, seed: int) -> list:
+    """Mask every client's update tensor by tensor, one generator per pair (both ends)."""
+    import torch
+
+    n = len(updates)
+    masked = []
+    for i in range(n):
+        client = [t.to(torch.float64).mul(2.0**32).round().to(torch.int64) for t in updates[i]]
+        for j in range(n):
+            if i == j:
+                continue
+            for k, tensor in enumerate(client):
+                generator = torch.Generator().manual_seed(seed + min(i, j) * n + max(i, j) + k)
+                mask = torch.randint(-(2**62), 2**62, tensor.shape, generator=generator)
+                tensor += mask if i < j else -mask
+        masked.append(client)
+    return masked
+
+
+def time_masking(n_clients: int, input_dim: int) -> tuple:
+    import torch
+
+    from src.models import BinaryClassifier
+    from src.secagg import add_masks, mask_pairs
+
+    models = [BinaryClassifier(input_dim) for _ in range(n_clients)]
+    updates = [[p.detach() for p in m.parameters()] for m in models]
+    flat = torch.stack([torch.cat([t.reshape(-1) for t in u]) for u in updates])
+
+    start = time.perf_counter()
+    naive_masks(updates, seed=0)
+    naive = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    first, second = mask_pairs(n_clients, None, rng)
+    seeds = rng.integers(0, 2**63, size=len(first), dtype=np.uint64)
+    start = time.perf_counter()
+    masked = flat.to(torch.float64).mul(2.0**32).round().to(torch.int64)
+    add_masks(masked, seeds, add=first, subtract=second)
+    vectorized = time.perf_counter() - start
+    return naive, vectorized
+
+
+def _run(name: str, algorithm: str, options: dict, args, queue: mp.Queue) -> None:
+    from fluke.algorithms.fedavg import FedAVG
+
+    from src.secagg import SecAggFedAVG
+    from src.simulation import DataOptions, run_experiment
+    from src.tracing import memory_mib
+
+    algo, metrics = run_experiment(
+        algorithm_class=SecAggFedAVG if algorithm == "SecAggFedAVG" else FedAVG,
+        distribution="iid",
+        n_clients=50,
+        n_rounds=args.rounds,
+        eligible_perc=SCENARIOS[name],
+        sample_size=args.sample_size,
+        extra_server_params=options,
+        data=DataOptions(filepath=args.data, mmap=True),
+    )
+    server = algo.server
+    rounds = max(metrics["rounds"], 1)
+    secagg = getattr(server, "secagg_seconds", {})
+    queue.put(
+        dict(
+            seconds=metrics["runtime_seconds"] / rounds,
+            mask=sum(s["mask"] for s in secagg.values()) / rounds,
+            unmask=sum(s["unmask"] for s in secagg.values()) / rounds,
+            working_mib=max(getattr(server, "secagg_bytes", {0: 0}).values()) / 2**20,
+            peak_rss=memory_mib()["peak_rss"],
+            dropped=metrics.get("dropped_clients", 0),
+            failed=metrics.get("failed_rounds", 0),
+            accuracy=metrics["accuracy"],
+        )
+    )
+
+
+def run(name: str, algorithm: str, options: dict, args) -> dict:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run, args=(name, algorithm, options, args, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--sample-size", type=int, default=None)
+    parser.add_argument("--dropout", type=float, default=0.1)
+    parser.add_argument("--neighbours", type=int, default=8)
+    parser.add_argument("--mask-clients", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--input-dim", type=int, default=111)
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'naive (s)':>10} {'vectorized (s)':>15} {'speedup':>8}")
+    for n_clients in args.mask_clients:
+        naive, vectorized = time_masking(n_clients, args.input_dim)
+        print(f"{n_clients:>8} {naive:>10.3f} {vectorized:>15.3f} {naive / vectorized:>7.1f}x")
+
+    variants = [
+        ("FedAVG", "FedAVG", {}),
+        ("SecAgg", "SecAggFedAVG", {}),
+        (f"SecAgg dropout={args.dropout}", "SecAggFedAVG", {"dropout": args.dropout}),
+        (
+            f"SecAgg k={args.neighbours}",
+            "SecAggFedAVG",
+            {"dropout": args.dropout, "neighbours": args.neighbours},
+        ),
+    ]
+    rows = []
+    for name in SCENARIOS:
+        for label, algorithm, options in variants:
+            rows.append((name, label, run(name, algorithm, options, args)))
+
+    print(
+        f"\n{'scenario':<16} {'variant':<22} {'s/round':>8} {'+s/round':>9} {'mask':>7}"
+        f" {'unmask':>7} {'work MiB':>9} {'peak MiB':>9} {'dropped':>8} {'lost':>5} {'accuracy':>9}"
+    )
+    base = {}
+    for name, label, r in rows:
+        base.setdefault(name, r["seconds"])
+        print(
+            f"{name:<16} {label:<22} {r['seconds']:>8.3f} {r['seconds'] - base[name]:>+9.3f}"
+            f" {r['mask']:>7.3f} {r['unmask']:>7.3f} {r['working_mib']:>9.1f}"
+            f" {r['peak_rss']:>9.0f} {r['dropped']:>8} {r['failed']:>5} {r['accuracy']:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Throughput, memory and fidelity of the synthetic Diabetes-130 generator.
+
+Fits `src/synthetic.py` on ``--data``, then writes ``--rows`` rows as plain
+and gzip CSV with each number of ``--workers``, every run in a fresh process
+(the peak RSS it adds, and the peak RSS of its largest worker). Fidelity
+compares ``--fidelity-rows`` synthetic rows to the real ones: the total variation
+distance of each feature column's marginal, and of the pairwise joints, on the
+forest's edges and over all pairs, against independent columns (the product
+of the real marginals, what a marginal-only generator would reach). Usage::
+
+    uv run -m src.benchmarks.synthetic --data diabetic_data.csv --rows 2000000 --workers 1 4
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def _fit(data: str, model_path: str) -> None:
+    from src.synthetic import fit
+
+    start = time.perf_counter()
+    model = fit(data)
+    model.save(model_path)
+    print(f"Fitted on {model.n_rows} rows in {time.perf_counter() - start:.2f} s")
+
+
+def _measure(model_path: str, path: str, rows: int, chunk_rows: int, workers: int, queue) -> None:
+    from src.synthetic import SyntheticModel, generate
+
+    model = SyntheticModel.load(model_path)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    size = generate(model, path, rows, chunk_rows, workers)
+    elapsed = time.perf_counter() - start
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+    worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    queue.put((elapsed, size, rss, worker_rss))
+
+
+def run(model_path: str, path: str, rows: int, chunk_rows: int, workers: int) -> tuple:
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(model_path, path, rows, chunk_rows, workers, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def _codes(path: str, model, columns: list) -> dict:
+    import pandas as pd
+
+    df = pd.read_csv(path, usecols=columns, dtype=str, keep_default_na=False)
+    return {
+        column: pd.Categorical(df[column], model.vocabularies[column]).codes.astype(np.int64)
+        for column in columns
+    }
+
+
+def _distribution(*codes_and_sizes) -> np.ndarray:
+    flat, total = 0, 1
+    for codes, size in codes_and_sizes:
+        flat, total = flat * size + codes, total * size
+    return np.bincount(flat, minlength=total) / len(flat)
+
+
+def _tv(p: np.ndarray, q: np.ndarray) -> float:
+    return 0.5 * float(np.abs(p - q).sum())
+
+
+def fidelity(model, real_path: str, synthetic_path: str) -> dict:
+    from src.dataset import DROP_COLUMNS
+    from src.synthetic import ID_COLUMNS
+
+    columns = [c for c in model.vocabularies if c not in DROP_COLUMNS and c not in ID_COLUMNS]
+    real, synthetic = _codes(real_path, model, columns), _codes(synthetic_path, model, columns)
+    sizes = {column: len(model.vocabularies[column]) for column in columns}
+    marginals = {
+        column: (
+            _distribution((real[column], sizes[column])),
+            _distribution((synthetic[column], sizes[column])),
+        )
+        for column in columns
+    }
+
+    edges, pairs = [], []
+    for i, a in enumerate(columns):
+        for b in columns[i + 1 :]:
+            joint = _distribution((real[a], sizes[a]), (real[b], sizes[b]))
+            sampled = _distribution((synthetic[a], sizes[a]), (synthetic[b], sizes[b]))
+            independent = np.outer(marginals[a][0], marginals[b][0]).ravel()
+            distances = (_tv(joint, sampled), _tv(joint, independent))
+            pairs.append(distances)
+            if model.parents[a] == b or model.parents[b] == a:
+                edges.append(distances)
+
+    marginal_tv = [_tv(p, q) for p, q in marginals.values()]
+    return {
+        "marginal": (np.mean(marginal_tv), np.max(marginal_tv)),
+        "edges": np.mean(edges, axis=0) if edges else (np.nan, np.nan),
+        "pairs": np.mean(pairs, axis=0),
+        "n_edges": len(edges),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--fidelity-rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    from src.synthetic import SyntheticModel, generate
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="fl-synthetic-"))
+    try:
+        # Fitted in a fresh process too: a child inherits the peak RSS of its parent
+        model_path = str(tmp_dir / "model.npz")
+        proc = mp.get_context("spawn").Process(target=_fit, args=(args.data, model_path))
+        proc.start()
+        proc.join()
+        model = SyntheticModel.load(model_path)
+
+        print(
+            f"{'format':<7} {'workers':>7} {'time (s)':>9} {'rows/s':>10} {'MiB':>8}"
+            f" {'bytes/row':>9} {'+RSS (MiB)':>10} {'worker RSS':>10}"
+        )
+        for suffix in ("csv", "csv.gz"):
+            for workers in args.workers:
+                path = str(tmp_dir / f"synthetic.{suffix}")
+                elapsed, size, rss, worker_rss = run(
+                    model_path, path, args.rows, args.chunk_rows, workers
+                )
+                worker = f"{worker_rss:>10.0f}" if workers > 1 else f"{'-':>10}"
+                print(
+                    f"{suffix:<7} {workers:>7} {elapsed:>9.2f} {args.rows / elapsed:>10.0f}"
+                    f" {size / 2**20:>8.1f} {size / args.rows:>9.1f} {rss:>10.0f} {worker}"
+                )
+                os.remove(path)
+
+        path = str(tmp_dir / "fidelity.csv")
+        generate(model, path, args.fidelity_rows, args.chunk_rows, workers=1)
+        from src.dataset import _resolve_filepath
+
+        result = fidelity(model, str(_resolve_filepath(args.data)), path)
+        print(f"\nTotal variation distance to the real data ({args.fidelity_rows} rows)")
+        print(f"{'':<34} {'synthetic':>10} {'independent':>12}")
+        print(f"{'marginals, mean':<34} {result['marginal'][0]:>10.4f}")
+        print(f"{'marginals, max':<34} {result['marginal'][1]:>10.4f}")
+        print(
+            f"{'joints, forest edges (' + str(result['n_edges']) + ')':<34}"
+            f" {result['edges'][0]:>10.4f} {result['edges'][1]:>12.4f}"
+        )
+        print(
+            f"{'joints, all pairs':<34} {result['pairs'][0]:>10.4f} {result['pairs'][1]:>12.4f}"
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
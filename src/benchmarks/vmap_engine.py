@@ -0,0 +1,62 @@
+"""Round wall-time: seeded per-client loop vs the vmap multi-client engine.
+
+For each ``--clients`` count, runs FedAVG (IID, every client selected) with
+``client_workers=0`` (seeded sequential updates) and with ``vmap_clients=True``,
+and reports the mean round time and the largest parameter difference between
+the two final global models. ``--dropout 0`` (the default) makes the two paths
+numerically comparable; with dropout the masks differ. Usage::
+
+    uv run -m src.benchmarks.vmap_engine --clients 50 200 1000 --rounds 3
+"""
+
+import argparse
+import functools
+
+from src.benchmarks.parallel_rounds import RoundTimer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="diabetic_data.csv")
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--dropout", type=float, default=0.0)
+    args = parser.parse_args()
+
+    from fluke.algorithms.fedavg import FedAVG
+
+    import src.simulation as simulation
+    from src.models import BinaryClassifier
+
+    simulation.BinaryClassifier = functools.partial(BinaryClassifier, dropout=args.dropout)
+
+    print(f"{'clients':>7} {'loop (s/round)':>15} {'vmap (s/round)':>15} {'speedup':>8} {'max |diff|':>11}")
+    for n_clients in args.clients:
+        times, models = [], []
+        for server in (
+            simulation.ServerOptions(client_workers=0),
+            simulation.ServerOptions(vmap_clients=True),
+        ):
+            timer = RoundTimer()
+            algo, _ = simulation.run_experiment(
+                algorithm_class=FedAVG,
+                distribution="iid",
+                n_clients=n_clients,
+                n_rounds=args.rounds,
+                seed=42,
+                eligible_perc=1.0,
+                callbacks=[timer],
+                data=simulation.DataOptions(filepath=args.data, mmap=True),
+                server=server,
+            )
+            times.append(sum(timer.durations) / len(timer.durations))
+            models.append([p.detach().clone() for p in algo.server.model.parameters()])
+        diff = max((a - b).abs().max().item() for a, b in zip(*models))
+        print(
+            f"{n_clients:>7} {times[0]:>15.3f} {times[1]:>15.3f} "
+            f"{times[0] / times[1]:>8.2f} {diff:>11.2e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+
+
+DEFAULT_CACHE_DIR = ".cache/preprocessing"
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB
+CACHE_VERSION = 1
+
+_ARRAY_NAMES = ("X_train", "X_test", "y_train", "y_test")
+_TRANSFORMERS_FILE = "transformers.pkl"
+_META_FILE = "meta.json"
+
+# (resolved path, size, mtime_ns) -> sha256, so repeated runs in one process
+# don't re-hash an unchanged CSV.
+_file_hash_memo: Dict[tuple, str] = {}
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    path = Path(path).resolve()
+    stat = path.stat()
+    memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key in _file_hash_memo:
+        return _file_hash_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+
+    _file_hash_memo[memo_key] = digest.hexdigest()
+    return _file_hash_memo[memo_key]
+
+
+class PreprocessingCache:
+    """Content-addressed on-disk cache for preprocessed train/test arrays.
+
+    Each entry is a directory named after the cache key holding one raw ``.npy``
+    file per array (so it can be loaded, or memory-mapped, without parsing),
+    the pickled fitted transformers and a small JSON metadata file.
+    Entries are evicted least-recently-used first once the cache grows past
+    ``max_bytes``.
+
+    Args:
+        cache_dir: Directory where entries are stored.
+        max_bytes: Upper bound on the total size of the cache on disk.
+    """
+
+    # The arrays of an entry (subclasses storing other arrays override it)
+    array_names = _ARRAY_NAMES
+
+    def __init__(
+        self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def make_key(self, csv_path: Path, **params: Any) -> str:
+        """Build the cache key from the CSV content hash and the preprocessing parameters."""
+        payload = {
+            "version": CACHE_VERSION,
+            "csv_sha256": file_sha256(csv_path),
+            "params": params,
+        }
+        blob = json.dumps(payload, sort_keys=True, default=str).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def __contains__(self, key: str) -> bool:
+        return (self._entry_dir(key) / _META_FILE).is_file()
+
+    def get(self, key: str, mmap: bool = False) -> Optional[Dict[str, Any]]:
+        """Return the cached arrays and transformers for ``key``, or ``None`` on a miss.
+
+        With ``mmap=True`` the arrays are memory-mapped copy-on-write instead of
+        being read into memory: pages are shared with the file and writes never
+        reach the cache.
+        """
+        entry = self._entry_dir(key)
+        if key not in self:
+            return None
+
+        try:
+            result: Dict[str, Any] = {
+                name: np.load(entry / f"{name}.npy", mmap_mode="c" if mmap else None)
+                for name in self.array_names
+            }
+            with open(entry / _TRANSFORMERS_FILE, "rb") as f:
+                result.update(pickle.load(f))
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+            # Corrupted or partially removed entry: drop it and recompute.
+            self.invalidate(key)
+            return None
+
+        # Refresh the access time used by the LRU eviction.
+        os.utime(entry / _META_FILE)
+        return result
+
+    @contextmanager
+    def open_entry(self, key: str) -> Iterator[Path]:
+        """Yield a scratch directory that becomes entry ``key`` when the block exits.
+
+        Writers fill the directory with ``<name>.npy`` arrays, the pickled
+        transformers and the metadata file (see `write_transformers`), e.g. via
+        ``np.lib.format.open_memmap`` for arrays larger than memory. The entry is
+        published atomically; on error the scratch directory is discarded.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.cache_dir / f".{key}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        try:
+            yield tmp
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+
+        try:
+            os.replace(tmp, self._entry_dir(key))
+        except OSError:
+            # Another process stored the same entry first; theirs is equivalent.
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    @staticmethod
+    def write_transformers(
+        entry: Path, transformers: Dict[str, Any], meta: Optional[Dict[str, Any]] = None
+    ) -> None:
+        with open(entry / _TRANSFORMERS_FILE, "wb") as f:
+            pickle.dump(transformers, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(entry / _META_FILE, "w") as f:
+            json.dump({"created": time.time(), **(meta or {})}, f, default=str)
+
+    def put(
+        self,
+        key: str,
+        arrays: Dict[str, np.ndarray],
+        transformers: Dict[str, Any],
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Store an entry atomically and evict old entries if the cache is over budget."""
+        with self.open_entry(key) as entry:
+            for name in self.array_names:
+                np.save(entry / f"{name}.npy", np.ascontiguousarray(arrays[name]))
+            self.write_transformers(entry, transformers, meta)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Remove one entry, or the whole cache when ``key`` is ``None``."""
+        if key is None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            return
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def entries(self) -> Dict[str, Dict[str, float]]:
+        """Return ``{key: {"bytes": ..., "last_access": ...}}`` for every complete entry."""
+        if not self.cache_dir.is_dir():
+            return {}
+
+        entries = {}
+        for entry in self.cache_dir.iterdir():
+            meta = entry / _META_FILE
+            if entry.name.startswith(".") or not meta.is_file():
+                continue
+            size = sum(f.stat().st_size for f in entry.iterdir() if f.is_file())
+            entries[entry.name] = {
+                "bytes": size,
+                "last_access": meta.stat().st_mtime,
+            }
+        return entries
+
+    def size(self) -> int:
+        return sum(e["bytes"] for e in self.entries().values())
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """Delete least-recently-used entries until the cache fits in ``max_bytes``.
+
+        ``keep`` (typically the entry just written) is never evicted, even when it
+        alone exceeds the budget.
+        """
+        entries = self.entries()
+        total = sum(e["bytes"] for e in entries.values())
+        for key, entry in sorted(entries.items(), key=lambda kv: kv[1]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.invalidate(key)
+            total -= entry["bytes"]
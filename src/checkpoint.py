@@ -0,0 +1,262 @@
+"""Per-round checkpoints of a running experiment, and resuming from them.
+
+A checkpoint holds everything the rest of the run depends on:
+
+* the server state (global model, round counter, participants), as fluke's
+  `Server.state_dict`, plus the server-side per-client state of the mixins
+  (vmap momentum buffers, compression error feedback and byte counts, virtual
+  clock and latency draws, client sampler caches, secure aggregation timings,
+  dropouts and failed rounds);
+* every client's model, optimizer and scheduler state (`Client.state_dict`);
+* the row order of the clients' shuffled loaders: fluke's `FastDataLoader`
+  re-permutes its tensors at every epoch starting from the previous order, so
+  the order is state too (the index vector of an `IndexedDataLoader`, the
+  tensors of a `FastDataLoader`, which are replaced, never modified in place,
+  and therefore stored without copying them first);
+* the torch (CPU and CUDA), numpy and python global RNG states;
+* the state of the observers accumulating results over the run (the
+  `EarlyStopper` best value and counters, the `RunRecorder` rounds), as
+  returned by their ``state_dict`` method.
+
+`Checkpointer` is a `ServerObserver` that takes one at the end of every
+``every``-th round. The state is copied on the server thread, then written by
+a single background thread to a temporary file that is fsynced and renamed
+into place, so a crash never leaves a partial checkpoint behind. Only the
+``keep`` most recent checkpoints are kept. At most one write is in flight: a
+new checkpoint first waits for the previous one. With asynchronous
+evaluation (`AsyncEvalMixin`) the evaluations still in flight are delivered
+before the copy, so the observers' state covers every round checkpointed.
+
+`restore` loads a checkpoint into a freshly built algorithm (same data,
+seed and hyper-parameters). Training then continues exactly where the
+checkpointed run was at the end of that round, so the resumed run ends with
+the same model as an uninterrupted one. Clients must live in the server
+process (``client_workers`` 0 or unset): worker processes keep their clients'
+state to themselves.
+"""
+
+import copy
+import os
+import random
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+from fluke.algorithms import CentralizedFL
+from fluke.data import FastDataLoader
+from fluke.utils import ServerObserver
+
+from src.feature_store import IndexedDataLoader
+
+_CHECKPOINT_RE = re.compile(r"round_(\d+)\.pt$")
+
+# Server attributes holding training state beyond `Server.state_dict`
+_EXTRA_SERVER_STATE = (
+    "_momentum_buffers",
+    "_residuals",
+    "upload_bytes",
+    "raw_upload_bytes",
+    "clock",
+    "clock_log",
+    "latency_model",
+    "client_sampler",
+    "secagg_seconds",
+    "secagg_bytes",
+    "dropped",
+    "failed_rounds",
+)
+
+
+def _rng_state() -> Dict[str, Any]:
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def _set_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _loader_state(loader: Optional[FastDataLoader]) -> Optional[Dict[str, Any]]:
+    if loader is None or not getattr(loader, "shuffle", False):
+        return None
+    if isinstance(loader, IndexedDataLoader):
+        return {"indices": loader.indices}
+    if isinstance(loader, FastDataLoader):
+        return {"tensors": list(loader.tensors)}
+    return None
+
+
+def _set_loader_state(loader: Optional[FastDataLoader], state: Optional[Dict[str, Any]]) -> None:
+    if state is None:
+        return
+    if "indices" in state:
+        loader.indices = state["indices"]
+    else:
+        loader.tensors = state["tensors"]
+
+
+def capture(algo: CentralizedFL, round: int, observers: Sequence[Any] = ()) -> Dict[str, Any]:
+    """Copy of the state of ``algo`` (and of ``observers``) at the end of ``round``."""
+    server = algo.server
+    state = {
+        "round": round,
+        "server": server.state_dict(),
+        "server_extra": {
+            name: getattr(server, name) for name in _EXTRA_SERVER_STATE if hasattr(server, name)
+        },
+        "clients": [client.state_dict() for client in algo.clients],
+        "rng": _rng_state(),
+        "observers": {type(observer).__name__: observer.state_dict() for observer in observers},
+    }
+    # `end_round` is notified before the server increments its round counter
+    state["server"]["rounds"] = round
+    state = copy.deepcopy(state)
+    state["loaders"] = [
+        (_loader_state(client.train_set), _loader_state(client.test_set))
+        for client in algo.clients
+    ]
+    return state
+
+
+def restore(algo: CentralizedFL, state: Dict[str, Any], observers: Sequence[Any] = ()) -> int:
+    """Load ``state`` (see `capture`) into ``algo`` and ``observers``; returns its round."""
+    server = algo.server
+    server.model.load_state_dict(state["server"]["model"])
+    server.rounds = state["server"]["rounds"]
+    server._participants = set(state["server"]["participants"])
+    for name, value in state["server_extra"].items():
+        setattr(server, name, value)
+
+    for client, client_state in zip(algo.clients, state["clients"]):
+        # Same as `fluke.client.Client.load`, from memory
+        if client_state["modopt"]["model"] is not None:
+            client.model = copy.deepcopy(server.model)
+            client.optimizer, client.scheduler = client._optimizer_cfg(client.model)
+            client._modopt.load_state_dict(client_state["modopt"])
+        else:
+            client.model = None
+        client._last_round = client_state["last_round"]
+
+    for client, (train_state, test_state) in zip(algo.clients, state["loaders"]):
+        _set_loader_state(client.train_set, train_state)
+        _set_loader_state(client.test_set, test_state)
+
+    for observer in observers:
+        name = type(observer).__name__
+        if name not in state["observers"]:
+            raise ValueError(f"The checkpoint has no {name} state")
+        observer.load_state_dict(state["observers"][name])
+
+    _set_rng_state(state["rng"])
+    return state["round"]
+
+
+def checkpoint_files(directory: Union[str, Path]) -> List[Path]:
+    """The checkpoints in ``directory``, oldest round first."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    found = []
+    for path in directory.iterdir():
+        match = _CHECKPOINT_RE.search(path.name)
+        if match:
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+
+def load_checkpoint(path: Union[str, Path]) -> Dict[str, Any]:
+    """Load a checkpoint file, or the latest checkpoint of a directory."""
+    path = Path(path)
+    if path.is_dir():
+        files = checkpoint_files(path)
+        if not files:
+            raise FileNotFoundError(f"No checkpoint in {path}")
+        path = files[-1]
+    return torch.load(path, weights_only=False)
+
+
+class Checkpointer(ServerObserver):
+    """Write a checkpoint of ``algo`` every ``every`` rounds, in the background.
+
+    Args:
+        algo: The running algorithm.
+        directory: Where the ``round_<n>.pt`` files are written.
+        every: Checkpoint frequency, in rounds.
+        keep: Number of most recent checkpoints kept, older ones are deleted
+            (0 keeps them all).
+        observers: Observers of the run whose state is checkpointed too (they
+            have ``state_dict`` and ``load_state_dict`` methods).
+    """
+
+    def __init__(
+        self,
+        algo: CentralizedFL,
+        directory: Union[str, Path],
+        every: int = 1,
+        keep: int = 3,
+        observers: Sequence[Any] = (),
+    ):
+        self.algo = algo
+        self.observers = list(observers)
+        self.directory = Path(directory)
+        self.every = every
+        self.keep = keep
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
+
+    def _write(self, round: int, state: Dict[str, Any]) -> None:
+        path = self.directory / f"round_{round:05d}.pt"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            torch.save(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        if self.keep > 0:
+            for old in checkpoint_files(self.directory)[: -self.keep]:
+                old.unlink(missing_ok=True)
+
+    def wait(self) -> None:
+        """Wait for the checkpoint being written, if any (re-raising its error)."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def end_round(self, round: int) -> None:
+        if round % self.every != 0:
+            return
+        # Asynchronous evaluations of this round and earlier ones update the observers
+        flush_evaluations = getattr(self.algo.server, "flush_evaluations", None)
+        if flush_evaluations is not None:
+            flush_evaluations()
+        state = capture(self.algo, round, self.observers)
+        self.wait()
+        if self._executor is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = self._executor.submit(self._write, round, state)
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def finished(self, round: int) -> None:
+        self.close()
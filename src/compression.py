@@ -0,0 +1,155 @@
+"""Compressed client-to-server model updates, with upload accounting.
+
+Each client's update is the delta between the model it sends and the global
+model of the round. `CompressedUpdatesMixin` encodes every delta received by
+the server with one of the compressors below, decodes it, and hands the
+server's aggregation ``global + decoded delta`` in place of the client model.
+The result is the model the server would reconstruct from the compressed
+message. Compressing on the server side of the channel covers every client
+class (FedAVG, FedProx, FairFedAVG...) and every round executor (in-process,
+worker processes, vmap). It is also what makes it simulation-only: the
+error-feedback memory that would live on each client is kept by the server,
+per client index.
+
+* ``topk``: the ``ratio`` largest-magnitude entries of the whole update
+  (values and int32 indices are sent), with error feedback: what is dropped is
+  added to the client's next update.
+* ``qsgd``: per-tensor ``bits``-bit (8 by default) stochastic quantization
+  between the tensor's min and max; unbiased, so no error feedback.
+* ``lowrank``: rank-``rank`` truncated SVD of every weight matrix (vectors are
+  sent as is), with error feedback.
+
+Bytes are counted as a float32/int32 encoding of the message would take.
+``upload_bytes[round][client]`` holds the counts and ``raw_upload_bytes`` the
+same for the uncompressed updates.
+"""
+
+from typing import Dict, Iterable, Optional
+
+import torch
+from fluke import DDict, FlukeENV
+from fluke.client import Client
+
+from src.parallel import client_seed
+
+COMPRESSORS = ("none", "topk", "qsgd", "lowrank")
+
+
+def _dense_bytes(tensor: torch.Tensor) -> int:
+    return tensor.numel() * tensor.element_size()
+
+
+def topk(
+    delta: Dict[str, torch.Tensor], ratio: float, residual: Optional[Dict[str, torch.Tensor]]
+) -> tuple:
+    """Keep the ``ratio`` largest entries of ``delta`` (plus ``residual``) over all tensors."""
+    if residual is not None:
+        delta = {name: d + residual[name] for name, d in delta.items()}
+    flat = torch.cat([d.flatten() for d in delta.values()])
+    k = max(1, int(flat.numel() * ratio))
+    kept = torch.zeros_like(flat)
+    indices = flat.abs().topk(k, sorted=False).indices
+    kept[indices] = flat[indices]
+
+    decoded, offset = {}, 0
+    for name, d in delta.items():
+        decoded[name] = kept[offset : offset + d.numel()].view_as(d)
+        offset += d.numel()
+    new_residual = {name: delta[name] - decoded[name] for name in delta}
+    return decoded, new_residual, k * (4 + 4)
+
+
+def qsgd(delta: Dict[str, torch.Tensor], bits: int, generator: torch.Generator) -> tuple:
+    """Stochastic ``bits``-bit quantization of every tensor between its min and max."""
+    levels = 2**bits - 1
+    decoded, nbytes = {}, 0
+    for name, d in delta.items():
+        low, high = d.min(), d.max()
+        scale = (high - low).clamp_min(1e-12) / levels
+        noise = torch.rand(d.shape, generator=generator, dtype=d.dtype)
+        q = torch.floor((d - low) / scale + noise).clamp_(0, levels)
+        decoded[name] = q * scale + low
+        nbytes += (d.numel() * bits + 7) // 8 + 2 * 4  # codes, plus min and scale
+    return decoded, nbytes
+
+
+def lowrank(
+    delta: Dict[str, torch.Tensor], rank: int, residual: Optional[Dict[str, torch.Tensor]]
+) -> tuple:
+    """Rank-``rank`` truncated SVD of every matrix of ``delta`` (plus ``residual``)."""
+    if residual is not None:
+        delta = {name: d + residual[name] for name, d in delta.items()}
+    decoded, nbytes = {}, 0
+    for name, d in delta.items():
+        if d.dim() != 2 or min(d.shape) <= rank:
+            decoded[name] = d
+            nbytes += _dense_bytes(d)
+            continue
+        U, S, Vh = torch.linalg.svd(d, full_matrices=False)
+        decoded[name] = (U[:, :rank] * S[:rank]) @ Vh[:rank]
+        nbytes += (d.shape[0] + d.shape[1]) * rank * 4
+    new_residual = {name: delta[name] - decoded[name] for name in delta}
+    return decoded, new_residual, nbytes
+
+
+class CompressedUpdatesMixin:
+    """Server mixin compressing the clients' model updates (see the module docstring).
+
+    Args:
+        compression: ``DDict(method=..., ratio=0.01, bits=8, rank=4, error_feedback=True)``;
+            ``method`` is one of `COMPRESSORS`.
+    """
+
+    def __init__(self, *args, compression: Optional[dict] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        cfg = DDict(method="none", ratio=0.01, bits=8, rank=4, error_feedback=True)
+        cfg.update(compression or {})
+        if cfg.method not in COMPRESSORS:
+            raise ValueError(f"Unknown compression {cfg.method!r} (expected one of {COMPRESSORS})")
+        self.compression = cfg
+        self.upload_bytes: Dict[int, Dict[int, int]] = {}
+        self.raw_upload_bytes: Dict[int, Dict[int, int]] = {}
+        self._residuals: Dict[int, Dict[str, torch.Tensor]] = {}
+
+    def _encode(self, client: Client, round: int, delta: Dict[str, torch.Tensor]) -> tuple:
+        cfg = self.compression
+        residual = self._residuals.get(client.index) if cfg.error_feedback else None
+        if cfg.method == "topk":
+            decoded, residual, nbytes = topk(delta, cfg.ratio, residual)
+        elif cfg.method == "lowrank":
+            decoded, residual, nbytes = lowrank(delta, cfg.rank, residual)
+        elif cfg.method == "qsgd":
+            # A private generator: the quantization noise leaves the global RNG streams untouched
+            generator = torch.Generator().manual_seed(
+                client_seed(FlukeENV().get_seed(), round, client.index)
+            )
+            decoded, nbytes = qsgd(delta, cfg.bits, generator)
+        else:
+            decoded, nbytes = delta, sum(_dense_bytes(d) for d in delta.values())
+
+        if cfg.error_feedback and cfg.method in ("topk", "lowrank"):
+            self._residuals[client.index] = residual
+        return decoded, nbytes
+
+    def receive_client_models(
+        self, eligible: Iterable[Client], state_dict: bool = True
+    ) -> Iterable:
+        round = self.rounds + 1
+        base = {name: p.detach().clone() for name, p in self.model.named_parameters()}
+        sent = self.upload_bytes.setdefault(round, {})
+        raw = self.raw_upload_bytes.setdefault(round, {})
+
+        models = super().receive_client_models(eligible, state_dict=False)
+        for client, model in zip(eligible, models):
+            params = dict(model.named_parameters())
+            with torch.no_grad():
+                delta = {name: params[name].detach() - base[name] for name in base}
+                decoded, nbytes = self._encode(client, round, delta)
+                if self.compression.method != "none":
+                    for name, d in decoded.items():
+                        params[name].copy_(base[name] + d)
+            # Buffers (e.g. BatchNorm statistics) travel uncompressed
+            buffer_bytes = sum(_dense_bytes(b) for b in model.buffers())
+            sent[client.index] = nbytes + buffer_bytes
+            raw[client.index] = sum(_dense_bytes(d) for d in delta.values()) + buffer_bytes
+            yield model.state_dict() if state_dict else model
@@ -10,6 +10,8 @@ from sklearn.preprocessing import StandardScaler
 
 from fluke.data import DataContainer
 
+from src.cache import PreprocessingCache
+
 
 DIABETES_FILE = "diabetic_data.csv"
 DEFAULT_SAMPLE_SIZE = 1000
@@ -100,7 +102,7 @@ def _resolve_filepath(filepath: str) -> Path:
 
 
 def _load_diabetes_dataframe(filepath: str) -> pd.DataFrame:
-    path = _resolve_filepath(filepath)
+    path = _resolve_filepath(str(filepath))
     df = pd.read_csv(path)
     df.replace("?", np.nan, inplace=True)
     return df
@@ -140,49 +142,229 @@ def _prepare_features(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def load_and_preprocess_data(
-    filepath: str = DIABETES_FILE,
-    test_size: float = 0.2,
-    seed: int = 42,
-    sample_size: Optional[int] = None,
-):
-    df = _load_diabetes_dataframe(filepath)
-    df = _prepare_features(df)
+# Columns decoded through a fixed value -> code lookup table.
+CODED_COLUMNS = {
+    "gender": GENDER_MAP,
+    "age": AGE_MAP,
+    **{col: MEDICATION_MAP for col in MEDICATION_COLUMNS},
+}
+MISSING_LABEL = "missing"
+
+
+def _read_header(path: Path) -> list[str]:
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _csv_read_options(columns: list[str]) -> dict:
+    """``pd.read_csv`` options declaring the dtype and missing markers of each column.
+
+    One-hot columns keep ``"?"`` as a category so `_category_labels` can tell which
+    columns pandas would have parsed as numbers in `_load_diabetes_dataframe`.
+    """
+    usecols = [col for col in columns if col not in DROP_COLUMNS]
+    dtype = {}
+    na_values = {}
+    for col in usecols:
+        if col in CATEGORICAL_COLUMNS:
+            dtype[col] = "category"
+            continue
+        if col in CODED_COLUMNS or col == "readmitted":
+            dtype[col] = "category"
+        elif col in SCALER_COLUMNS:
+            dtype[col] = np.float64
+        na_values[col] = ["?"]
+    return {"usecols": usecols, "dtype": dtype, "na_values": na_values}
+
+
+def _category_labels(categories: pd.Index, has_na: bool) -> np.ndarray:
+    """Map raw CSV categories to the labels ``_prepare_features`` one-hot encodes.
+
+    The legacy path reads columns with pandas' type inference and then calls
+    ``astype(str)``, so purely numeric columns are labelled ``"1"`` (int64) or
+    ``"1.0"`` (float64, when the column had empty cells) rather than with their
+    raw text.
+    """
+    raw = np.asarray(categories, dtype=object)
+    numeric = np.asarray(pd.to_numeric(categories, errors="coerce"), dtype=np.float64)
+    if raw.size and not np.isnan(numeric).any():
+        if has_na or (numeric % 1 != 0).any():
+            return numeric.astype(str).astype(object)
+        return numeric.astype(np.int64).astype(str).astype(object)
+
+    labels = raw.copy()
+    labels[raw == "?"] = MISSING_LABEL
+    return labels
+
+
+def _decode(col: str, series: pd.Series, rows: np.ndarray, mapping: dict) -> np.ndarray:
+    categories = series.cat.categories
+    lookup = np.array([mapping.get(cat, -1) for cat in categories] + [0], dtype=np.int64)
+    codes = series.cat.codes.to_numpy()[rows]
+    # Missing values (code -1) hit the trailing 0, i.e. a missing medication is "No";
+    # age/gender NaNs have already been filtered out.
+    values = lookup[codes]
+    unknown = np.unique(codes[(values < 0) & (codes >= 0)])
+    if unknown.size:
+        raise ValueError(
+            f"Unexpected values {list(categories[unknown])} in column '{col}'."
+        )
+    return values
+
+
+def _feature_row_mask(df: pd.DataFrame) -> np.ndarray:
+    """Rows kept by the gender/required-column filters of ``_prepare_features``."""
+    keep = np.ones(len(df), dtype=bool)
+    if "gender" in df.columns:
+        keep &= (df["gender"] != "Unknown/Invalid").to_numpy()
+    for col in ("race", "gender", "age"):
+        if col in df.columns:
+            keep &= df[col].notna().to_numpy()
+            if col in CATEGORICAL_COLUMNS:
+                keep &= (df[col] != "?").to_numpy()
+    return keep
 
+
+def _target_values(df: pd.DataFrame) -> np.ndarray:
+    """Binary target per row, -1 for values outside ``TARGET_MAP``."""
     if "readmitted" not in df.columns:
         raise ValueError("Column 'readmitted' is required in the dataset.")
+    series = df["readmitted"]
+    lookup = np.array([TARGET_MAP.get(cat, -1) for cat in series.cat.categories] + [-1])
+    return lookup[series.cat.codes.to_numpy()]
+
+
+def _scan_categories(df: pd.DataFrame, keep: np.ndarray, stats: dict) -> None:
+    """Accumulate, per one-hot column, the raw categories seen in ``df``.
+
+    ``stats`` can be updated chunk after chunk; `_feature_layout` turns it into
+    the final one-hot vocabulary.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col not in df.columns:
+            continue
+        col_stats = stats.setdefault(
+            col, {"raw": set(), "has_na": False, "present": set(), "present_na": False}
+        )
+        categories = df[col].cat.categories
+        # Shift codes by one so NaN (-1) lands in slot 0
+        counts = np.bincount(df[col].cat.codes.to_numpy() + 1, minlength=len(categories) + 1)
+        kept = np.bincount(
+            df[col].cat.codes.to_numpy()[keep] + 1, minlength=len(categories) + 1
+        )
+        col_stats["raw"].update(categories[counts[1:] > 0])
+        col_stats["has_na"] |= bool(counts[0])
+        col_stats["present"].update(categories[kept[1:] > 0])
+        col_stats["present_na"] |= bool(kept[0])
+
+
+def _feature_layout(columns: list[str], stats: dict) -> dict:
+    """Feature order and one-hot vocabularies, as ``_prepare_features`` lays them out."""
+    usecols = [col for col in columns if col not in DROP_COLUMNS]
+    cat_cols = [col for col in CATEGORICAL_COLUMNS if col in usecols]
+    dense_cols = [col for col in usecols if col not in cat_cols and col != "readmitted"]
+
+    one_hot = {}
+    feature_names = list(dense_cols)
+    for col in cat_cols:
+        col_stats = stats[col]
+        categories = pd.Index(sorted(col_stats["raw"]), dtype=object)
+        raw_to_label = dict(
+            zip(categories, _category_labels(categories, col_stats["has_na"]))
+        )
+        # Vocabulary is taken after the row filters, like get_dummies in the legacy path.
+        present = {raw_to_label[cat] for cat in col_stats["present"]}
+        if col_stats["present_na"]:
+            present.add(MISSING_LABEL)
+        vocabulary = sorted(present)
+        index = {label: i for i, label in enumerate(vocabulary)}
+        one_hot[col] = {
+            "index": {cat: index.get(lbl, -1) for cat, lbl in raw_to_label.items()},
+            "missing": index.get(MISSING_LABEL, -1),
+            "vocabulary": vocabulary,
+        }
+        feature_names += [f"{col}_{label}" for label in vocabulary]
+
+    return {"dense": dense_cols, "one_hot": one_hot, "feature_names": feature_names}
+
+
+def _encode_rows(df: pd.DataFrame, rows: np.ndarray, layout: dict, out: np.ndarray) -> None:
+    """Write the features of ``df.iloc[rows]`` into the zero-initialised ``out``."""
+    for j, col in enumerate(layout["dense"]):
+        series = df[col]
+        if col in CODED_COLUMNS:
+            out[:, j] = _decode(col, series, rows, CODED_COLUMNS[col])
+        else:
+            out[:, j] = series.to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+
+    offset = len(layout["dense"])
+    for col, encoding in layout["one_hot"].items():
+        series = df[col]
+        index = encoding["index"]
+        lookup = np.array(
+            [index[cat] for cat in series.cat.categories] + [encoding["missing"]]
+        )
+        out[np.arange(rows.size), offset + lookup[series.cat.codes.to_numpy()[rows]]] = 1.0
+        offset += len(encoding["vocabulary"])
+
 
-    allowed_targets = list(TARGET_MAP.keys())
-    df = df[df["readmitted"].isin(allowed_targets)]
+def _load_feature_matrix(path: Path) -> tuple[np.ndarray, np.ndarray, list[str]]:
+    """Vectorized equivalent of ``_load_diabetes_dataframe`` + ``_prepare_features``.
 
-    if sample_size is not None and sample_size < len(df):
-        df = df.sample(n=sample_size, random_state=seed)
+    Reads the CSV with declared dtypes, decodes every mapped column through
+    categorical codes and writes the features into a single preallocated float32
+    matrix. Returns the matrix, the binary target and the feature names, with the
+    rows already restricted to the known ``TARGET_MAP`` values.
+    """
+    columns = _read_header(path)
+    df = pd.read_csv(path, **_csv_read_options(columns))
 
-    y = df.pop("readmitted").replace(TARGET_MAP).astype(int)
-    X = df
+    keep = _feature_row_mask(df)
+    target = _target_values(df)
+
+    stats = {}
+    _scan_categories(df, keep, stats)
+    layout = _feature_layout(columns, stats)
+
+    rows = np.flatnonzero(keep & (target >= 0))
+    X = np.zeros((rows.size, len(layout["feature_names"])), dtype=np.float32)
+    _encode_rows(df, rows, layout, X)
+
+    return X, target[rows].astype(np.int64), layout["feature_names"]
+
+
+def _preprocess(
+    path: Path,
+    test_size: float,
+    seed: int,
+    sample_size: Optional[int],
+):
+    X, y, feature_names = _load_feature_matrix(path)
 
-    stratify = y if y.nunique() > 1 else None
-    X_train, X_test, y_train, y_test = train_test_split(
-        X,
-        y,
+    if sample_size is not None and sample_size < len(y):
+        # Same draw as DataFrame.sample(n=sample_size, random_state=seed)
+        rows = pd.RangeIndex(len(y)).to_series().sample(n=sample_size, random_state=seed)
+        X, y = X[rows.to_numpy()], y[rows.to_numpy()]
+
+    stratify = y if np.unique(y).size > 1 else None
+    train_idx, test_idx = train_test_split(
+        np.arange(len(y)),
         test_size=test_size,
         random_state=seed,
         stratify=stratify,
     )
-
-    X_train = pd.DataFrame(X_train, columns=X.columns).reset_index(drop=True)
-    X_test = pd.DataFrame(X_test, columns=X.columns).reset_index(drop=True)
-    y_train = pd.Series(y_train).reset_index(drop=True)
-    y_test = pd.Series(y_test).reset_index(drop=True)
+    X_train, X_test = X[train_idx], X[test_idx]
+    y_train, y_test = y[train_idx], y[test_idx]
+    del X
 
     imputer = SimpleImputer(strategy="mean")
-    X_train_np = imputer.fit_transform(X_train.to_numpy(dtype=np.float32, copy=True))
-    X_test_np = imputer.transform(X_test.to_numpy(dtype=np.float32, copy=True))
+    X_train_np = imputer.fit_transform(X_train)
+    X_test_np = imputer.transform(X_test)
 
-    col_index = {col: idx for idx, col in enumerate(X_train.columns)}
+    col_index = {col: idx for idx, col in enumerate(feature_names)}
     scale_indices = np.array(
         [col_index[col] for col in SCALER_COLUMNS if col in col_index]
     )
+    scaler = None
     if scale_indices.size > 0:
         scaler = StandardScaler()
         X_train_np[:, scale_indices] = scaler.fit_transform(
@@ -190,25 +372,267 @@ def load_and_preprocess_data(
         )
         X_test_np[:, scale_indices] = scaler.transform(X_test_np[:, scale_indices])
 
-    X_train_tensor = torch.tensor(X_train_np, dtype=torch.float32)
-    X_test_tensor = torch.tensor(X_test_np, dtype=torch.float32)
-    y_train_tensor = torch.tensor(y_train.to_numpy(), dtype=torch.long)
-    y_test_tensor = torch.tensor(y_test.to_numpy(), dtype=torch.long)
+    arrays = {
+        "X_train": X_train_np.astype(np.float32, copy=False),
+        "X_test": X_test_np.astype(np.float32, copy=False),
+        "y_train": y_train,
+        "y_test": y_test,
+    }
+    transformers = {
+        "imputer": imputer,
+        "scaler": scaler,
+        "feature_names": feature_names,
+    }
+    return arrays, transformers
+
+
+def _split_hash(keys: np.ndarray, seed: int) -> np.ndarray:
+    """Map row keys to uniform values in [0, 1) with a seeded splitmix64 hash.
+
+    A row lands in the test set when its value is below ``test_size``, so the
+    split only depends on the row key and the seed, not on the chunking.
+    """
+    z = keys.astype(np.uint64) + np.uint64((seed * 0x9E3779B97F4A7C15) % (1 << 64))
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def _iter_chunks(
+    path: Path, options: dict, chunk_size: int, seed: int, test_size: float
+):
+    """Yield ``(chunk, is_test)`` pairs, keyed on ``encounter_id`` when available."""
+    offset = 0
+    key_col = "encounter_id" if "encounter_id" in options["usecols"] else None
+    for chunk in pd.read_csv(path, chunksize=chunk_size, **options):
+        if key_col is not None:
+            keys = chunk[key_col].to_numpy(dtype=np.uint64)
+        else:
+            keys = np.arange(offset, offset + len(chunk), dtype=np.uint64)
+        offset += len(chunk)
+        yield chunk, _split_hash(keys, seed) < test_size
+
+
+def _preprocess_streaming(
+    path: Path, test_size: float, seed: int, chunk_size: int, out_dir: Path
+) -> dict:
+    """Out-of-core counterpart of `_preprocess` writing ``.npy`` memmaps into ``out_dir``.
+
+    The CSV is read twice in chunks of ``chunk_size`` rows: a first pass fixes
+    the one-hot vocabulary and the split sizes, a second one encodes the rows
+    straight into float32 memory-mapped arrays while accumulating the imputer
+    means. Imputation, the ``StandardScaler.partial_fit`` and the scaling then
+    run block-wise over the memmaps, so peak memory is bounded by the chunk
+    size. Rows are assigned to the test set by hashing ``encounter_id`` (or the
+    row number) with the seed instead of a stratified ``train_test_split``.
+    """
+    columns = _read_header(path)
+    options = _csv_read_options(columns)
+    if "encounter_id" in columns:
+        options["usecols"].append("encounter_id")
+        options["dtype"]["encounter_id"] = np.int64
+
+    # Pass 1: one-hot vocabulary and train/test sizes
+    scan_cols = [
+        col
+        for col in options["usecols"]
+        if col in CATEGORICAL_COLUMNS
+        or col in ("gender", "age", "readmitted", "encounter_id")
+    ]
+    stats = {}
+    n_train = n_test = 0
+    for chunk, is_test in _iter_chunks(
+        path, {**options, "usecols": scan_cols}, chunk_size, seed, test_size
+    ):
+        keep = _feature_row_mask(chunk)
+        rows = keep & (_target_values(chunk) >= 0)
+        _scan_categories(chunk, keep, stats)
+        n_test += int((rows & is_test).sum())
+        n_train += int((rows & ~is_test).sum())
+
+    layout = _feature_layout(columns, stats)
+    n_features = len(layout["feature_names"])
+    open_memmap = np.lib.format.open_memmap
+    arrays = {
+        "X_train": open_memmap(out_dir / "X_train.npy", "w+", np.float32, (n_train, n_features)),
+        "X_test": open_memmap(out_dir / "X_test.npy", "w+", np.float32, (n_test, n_features)),
+        "y_train": open_memmap(out_dir / "y_train.npy", "w+", np.int64, (n_train,)),
+        "y_test": open_memmap(out_dir / "y_test.npy", "w+", np.int64, (n_test,)),
+    }
+
+    # Pass 2: encode into the memmaps, NaN-aware running means for the imputer
+    means = StandardScaler(with_std=False)
+    filled = {"train": 0, "test": 0}
+    for chunk, is_test in _iter_chunks(path, options, chunk_size, seed, test_size):
+        target = _target_values(chunk)
+        rows = _feature_row_mask(chunk) & (target >= 0)
+        for split, mask in (("train", rows & ~is_test), ("test", rows & is_test)):
+            split_rows = np.flatnonzero(mask)
+            start, stop = filled[split], filled[split] + split_rows.size
+            block = arrays[f"X_{split}"][start:stop]
+            _encode_rows(chunk, split_rows, layout, block)
+            arrays[f"y_{split}"][start:stop] = target[split_rows]
+            if split == "train" and split_rows.size:
+                means.partial_fit(block)
+            filled[split] = stop
+
+    imputer = SimpleImputer(strategy="mean", keep_empty_features=True)
+    statistics = means.mean_ if n_train else np.full(n_features, np.nan)
+    imputer.fit(statistics[None, :])
+    fill = imputer.statistics_.astype(np.float32)
+
+    col_index = {col: idx for idx, col in enumerate(layout["feature_names"])}
+    scale_indices = np.array(
+        [col_index[col] for col in SCALER_COLUMNS if col in col_index], dtype=np.int64
+    )
+
+    def blocks(X):
+        for start in range(0, X.shape[0], chunk_size):
+            yield X[start : start + chunk_size]
+
+    # Pass 3: impute in place and fit the scaler on the imputed train rows
+    scaler = StandardScaler() if scale_indices.size and n_train else None
+    for split in ("train", "test"):
+        for block in blocks(arrays[f"X_{split}"]):
+            missing = np.isnan(block)
+            if missing.any():
+                block[missing] = fill[np.nonzero(missing)[1]]
+            if split == "train" and scaler is not None:
+                scaler.partial_fit(block[:, scale_indices])
+
+    # Pass 4: scale in place
+    if scaler is not None:
+        for split in ("train", "test"):
+            for block in blocks(arrays[f"X_{split}"]):
+                block[:, scale_indices] = scaler.transform(block[:, scale_indices])
+
+    for array in arrays.values():
+        array.flush()
+
+    return {"imputer": imputer, "scaler": scaler, "feature_names": layout["feature_names"]}
+
+
+def _cache_params(test_size: float, seed: int, sample_size: Optional[int]) -> dict:
+    return {
+        "test_size": test_size,
+        "seed": seed,
+        "sample_size": sample_size,
+        "drop_columns": DROP_COLUMNS,
+        "medication_columns": MEDICATION_COLUMNS,
+        "categorical_columns": CATEGORICAL_COLUMNS,
+        "scaler_columns": SCALER_COLUMNS,
+        "maps": [GENDER_MAP, MEDICATION_MAP, TARGET_MAP, AGE_MAP],
+    }
+
+
+def _load_entry(
+    filepath: str = DIABETES_FILE,
+    test_size: float = 0.2,
+    seed: int = 42,
+    sample_size: Optional[int] = None,
+    cache: Optional[PreprocessingCache] = None,
+    chunk_size: Optional[int] = None,
+    mmap: bool = False,
+) -> dict:
+    """The preprocessed arrays and the fitted transformers (cached, mapped or computed)."""
+    path = _resolve_filepath(filepath)
+
+    if chunk_size is not None or mmap:
+        entry = _load_mapped(path, test_size, seed, sample_size, cache, chunk_size)
+    else:
+        entry = None
+        if cache is not None:
+            key = cache.make_key(path, **_cache_params(test_size, seed, sample_size))
+            entry = cache.get(key)
+
+        if entry is None:
+            arrays, transformers = _preprocess(path, test_size, seed, sample_size)
+            if cache is not None:
+                cache.put(key, arrays, transformers, meta={"source": str(path)})
+            entry = {**arrays, **transformers}
+    return entry
+
+
+def load_and_preprocess_data(
+    filepath: str = DIABETES_FILE,
+    test_size: float = 0.2,
+    seed: int = 42,
+    sample_size: Optional[int] = None,
+    cache: Optional[PreprocessingCache] = None,
+    chunk_size: Optional[int] = None,
+    mmap: bool = False,
+):
+    entry = _load_entry(filepath, test_size, seed, sample_size, cache, chunk_size, mmap)
+    X_train_tensor = torch.from_numpy(entry["X_train"])
+    X_test_tensor = torch.from_numpy(entry["X_test"])
+    y_train_tensor = torch.from_numpy(entry["y_train"])
+    y_test_tensor = torch.from_numpy(entry["y_test"])
 
     return X_train_tensor, X_test_tensor, y_train_tensor, y_test_tensor
 
 
+def _load_mapped(
+    path: Path,
+    test_size: float,
+    seed: int,
+    sample_size: Optional[int],
+    cache: Optional[PreprocessingCache],
+    chunk_size: Optional[int],
+) -> dict:
+    """Return the cache entry memory-mapped, computing it first on a miss.
+
+    The arrays are persisted once as ``.npy`` files, so every tensor built on
+    top of them (and every process mapping them) shares the same page cache.
+    """
+    if chunk_size is not None and sample_size is not None:
+        raise ValueError("sample_size is not supported with chunk_size (streaming mode).")
+
+    # The memmaps have to live somewhere: mapped loading always goes through a cache.
+    cache = cache or PreprocessingCache()
+    params = _cache_params(test_size, seed, sample_size)
+    # The hash split does not depend on the chunking: one entry serves every chunk_size
+    if chunk_size is not None:
+        key = cache.make_key(path, **params, split="hash")
+    else:
+        key = cache.make_key(path, **params)
+
+    entry = cache.get(key, mmap=True)
+    if entry is None:
+        if chunk_size is not None:
+            with cache.open_entry(key) as out_dir:
+                transformers = _preprocess_streaming(path, test_size, seed, chunk_size, out_dir)
+                cache.write_transformers(out_dir, transformers, meta={"source": str(path)})
+        else:
+            arrays, transformers = _preprocess(path, test_size, seed, sample_size)
+            cache.put(key, arrays, transformers, meta={"source": str(path)})
+        entry = cache.get(key, mmap=True)
+    return entry
+
+
 def get_fluke_dataset(
     filepath: str = DIABETES_FILE,
     batch_size: int = 32,
     sample_size: Optional[int] = DEFAULT_SAMPLE_SIZE,
+    cache: Optional[PreprocessingCache] = None,
+    chunk_size: Optional[int] = None,
+    mmap: bool = False,
 ):
-    X_train, X_test, y_train, y_test = load_and_preprocess_data(
-        filepath=filepath, sample_size=sample_size
+    entry = _load_entry(
+        filepath=filepath,
+        sample_size=sample_size,
+        cache=cache,
+        chunk_size=chunk_size,
+        mmap=mmap,
+    )
+    X_train, X_test, y_train, y_test = (
+        torch.from_numpy(entry[name]) for name in ("X_train", "X_test", "y_train", "y_test")
     )
 
     data_container = DataContainer(
         X_train=X_train, y_train=y_train, X_test=X_test, y_test=y_test, num_classes=2
     )
+    # Natural splits group the clients by a source column (see src/partition.py)
+    data_container.feature_names = list(entry["feature_names"])
 
     return data_container, X_train.shape[1]
@@ -1,3 +1,31 @@
+"""FedAVG client with a fairness regularizer, and an opt-in fast training path.
+
+`FairClient.fit` is fluke's usual loop: batches from the client's
+`FastDataLoader`, moved to the device one by one, and the loss read back
+(``.item()``) after every step. For a small MLP on 32-sample batches this
+bookkeeping costs as much as the arithmetic. With ``fast_training=True``:
+
+* the client's training tensors are moved to its device once and stay there.
+  Every epoch shuffles the loader as its own iteration would (same
+  ``randperm``; checkpoints see the same loader state) and the resident copy
+  with it, so the batches, and on CPU the trained model, are exactly those of
+  the usual loop. On CPU the resident tensors of a `FastDataLoader` are its
+  own; an `IndexedDataLoader` (``mmap``) gets a private copy of its rows;
+* the loss is accumulated on the device and read once per fit;
+* on CPU the model is not moved and the CUDA cache is not cleared after the fit.
+
+Two options apply to the fast path:
+
+* ``compile_model``: the model's forward goes through ``torch.compile``. The
+  compiled forward is cached per model class and shared by all the clients of
+  the process, so it is compiled once (a few seconds, plus a recompilation
+  for a new batch shape), not per client or per round. Inductor draws the
+  dropout masks from its own RNG, so results are no longer identical to eager.
+* ``bf16``: the forward pass and the loss run under bfloat16 autocast.
+"""
+
+from typing import Callable, Dict, Iterator, Optional
+
 import torch
 import torch.nn as nn
 from fluke.client import Client
@@ -6,6 +34,30 @@ from fluke.config import OptimizerConfigurator
 from fluke import DDict
 from fluke.utils import clear_cuda_cache
 
+from src.feature_store import IndexedDataLoader
+from src.tracing import span
+
+# torch.compile'd forward per model class, shared by every client of the process
+_COMPILED_FORWARD: Dict[type, Callable] = {}
+
+
+def _compiled_forward(model: nn.Module) -> Callable:
+    model_class = type(model)
+    if model_class not in _COMPILED_FORWARD:
+        _COMPILED_FORWARD[model_class] = torch.compile(model_class.forward)
+    return _COMPILED_FORWARD[model_class]
+
+
+def _batches(tensors: list, loader: FastDataLoader) -> Iterator[tuple]:
+    """The batches `FastDataLoader` yields from (already shuffled) ``tensors``."""
+    for start in range(0, loader.size, loader.batch_size):
+        batch = tuple(t[start : start + loader.batch_size] for t in tensors)
+        if loader.skip_singleton and batch[0].shape[0] == 1:
+            return
+        yield batch
+        if loader.single_batch:
+            return
+
 
 class FairClient(Client):
     def __init__(
@@ -19,16 +71,28 @@ class FairClient(Client):
         fairness_lambda: float = 0.0,
         protected_attr_index: int = 0,
         sensitive_group_val: int = 0,
+        fast_training: bool = False,
+        compile_model: bool = False,
+        bf16: bool = False,
         **kwargs,
     ):
         super().__init__(
             index, train_set, test_set, optimizer_cfg, loss_fn, local_epochs, **kwargs
         )
+        if (compile_model or bf16) and not fast_training:
+            raise ValueError("compile_model and bf16 are options of fast_training")
         self.hyper_params.update(
             fairness_lambda=fairness_lambda,
             protected_attr_index=protected_attr_index,
             sensitive_group_val=sensitive_group_val,
+            fast_training=fast_training,
+            compile_model=compile_model,
+            bf16=bf16,
         )
+        # Training tensors kept on the device by the fast path, and the loader
+        # state they were copied from
+        self._resident: Optional[list] = None
+        self._resident_source: Optional[torch.Tensor] = None
 
     def _fairness_regularization(
         self, preds: torch.Tensor, inputs: torch.Tensor
@@ -56,6 +120,75 @@ class FairClient(Client):
         # We penalize the absolute covariance
         return torch.abs(covariance)
 
+    def _loss(self, forward: Callable, X: torch.Tensor, y: torch.Tensor) -> torch.Tensor:
+        y_hat = forward(X)
+
+        # Standard Task Loss
+        task_loss = self.hyper_params.loss_fn(y_hat, y)
+
+        # Fairness Regularization
+        fair_reg = 0.0
+        if self.hyper_params.fairness_lambda > 0:
+            fair_reg = self._fairness_regularization(y_hat, X)
+
+        return task_loss + (self.hyper_params.fairness_lambda * fair_reg)
+
+    def _loader_source(self) -> torch.Tensor:
+        loader = self.train_set
+        return loader.indices if isinstance(loader, IndexedDataLoader) else loader.tensors[0]
+
+    def _shuffle(self, tensors: list) -> list:
+        """Shuffle the loader as its iteration would, and ``tensors`` (its resident copy) alike."""
+        loader = self.train_set
+        r = torch.randperm(loader.size)
+        if isinstance(loader, IndexedDataLoader):
+            loader.indices = loader.indices[r]
+        else:
+            loader.tensors = [t[r] for t in loader.tensors]
+            if self.device.type == "cpu":
+                self._resident_source = loader.tensors[0]
+                return loader.tensors
+        self._resident_source = self._loader_source()
+        r = r.to(self.device)
+        return [t[r] for t in tensors]
+
+    def _fast_fit(self, epochs: int) -> torch.Tensor:
+        loader = self.train_set
+        # (Re)copy when the loader's state was replaced, e.g. by a checkpoint restore
+        if self._resident is None or self._resident_source is not self._loader_source():
+            self._resident = [t.to(self.device) for t in loader.tensors]
+            self._resident_source = self._loader_source()
+        tensors = self._resident
+
+        if self.hyper_params.compile_model:
+            compiled = _compiled_forward(self.model)
+            forward = lambda X: compiled(self.model, X)  # noqa: E731
+        else:
+            forward = self.model
+        autocast = torch.autocast(
+            self.device.type, dtype=torch.bfloat16, enabled=self.hyper_params.bf16
+        )
+
+        running_loss = torch.zeros((), device=self.device)
+        for _ in range(epochs):
+            if loader.shuffle:
+                tensors = self._shuffle(tensors)
+            for X, y in _batches(tensors, loader):
+                self.optimizer.zero_grad()
+                with span("forward"), autocast:
+                    total_loss = self._loss(forward, X, y)
+                with span("backward"):
+                    total_loss.backward()
+                with span("step"):
+                    self.optimizer.step()
+                running_loss += total_loss.detach()
+
+            if self.scheduler:
+                self.scheduler.step()
+
+        self._resident = tensors
+        return running_loss
+
     def fit(self, override_local_epochs: int = 0) -> float:
         epochs = (
             override_local_epochs
@@ -69,6 +202,14 @@ class FairClient(Client):
         if self.optimizer is None:
             self.optimizer, self.scheduler = self._optimizer_cfg(self.model)
 
+        if self.hyper_params.fast_training:
+            running_loss = self._fast_fit(epochs).item()
+            running_loss /= epochs * len(self.train_set)
+            if self.device.type != "cpu":
+                self.model.cpu()
+                clear_cuda_cache()
+            return running_loss
+
         running_loss = 0.0
 
         for _ in range(epochs):
@@ -76,20 +217,14 @@ class FairClient(Client):
                 X, y = X.to(self.device), y.to(self.device)
                 self.optimizer.zero_grad()
 
-                y_hat = self.model(X)
-
-                # Standard Task Loss
-                task_loss = self.hyper_params.loss_fn(y_hat, y)
-
-                # Fairness Regularization
-                fair_reg = 0.0
-                if self.hyper_params.fairness_lambda > 0:
-                    fair_reg = self._fairness_regularization(y_hat, X)
-
-                total_loss = task_loss + (self.hyper_params.fairness_lambda * fair_reg)
+                # Spans are no-ops unless a tracer is installed (src/tracing.py)
+                with span("forward"):
+                    total_loss = self._loss(self.model, X, y)
 
-                total_loss.backward()
-                self.optimizer.step()
+                with span("backward"):
+                    total_loss.backward()
+                with span("step"):
+                    self.optimizer.step()
                 running_loss += total_loss.item()
 
             if self.scheduler:
@@ -1,24 +1,119 @@
-from typing import Any, Dict, Optional, Union, Collection
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Collection
 import torch
 from torchmetrics import Metric
-from fluke.evaluation import Evaluator, ClassificationEval
+from fluke.evaluation import ClassificationEval
 from fluke.data import FastDataLoader
-from src.fairness.metrics import DemographicParity, EqualOpportunity
+from src.fairness.metrics import GroupFairness
 
 
 class FairnessEvaluator(ClassificationEval):
+    """Classification metrics plus group-fairness metrics (see `GroupFairness`).
+
+    Besides the classification metrics, results hold ``demographic_parity``,
+    ``equal_opportunity``, ``equalized_odds`` and ``group_accuracy_<g>`` for
+    every group ``g`` (the last group being the samples outside the others).
+
+    ``evaluate`` accepts a single loader or a collection of loaders (e.g. the
+    clients' test sets). Every loader is run through the model once; with a
+    collection, the result holds the metrics of the pooled predictions and,
+    under ``"clients"``, the list of the metrics of each loader, all computed
+    from the same forward passes. The metrics of a single loader stay flat
+    (scalars only), as fluke's log and observers expect.
+
+    Loaders with at most ``full_batch_size`` samples (and no transforms) are
+    evaluated with a single forward over their whole tensors instead of per
+    batch. The metric objects are created once and reset on every call.
+
+    Args:
+        eval_every: The evaluation frequency.
+        n_classes: The number of classes.
+        protected_attr_index: Column of the protected attribute in the inputs, or
+            the indices of its one-hot columns.
+        sensitive_group_val: Value of the protected attribute for the sensitive group.
+        group_values: Values of the protected column, one group each (defaults to
+            ``sensitive_group_val`` alone, i.e. sensitive vs others).
+        full_batch_size: Largest loader evaluated as one full-tensor forward.
+        **metrics: The classification metrics (fluke's defaults if empty).
+    """
+
     def __init__(
         self,
         eval_every: int,
         n_classes: int,
-        protected_attr_index: int,
+        protected_attr_index: Union[int, Sequence[int]],
         sensitive_group_val: int = 0,
+        group_values: Optional[Sequence[float]] = None,
+        full_batch_size: int = 65536,
         **metrics: Metric,
     ):
         super().__init__(eval_every, n_classes, **metrics)
         self.protected_attr_index = protected_attr_index
         self.sensitive_group_val = sensitive_group_val
+        self.full_batch_size = full_batch_size
+
+        # The fairness metric is fed the protected column(s) alone (see _predict)
+        self._columns = (
+            [protected_attr_index]
+            if isinstance(protected_attr_index, int)
+            else list(protected_attr_index)
+        )
+        self.fairness = GroupFairness(
+            0 if isinstance(protected_attr_index, int) else range(len(self._columns)),
+            group_values=group_values if group_values is not None else (sensitive_group_val,),
+            num_classes=n_classes,
+        )
+
+    def _predict(
+        self,
+        model: torch.nn.Module,
+        loader: FastDataLoader,
+        loss_fn: Optional[torch.nn.Module],
+        device: torch.device,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, float, int]:
+        """Predictions, targets and protected columns of ``loader``, with its summed batch losses."""
+        if loader.transforms is None and loader.size <= self.full_batch_size:
+            tensors = loader.tensors
+            batches = [(tensors[0][: loader.size], tensors[-1][: loader.size])]
+        else:
+            batches = loader
+
+        y_hats, ys, attrs = [], [], []
+        loss, n_batches = 0.0, 0
+        for X, y in batches:
+            X, y = X.to(device), y.to(device)
+            y_hat = model(X)
+            if loss_fn is not None:
+                loss += loss_fn(y_hat, y).item()
+            y_hats.append(y_hat)
+            ys.append(y)
+            attrs.append(X[:, self._columns])
+            n_batches += 1
+
+        return torch.cat(y_hats), torch.cat(ys), torch.cat(attrs), loss, n_batches
+
+    def _compute(
+        self,
+        metrics: Dict[str, Metric],
+        y_hat: torch.Tensor,
+        y: torch.Tensor,
+        attr: torch.Tensor,
+    ) -> Dict[str, float]:
+        results = {}
+        for name, metric in metrics.items():
+            metric.reset()
+            metric.update(y_hat, y)
+            results[name] = metric.compute().item()
 
+        self.fairness.reset()
+        self.fairness.update(y_hat, y, attr)
+        fairness = self.fairness.compute()
+        for name in ("demographic_parity", "equal_opportunity", "equalized_odds"):
+            results[name] = fairness[name].item()
+        for group, accuracy in enumerate(fairness["group_accuracy"].tolist()):
+            results[f"group_accuracy_{group}"] = accuracy
+        return results
+
+    @torch.no_grad()
     def evaluate(
         self,
         round: int,
@@ -28,103 +123,50 @@ class FairnessEvaluator(ClassificationEval):
         additional_metrics: Optional[Dict[str, Metric]] = None,
         device: torch.device = torch.device("cpu"),
     ) -> Dict[str, Any]:
-        """
-        Evaluate the model including fairness metrics.
-        We override evaluate to ensure inputs (X) are passed to our fairness metrics.
-        """
-
-        # Initialize fairness metrics
-        dp_metric = DemographicParity(
-            self.protected_attr_index, self.sensitive_group_val
-        ).to(device)
-        eo_metric = EqualOpportunity(
-            self.protected_attr_index, self.sensitive_group_val
-        ).to(device)
-
-        # Use parent class for standard classification metrics logic?
-        # Fluke's Evaluator.evaluate assumes standard metrics (preds, target).
-        # Our fairness metrics need (preds, target, inputs).
-        # We need to manually run the evaluation loop here or wrap metrics.
+        """Evaluate ``model`` on one loader or on each of a collection of loaders.
 
-        if model is None:
+        Returns:
+            Dict[str, Any]: The metrics (and ``"loss"`` if ``loss_fn`` is given). For
+            a collection of loaders these are the pooled metrics, plus the list of
+            per-loader results (in the loaders' order) under ``"clients"``.
+        """
+        if model is None or eval_data_loader is None:
             return {}
 
-        model.eval()
-        model.to(device)
-
-        # If it's a collection of loaders (e.g. clients), we might want to aggregate or pick one.
-        # Fluke's standard evaluate handles single loader usually for server side.
-        loader = eval_data_loader
-        if isinstance(eval_data_loader, (list, tuple)):
-            # For simplicity in this implementation, if list, just take first or merge
-            # But usually server pass a single loader.
-            pass
-
-        # Standard metrics from parent
-        # We can call super().evaluate() to get standard metrics,
-        # but we also need to iterate data for fairness metrics.
-        # To avoid double iteration, we will implement the loop here.
-
-        # Reset standard metrics
-        for metric in self.metrics.values():
-            metric.reset()
-            metric.to(device)
+        single = isinstance(eval_data_loader, FastDataLoader)
+        loaders: List[FastDataLoader] = [eval_data_loader] if single else list(eval_data_loader)
+        if not loaders:
+            return {}
 
+        metrics = dict(self.metrics)
         if additional_metrics:
-            for metric in additional_metrics.values():
-                metric.reset()
-                metric.to(device)
-
-        running_loss = 0.0
-        num_batches = 0
-
-        with torch.no_grad():
-            for i, (X, y) in enumerate(loader):
-                X, y = X.to(device), y.to(device)
-                y_hat = model(X)
-
-                if loss_fn:
-                    loss = loss_fn(y_hat, y)
-                    running_loss += loss.item()
-
-                # Update standard metrics
-                # Move predictions to CPU if metrics are on CPU (fluke default)
-                # But here we moved metrics to device at start of method.
-                # However, fluke's base ClassificationEval seems to move them to cpu for accumulation?
-                # Let's check where metrics are. We moved them to device above.
-                # So we can keep y_hat on device.
-
-                for metric in self.metrics.values():
-                    metric.update(y_hat, y)
-
-                if additional_metrics:
-                    for metric in additional_metrics.values():
-                        metric.update(y_hat, y)
-
-                # Update Fairness metrics
-                dp_metric.update(y_hat, y, X)
-                eo_metric.update(y_hat, y, X)
-
-                num_batches += 1
+            metrics.update(additional_metrics)
+        for metric in (*metrics.values(), self.fairness):
+            metric.to(device)
 
+        model.eval()
+        model.to(device)
+        outputs = [self._predict(model, loader, loss_fn, device) for loader in loaders]
         # Move model back to CPU to free GPU memory and avoid device mismatch later
         model.cpu()
-        # Also clean up metrics from GPU if needed, or leave them for compute()
 
-        # Compute results
-        results = {}
+        per_loader = []
+        for y_hat, y, attr, loss, n_batches in outputs:
+            results = self._compute(metrics, y_hat, y, attr)
+            if loss_fn:
+                results["loss"] = loss / max(1, n_batches)
+            per_loader.append(results)
+
+        if single:
+            return per_loader[0]
+
+        pooled = self._compute(
+            metrics,
+            torch.cat([o[0] for o in outputs]),
+            torch.cat([o[1] for o in outputs]),
+            torch.cat([o[2] for o in outputs]),
+        )
         if loss_fn:
-            results["loss"] = running_loss / max(1, num_batches)
-
-        for name, metric in self.metrics.items():
-            results[name] = metric.compute().item()
-
-        if additional_metrics:
-            for name, metric in additional_metrics.items():
-                results[name] = metric.compute().item()
-
-        # Add fairness results
-        results["demographic_parity"] = dp_metric.compute().item()
-        results["equal_opportunity"] = eo_metric.compute().item()
-
-        return results
+            pooled["loss"] = sum(o[3] for o in outputs) / max(1, sum(o[4] for o in outputs))
+        pooled["clients"] = per_loader
+        return pooled
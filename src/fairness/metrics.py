@@ -1,6 +1,6 @@
 import torch
 from torchmetrics import Metric
-from typing import Dict, Any
+from typing import Any, Dict, Sequence, Union
 
 
 class DemographicParity(Metric):
@@ -123,3 +123,111 @@ class EqualOpportunity(Metric):
         )
 
         return torch.abs(tpr_sensitive - tpr_others)
+
+
+class GroupFairness(Metric):
+    """Fused group-fairness metric over a per-group confusion matrix.
+
+    The state is a ``[n_groups, num_classes, num_classes]`` count tensor indexed
+    by (group, target, prediction), updated with a single ``bincount`` of the
+    combined codes per batch. Every metric is derived from it in ``compute``.
+
+    Groups come either from one column and the values it can take, or from a
+    set of one-hot columns (e.g. the ``race_*`` columns). The last group holds
+    the remaining samples, so ``protected_attr_index=i, group_values=(v,)``
+    reproduces the "sensitive vs others" split of `DemographicParity` and
+    `EqualOpportunity`. One-hot columns are read as set when positive, which
+    holds for both raw 0/1 and standardised columns.
+
+    Args:
+        protected_attr_index: Column of the protected attribute, or the indices
+            of its one-hot columns.
+        group_values: Values of the single protected column, one group each.
+            Ignored for one-hot columns.
+        num_classes: Number of classes of the predictions.
+        positive_label: Class treated as the positive outcome.
+    """
+
+    full_state_update = False
+
+    def __init__(
+        self,
+        protected_attr_index: Union[int, Sequence[int]],
+        group_values: Sequence[float] = (0,),
+        num_classes: int = 2,
+        positive_label: int = 1,
+    ):
+        super().__init__()
+        self.one_hot = not isinstance(protected_attr_index, int)
+        if self.one_hot:
+            columns = list(protected_attr_index)
+            contiguous = columns == list(range(columns[0], columns[0] + len(columns)))
+            # A slice (view) rather than a gather when the one-hot columns are adjacent
+            protected_attr_index = slice(columns[0], columns[-1] + 1) if contiguous else columns
+        self.protected_attr_index = protected_attr_index
+        n_values = len(columns) if self.one_hot else len(group_values)
+        self.n_groups = n_values + 1
+        self.num_classes = num_classes
+        self.positive_label = positive_label
+        self.register_buffer("group_values", torch.tensor(list(group_values), dtype=torch.float))
+
+        self.add_state(
+            "confmat",
+            default=torch.zeros(self.n_groups, num_classes, num_classes, dtype=torch.long),
+            dist_reduce_fx="sum",
+        )
+
+    def _groups(self, inputs: torch.Tensor) -> torch.Tensor:
+        if self.one_hot:
+            member = inputs[:, self.protected_attr_index] > 0
+        else:
+            member = inputs[:, self.protected_attr_index, None] == self.group_values
+        # First matching group, or the trailing "others" group when none matches
+        first = member.byte().argmax(dim=1)
+        return torch.where(member.any(dim=1), first, self.n_groups - 1)
+
+    def update(self, preds: torch.Tensor, target: torch.Tensor, inputs: torch.Tensor) -> None:
+        if preds.ndim > 1:
+            preds = torch.argmax(preds, dim=1)
+        else:
+            preds = (preds > 0.5).long()
+
+        k = self.num_classes
+        codes = (self._groups(inputs) * k + target.long()) * k + preds
+        self.confmat += torch.bincount(codes, minlength=self.confmat.numel()).view_as(self.confmat)
+
+    @staticmethod
+    def _gap(rates: torch.Tensor, valid: torch.Tensor) -> torch.Tensor:
+        """Largest difference between the ``valid`` entries of ``rates`` (0 if fewer than two)."""
+        if int(valid.sum()) < 2:
+            return rates.new_zeros(())
+        rates = rates[valid]
+        return rates.max() - rates.min()
+
+    def compute(self) -> Dict[str, torch.Tensor]:
+        """Fairness gaps across the non-empty groups, and per-group rates.
+
+        ``demographic_parity`` is the largest gap in P(Y_hat=1 | A),
+        ``equal_opportunity`` the largest gap in true positive rate and
+        ``equalized_odds`` the larger of that and the false positive rate gap.
+        """
+        cm = self.confmat.float()
+        pos = self.positive_label
+        size = cm.sum(dim=(1, 2))
+        positives = cm[:, pos].sum(dim=1)
+        negatives = size - positives
+
+        positive_rate = cm[:, :, pos].sum(dim=1) / size.clamp_min(1)
+        tpr = cm[:, pos, pos] / positives.clamp_min(1)
+        fpr = (cm[:, :, pos].sum(dim=1) - cm[:, pos, pos]) / negatives.clamp_min(1)
+        accuracy = cm.diagonal(dim1=1, dim2=2).sum(dim=1) / size.clamp_min(1)
+
+        tpr_gap = self._gap(tpr, positives > 0)
+        return {
+            "demographic_parity": self._gap(positive_rate, size > 0),
+            "equal_opportunity": tpr_gap,
+            "equalized_odds": torch.maximum(tpr_gap, self._gap(fpr, negatives > 0)),
+            "group_accuracy": accuracy,
+            "group_positive_rate": positive_rate,
+            "group_size": size,
+        }
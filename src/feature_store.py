@@ -0,0 +1,289 @@
+"""Zero-copy client shards over the memory-mapped feature store.
+
+fluke's `DataSplitter` materialises ``X[assignment]`` for every client, and its
+`FastDataLoader` re-permutes the whole client tensor at every epoch, so each
+simulated client owns a private copy of its shard. Here the preprocessed
+matrices stay in the memory-mapped ``.npy`` files of the preprocessing cache
+(see ``load_and_preprocess_data(mmap=True)``), wrapped with `torch.from_numpy`,
+and a client only holds the indices of its rows. Batches are gathered on the
+fly, so 50-1000 clients, or several worker processes, share the same physical
+pages.
+"""
+
+import copy
+import random
+from collections import OrderedDict
+from typing import Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from fluke.data import DataSplitter, FastDataLoader
+from fluke.utils import safe_train_test_split
+
+
+class IndexedDataLoader(FastDataLoader):
+    """`FastDataLoader` over the rows ``indices`` of shared base tensors.
+
+    Iteration follows `FastDataLoader` exactly (same ``torch.randperm`` calls,
+    same batch order), but only the index vector is permuted and each batch is
+    gathered from the base tensors when it is requested.
+
+    Args:
+        *tensors: Base tensors shared by every loader (e.g. the full ``X`` and ``y``).
+        indices: Rows of the base tensors that belong to this loader.
+        num_labels: The number of labels.
+        batch_size: The batch size. Defaults to 32.
+        shuffle: Whether to shuffle the rows at every epoch. Defaults to False.
+        percentage: Fraction of the rows to use. Defaults to 1.0.
+        skip_singleton: Whether to skip batches of size 1. Defaults to True.
+        single_batch: Whether to only yield the first batch. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        *tensors: torch.Tensor,
+        indices: Sequence[int],
+        num_labels: int,
+        batch_size: int = 32,
+        shuffle: bool = False,
+        percentage: float = 1.0,
+        skip_singleton: bool = True,
+        single_batch: bool = False,
+    ):
+        assert all(
+            t.shape[0] == tensors[0].shape[0] for t in tensors
+        ), "All tensors must have the same size along the first dimension."
+        self.base_tensors = tensors
+        self.indices = torch.as_tensor(np.asarray(indices), dtype=torch.long)
+        self.num_labels = num_labels
+        self.max_size = self.indices.shape[0]
+        self.percentage = percentage
+        self.size = 0
+        self.set_sample_size(percentage)
+        self.shuffle = shuffle
+        self.skip_singleton = skip_singleton
+        self.batch_size = batch_size if batch_size > 0 else self.size
+        self.single_batch = single_batch
+        self.transforms = None
+        self._cursor = 0
+
+    @property
+    def tensors(self) -> list[torch.Tensor]:
+        # Materialised on demand for code that expects plain per-client tensors
+        return [t[self.indices] for t in self.base_tensors]
+
+    def set_sample_size(self, percentage: float) -> int:
+        if percentage > 1.0 or percentage <= 0.0:
+            raise ValueError("percentage must be in (0, 1]")
+        self.size = max(int(self.max_size * percentage), 1)
+
+        if self.size < self.max_size:
+            self.indices = self.indices[torch.randperm(self.max_size)]
+
+        return self.size
+
+    def __iter__(self):
+        if self.shuffle:
+            self.indices = self.indices[torch.randperm(self.size)]
+        self._cursor = 0
+        return self
+
+    def __next__(self) -> tuple:
+        if self.single_batch and self._cursor > 0:
+            raise StopIteration
+        if self._cursor >= self.size:
+            raise StopIteration
+
+        rows = self.indices[self._cursor : self._cursor + self._batch_size]
+        batch = tuple(t[rows] for t in self.base_tensors)
+        # Useful in case of batch norm layers
+        if self.skip_singleton and batch[0].shape[0] == 1:
+            raise StopIteration
+        self._cursor += self._batch_size
+        return batch
+
+    def __getitem__(self, index: int) -> tuple:
+        if index >= self.max_size:
+            raise IndexError("Index out of bounds.")
+        row = self.indices[index]
+        return tuple(t[row] for t in self.base_tensors)
+
+
+class IndexedDataSplitter(DataSplitter):
+    """`DataSplitter` whose client loaders are `IndexedDataLoader` views.
+
+    The assignment logic (client train/test split, ``distribution`` function and
+    the random draws they make) is the same as fluke's, so a run is
+    bit-identical to one with the plain splitter; only the storage differs.
+    Configurations that merge train and test (``keep_test=False``) and
+    transformed datasets fall back to the copying implementation.
+    """
+
+    def assign(
+        self, n_clients: int, batch_size: int = 32
+    ) -> tuple[tuple[list[FastDataLoader], Optional[list[FastDataLoader]]], FastDataLoader]:
+        if not self.keep_test or self.data_container.transforms is not None:
+            return super().assign(n_clients, batch_size)
+
+        if self.server_test:
+            X, y = self.data_container.train
+            all_rows = torch.arange(X.shape[0])
+            rows_tr, rows_te, _, _ = safe_train_test_split(
+                all_rows, y, test_size=self.client_split
+            )
+        else:
+            X, y = self.data_container.train
+            rows_tr, rows_te = torch.arange(X.shape[0]), None
+
+        # The distribution functions only use the labels and the number of rows,
+        # so the row indices stand in for the feature matrix.
+        if self.server_test:
+            y_te = y[rows_te] if rows_te is not None else None
+            X_te_base, y_te_base = X, y
+        else:
+            X_te_base, y_te_base = self.data_container.test
+            rows_te = torch.arange(X_te_base.shape[0])
+            y_te = y_te_base
+
+        assignments_tr, assignments_te = self._iidness_functions[self.distribution](
+            X_train=rows_tr,
+            y_train=y[rows_tr],
+            X_test=rows_te if not self.uniform_test else None,
+            y_test=y_te if not self.uniform_test else None,
+            n=n_clients,
+            **self.dist_args,
+        )
+
+        if rows_te is not None and self.uniform_test:
+            assignments_te, _ = self.iid(rows_te, y_te, None, None, n_clients)
+
+        client_tr_assignments = []
+        client_te_assignments = []
+        for c in range(n_clients):
+            client_tr_assignments.append(
+                IndexedDataLoader(
+                    X,
+                    y,
+                    indices=rows_tr[assignments_tr[c]],
+                    num_labels=self.num_classes,
+                    batch_size=batch_size,
+                    shuffle=True,
+                    percentage=self.sampling_perc,
+                )
+            )
+            if assignments_te is not None:
+                client_te_assignments.append(
+                    IndexedDataLoader(
+                        X_te_base,
+                        y_te_base,
+                        indices=rows_te[assignments_te[c]],
+                        num_labels=self.num_classes,
+                        batch_size=batch_size,
+                        shuffle=False,
+                        percentage=self.sampling_perc,
+                    )
+                )
+            else:
+                client_te_assignments.append(None)
+
+        # The server test set is the whole (shared) test split: no copy needed
+        server_te = None
+        if self.server_test:
+            server_X, server_Y = self.data_container.test
+            server_te = FastDataLoader(
+                server_X,
+                server_Y,
+                num_labels=self.num_classes,
+                batch_size=128,
+                shuffle=False,
+                percentage=self.sampling_perc,
+            )
+        return (client_tr_assignments, client_te_assignments), server_te
+
+
+class SplitCache:
+    """Client/server loaders of previous `DataSplitter.assign` calls, kept in memory.
+
+    Runs that share the data, seed, distribution, client count and batch size
+    (e.g. the trials of a hyper-parameter sweep, see `src.sweep`) get the same
+    split, so a process running several of them only loads and splits the data
+    once. Each entry also records the global numpy/torch/python RNG states right
+    after the split; a run served from the cache restores them, so it continues
+    exactly as if it had split the data itself. Runs get shallow copies of the
+    loaders (the tensors are shared). At most ``max_entries`` splits are kept
+    (least recently used first out).
+
+    Args:
+        max_entries: Number of splits kept in memory.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Tuple["_CachedSplitter", int]]:
+        """The splitter replaying the split stored under ``key`` and its input dimension."""
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        assignment, rng_states, input_dim = self._entries[key]
+        return _CachedSplitter(assignment, rng_states), input_dim
+
+    def recording(self, key: Hashable, splitter: DataSplitter, input_dim: int) -> "_RecordingSplitter":
+        """Wrap ``splitter`` so that its next assignment is stored under ``key``."""
+        return _RecordingSplitter(self, key, splitter, input_dim)
+
+    def _put(self, key: Hashable, assignment: tuple, input_dim: int) -> None:
+        self._entries[key] = (assignment, _rng_states(), input_dim)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def _rng_states() -> tuple:
+    return random.getstate(), np.random.get_state(), torch.get_rng_state()
+
+
+def _copy_assignment(assignment: tuple) -> tuple:
+    (clients_tr, clients_te), server_te = assignment
+
+    def copy_all(loaders):
+        return None if loaders is None else [copy.copy(loader) for loader in loaders]
+
+    return (copy_all(clients_tr), copy_all(clients_te)), copy.copy(server_te)
+
+
+class _CachedSplitter:
+    def __init__(self, assignment: tuple, rng_states: tuple):
+        self._assignment = assignment
+        self._rng_states = rng_states
+
+    def assign(self, n_clients: int, batch_size: int = 32) -> tuple:
+        py_state, np_state, torch_state = self._rng_states
+        random.setstate(py_state)
+        np.random.set_state(np_state)
+        torch.set_rng_state(torch_state)
+        return _copy_assignment(self._assignment)
+
+
+class _RecordingSplitter:
+    def __init__(self, cache: SplitCache, key: Hashable, splitter: DataSplitter, input_dim: int):
+        self._cache = cache
+        self._key = key
+        self._splitter = splitter
+        self._input_dim = input_dim
+
+    def __getattr__(self, name: str):
+        return getattr(self._splitter, name)
+
+    def assign(self, n_clients: int, batch_size: int = 32) -> tuple:
+        assignment = self._splitter.assign(n_clients, batch_size)
+        self._cache._put(self._key, _copy_assignment(assignment), self._input_dim)
+        return assignment
@@ -0,0 +1,245 @@
+"""Buffered asynchronous federated training (FedBuff) on a virtual clock.
+
+In synchronous FedAvg every round lasts as long as its slowest client. In
+FedBuff [Nguyen et al., 2022] ``concurrency`` clients train at all times, each
+from the global model current when it started. The server buffers their
+updates (deltas from that model) as they arrive, and once ``buffer_size`` of
+them are in, it applies
+
+    x <- x + lr * mean_i( s(staleness_i) * delta_i ),    s(t) = (1 + t) ** -staleness_exponent
+
+where the staleness of an update is the number of server steps since its
+client started. A client whose update arrived is replaced by an idle one.
+
+Time is simulated: a `LatencyModel` gives the duration of each local update
+(compute plus upload), and the server processes arrivals from a priority
+queue in virtual-time order. A client's training itself runs when it is
+dispatched, on the then-current global model, and its update is held until
+its arrival time. One "round" of ``run_experiment(n_rounds=...)`` is one server
+step, and observers get ``start_round``/``end_round`` around each of them.
+
+`VirtualClockMixin` puts synchronous algorithms on the same clock (a round
+takes as long as its slowest client), so both report ``server.clock_log``:
+the virtual time at the end of every round.
+"""
+
+import heapq
+import itertools
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+from fluke import FlukeENV
+from fluke.algorithms import CentralizedFL
+from fluke.client import Client
+from fluke.server import EarlyStopping, Server
+
+from src.mixins import server_class_with
+
+
+class LatencyModel(ABC):
+    """Duration, in virtual seconds, of a client's local update including the upload."""
+
+    @abstractmethod
+    def __call__(self, client: Client) -> float: ...
+
+    def describe(self) -> Dict[str, Any]:
+        """The settings of the model, recorded with the results (and hashed by sweeps)."""
+        return {}
+
+
+class LogNormalLatency(LatencyModel):
+    """Log-normal compute and network times, with persistent per-client slowness.
+
+    The compute time is ``seconds_per_batch`` times the client's number of
+    batches and local epochs, times the client's slowdown factor (drawn once
+    per client, log-normal with ``heterogeneity`` as sigma), times per-update
+    log-normal noise (``compute_sigma``). The network time is log-normal with
+    median ``network_seconds`` and sigma ``network_sigma``.
+
+    Args:
+        seconds_per_batch: Compute time of one mini-batch on a typical client.
+        network_seconds: Median upload time of an update.
+        heterogeneity: Spread of the clients' speeds (0 = identical clients).
+        compute_sigma: Update-to-update variation of the compute time.
+        network_sigma: Update-to-update variation of the network time.
+        seed: Seed of the latency draws (independent of the training RNG).
+    """
+
+    def __init__(
+        self,
+        seconds_per_batch: float = 0.01,
+        network_seconds: float = 1.0,
+        heterogeneity: float = 1.0,
+        compute_sigma: float = 0.25,
+        network_sigma: float = 0.5,
+        seed: int = 0,
+    ):
+        self.seconds_per_batch = seconds_per_batch
+        self.network_seconds = network_seconds
+        self.heterogeneity = heterogeneity
+        self.compute_sigma = compute_sigma
+        self.network_sigma = network_sigma
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._slowdown: Dict[int, float] = {}
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(
+            seconds_per_batch=self.seconds_per_batch,
+            network_seconds=self.network_seconds,
+            heterogeneity=self.heterogeneity,
+            compute_sigma=self.compute_sigma,
+            network_sigma=self.network_sigma,
+            seed=self.seed,
+        )
+
+    def __call__(self, client: Client) -> float:
+        if client.index not in self._slowdown:
+            self._slowdown[client.index] = self._rng.lognormal(0.0, self.heterogeneity)
+        batches = len(client.train_set) * client.hyper_params.local_epochs
+        compute = (
+            self.seconds_per_batch
+            * batches
+            * self._slowdown[client.index]
+            * self._rng.lognormal(0.0, self.compute_sigma)
+        )
+        network = self.network_seconds * self._rng.lognormal(0.0, self.network_sigma)
+        return float(compute + network)
+
+
+class VirtualClockMixin:
+    """Server mixin advancing a virtual clock by the slowest selected client of each round.
+
+    Args:
+        latency_model: The `LatencyModel` (a default `LogNormalLatency` if ``None``).
+    """
+
+    def __init__(self, *args, latency_model: Optional[LatencyModel] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.latency_model = latency_model or LogNormalLatency(seed=FlukeENV().get_seed())
+        self.clock = 0.0
+        self.clock_log: Dict[int, float] = {}
+
+    def get_eligible_clients(self, eligible_perc: float) -> Sequence[Client]:
+        # The round's duration is known once its clients are: it is logged under the round
+        eligible = super().get_eligible_clients(eligible_perc)
+        self.clock += max(self.latency_model(client) for client in eligible)
+        self.clock_log[self.rounds + 1] = self.clock
+        return eligible
+
+
+class FedBuffMixin(VirtualClockMixin):
+    """Server mixin replacing the synchronous rounds with buffered asynchronous updates.
+
+    Args:
+        buffer_size: Number of updates (K) aggregated by each server step.
+        concurrency: Number of clients training at any time. Defaults to
+            ``eligible_perc`` of the clients, as for a synchronous round.
+        staleness_exponent: Exponent of the staleness discount ``(1 + t) ** -a``.
+        latency_model: The `LatencyModel` (a default `LogNormalLatency` if ``None``).
+    """
+
+    def __init__(
+        self,
+        *args,
+        buffer_size: int = 3,
+        concurrency: Optional[int] = None,
+        staleness_exponent: float = 0.5,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.buffer_size = buffer_size
+        self.concurrency = concurrency
+        self.staleness_exponent = staleness_exponent
+        self._rng = np.random.default_rng(FlukeENV().get_seed())
+        self._events: List[tuple] = []
+        self._order = itertools.count()
+        self._idle: List[Client] = []
+
+    def _dispatch(self, client: Client) -> None:
+        """Train ``client`` from the current model and schedule the arrival of its update."""
+        base = [p.detach().clone() for p in self.model.parameters()]
+        self.broadcast_model([client])
+        client.local_update(self.rounds + 1)
+        self._participants.add(client.index)
+        model = next(iter(self.receive_client_models([client], state_dict=False)))
+        delta = [p.detach() - b for p, b in zip(model.parameters(), base)]
+        arrival = self.clock + self.latency_model(client)
+        heapq.heappush(
+            self._events, (arrival, next(self._order), client, self.rounds, delta, model)
+        )
+
+    def _dispatch_idle(self) -> None:
+        while self._idle and len(self._events) < self._concurrency:
+            client = self._idle.pop(self._rng.integers(len(self._idle)))
+            self._dispatch(client)
+
+    @torch.no_grad()
+    def _apply(self, updates: List[tuple]) -> None:
+        scale = self.hyper_params.lr / len(updates)
+        for version, delta, _ in updates:
+            weight = scale * (1 + self.rounds - version) ** -self.staleness_exponent
+            for p, d in zip(self.model.parameters(), delta):
+                p.add_(d, alpha=weight)
+        # Buffers (e.g. BatchNorm statistics) are taken from the latest update
+        for b, latest in zip(self.model.buffers(), updates[-1][2].buffers()):
+            b.copy_(latest)
+
+    def fit(
+        self, n_rounds: int = 10, eligible_perc: float = 0.1, finalize: bool = True, **kwargs
+    ) -> None:
+        self._concurrency = self.concurrency or max(1, int(self.n_clients * eligible_perc))
+        if not self._events and not self._idle:
+            self._idle = list(self.clients)
+
+        total_rounds = self.rounds + n_rounds
+        with FlukeENV().get_live_renderer():
+            progress_fl = FlukeENV().get_progress_bar("FL")
+            task_rounds = progress_fl.add_task("[red]FL Rounds (buffered)", total=n_rounds)
+            self._dispatch_idle()
+            for rnd in range(self.rounds, total_rounds):
+                try:
+                    self.notify(event="start_round", round=rnd + 1, global_model=self.model)
+                    updates, senders = [], []
+                    while len(updates) < self.buffer_size:
+                        self.clock, _, client, version, delta, model = heapq.heappop(self._events)
+                        updates.append((version, delta, model))
+                        senders.append(client)
+                        self._idle.append(client)
+                        if len(updates) < self.buffer_size:
+                            self._dispatch_idle()
+
+                    self.notify(event="selected_clients", round=rnd + 1, clients=senders)
+                    self._apply(updates)
+                    self.clock_log[rnd + 1] = self.clock
+                    self._compute_evaluation(rnd, senders)
+                    self.notify(event="end_round", round=rnd + 1)
+                    self.rounds += 1
+                    progress_fl.update(task_id=task_rounds, advance=1)
+                    self._dispatch_idle()
+
+                except KeyboardInterrupt:
+                    self.notify(event="interrupted")
+                    break
+
+                except EarlyStopping:
+                    self.notify(event="early_stop", round=self.rounds)
+                    break
+
+            progress_fl.remove_task(task_rounds)
+
+        if finalize:
+            self.finalize()
+        self.notify(event="finished", round=self.rounds + 1)
+
+
+class FedBuff(CentralizedFL):
+    """FedAVG clients with a `FedBuffMixin` server."""
+
+    def get_client_class(self) -> type[Client]:
+        return Client
+
+    def get_server_class(self) -> type[Server]:
+        return server_class_with(Server, FedBuffMixin)
@@ -1,166 +1,279 @@
-from typing import Optional
+import argparse
+import time
+from functools import partial
+from typing import Any, Dict, List, Optional
 
 from fluke.algorithms.dpfedavg import DPFedAVG
 from fluke.algorithms.fedavg import FedAVG
 from fluke.algorithms.fedprox import FedProx
 
-from src.simulation import run_experiment
+from src.cache import PreprocessingCache
+from src.dataset import load_and_preprocess_data
+from src.privacy import FastDPFedAVG
+from src.results import DEFAULT_RESULTS_DB
+from src.secagg import SecAggFedAVG
+from src.runner import Scenario, format_report, run_scenarios
 
 
-def main():
+def build_scenarios(
+    sample_size: Optional[int] = None,
+    stopping: Optional[Dict[str, Any]] = None,
+    results_db: Optional[str] = None,
+    fast_dp: bool = False,
+    async_eval: int = 0,
+) -> List[Scenario]:
+    from src.fairness.algorithm import FairFedAVG
+    from src.fairness.evaluator import FairnessEvaluator
+
+    # Common settings
+    common = dict(
+        n_clients=5,
+        n_rounds=10,
+        batch_size=32,
+        lr=0.01,
+        epochs=1,
+        seed=42,
+        sample_size=sample_size,
+        # >0: per-round test-set evaluation runs while the next round trains (the
+        # stopping policy then sees a round's metrics up to async_eval rounds late)
+        server=dict(async_eval=async_eval),
+        # Optional stopping policy (target, target_metric, patience, time_budget...)
+        stopping=stopping,
+        # Every run is appended to this store (src/results.py)
+        instrumentation=dict(results_db=results_db),
+    )
+
+    # Identify protected attribute index (e.g. 'race' or 'gender')
+    # For demonstration, we'll use index 0.
+    protected_attr_idx = 0
+
+    dp_params = {
+        1.0: {"noise_mul": 1.0, "max_grad_norm": 1.0, "clipping": 1.0},  # Clipping enabled
+        2.0: {"noise_mul": 2.0, "max_grad_norm": 1.0, "clipping": 1.0},
+    }
+
+    scenarios = [
+        # 1. Baseline: IID Data with FedAvg
+        Scenario(
+            "fedavg_iid",
+            "[Scenario 1] IID Data - FedAvg",
+            dict(common, algorithm_class=FedAVG, distribution="iid"),
+        ),
+        # 2. Challenge: Non-IID Data with FedAvg
+        # Using Dirichlet distribution for Non-IID skew
+        Scenario(
+            "fedavg_dir",
+            "[Scenario 2] Non-IID Data (Dirichlet Skew) - FedAvg",
+            dict(common, algorithm_class=FedAVG, distribution="dir"),
+        ),
+        # 3. Treatment: Non-IID Data with FedProx
+        Scenario(
+            "fedprox_dir",
+            "[Scenario 3] Non-IID Data (Dirichlet Skew) - FedProx (Treatment)",
+            dict(
+                common,
+                algorithm_class=FedProx,
+                distribution="dir",
+                extra_client_params={"mu": 0.1},  # Proximal term weight
+            ),
+        ),
+        # 4. Privacy: Differential Privacy with DPFedAVG
+        # 4.1 Moderate Privacy
+        Scenario(
+            "dpfedavg_noise1",
+            "[Scenario 4.1] Privacy Preservation - DPFedAVG (Noise Multiplier=1.0)",
+            dict(
+                common,
+                algorithm_class=DPFedAVG,
+                distribution="iid",  # Using IID to isolate privacy impact
+                extra_client_params=dp_params[1.0],
+            ),
+        ),
+        # 4.2 High Privacy
+        Scenario(
+            "dpfedavg_noise2",
+            "[Scenario 4.2] Privacy Preservation - DPFedAVG (Noise Multiplier=2.0)",
+            dict(
+                common,
+                algorithm_class=DPFedAVG,
+                distribution="iid",
+                extra_client_params=dp_params[2.0],
+            ),
+        ),
+        # 4.3 Secure Aggregation: the server only sees the sum of pairwise-masked
+        # updates; 10% of the clients drop out of each round after the masks are agreed
+        Scenario(
+            "secagg_dropout",
+            "[Scenario 4.3] Privacy Preservation - Secure Aggregation (10% Dropout)",
+            dict(
+                common,
+                algorithm_class=SecAggFedAVG,
+                distribution="iid",
+                extra_server_params={"dropout": 0.1},
+            ),
+        ),
+        # 5. Fairness & Scalability
+        # 5.1 Fairness Analysis with Mitigation
+        Scenario(
+            "fairfedavg",
+            "[Scenario 5.1] Fairness Analysis with Mitigation (Lambda=0.5)",
+            dict(
+                common,
+                algorithm_class=FairFedAVG,
+                distribution="iid",
+                extra_client_params={
+                    "fairness_lambda": 0.5  # Strength of fairness regularization
+                },
+            ),
+            # Inject our custom fairness evaluator (built in the worker)
+            evaluator=partial(
+                FairnessEvaluator,
+                eval_every=1,
+                n_classes=2,
+                protected_attr_index=protected_attr_idx,
+            ),
+        ),
+        # 5.2 Scalability Test
+        # We use standard FedAVG for scalability test, but with many more clients
+        Scenario(
+            "scalability_50",
+            "[Scenario 5.2] Scalability Test (50 Clients, 20% Participation)",
+            dict(
+                common,
+                algorithm_class=FedAVG,
+                distribution="iid",
+                n_clients=50,  # Large number of clients
+                n_rounds=5,  # Reduced rounds for speed in this demo
+                eligible_perc=0.2,  # Only 20% of clients (10 clients) participate per round
+                # Clients share the memory-mapped features instead of copying them
+                data=dict(mmap=True),
+            ),
+        ),
+    ]
+
+    # Optional: the same DP-SGD parameters with FastDPFedAVG (src/privacy.py), next to
+    # DPFedAVG. Not a drop-in replacement: fixed-size batches instead of Poisson
+    # sampling, and no privacy accounting
+    if fast_dp:
+        for tag, noise_mul in (("noise1", 1.0), ("noise2", 2.0)):
+            scenarios.append(
+                Scenario(
+                    f"fastdp_{tag}",
+                    f"[Scenario 4.{tag[-1]}b] FastDPFedAVG, no privacy accounting "
+                    f"(Noise Multiplier={noise_mul})",
+                    dict(
+                        common,
+                        algorithm_class=FastDPFedAVG,
+                        distribution="iid",
+                        extra_client_params=dp_params[noise_mul],
+                    ),
+                )
+            )
+    return scenarios
+
+
+def main(
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    stopping: Optional[Dict[str, Any]] = None,
+    results_db: Optional[str] = None,
+    fast_dp: bool = False,
+    async_eval: int = 0,
+):
     print("==================================================")
     print("Project: Federated Learning for Medical Diagnosis")
     print("Dataset: Diabetes 130-US Hospitals (1999-2008)")
     print("==================================================")
 
-    # Common settings
-    N_CLIENTS = 5
-    N_ROUNDS = 10
-    BATCH_SIZE = 32
-    LR = 0.01
-    EPOCHS = 1
     SAMPLE_SIZE: Optional[int] = None
+    scenarios = build_scenarios(SAMPLE_SIZE, stopping, results_db, fast_dp, async_eval)
+
+    # Preprocess once up front so the workers all hit the cache
+    load_and_preprocess_data(sample_size=SAMPLE_SIZE, cache=PreprocessingCache())
 
-    # 1. Baseline: IID Data with FedAvg
-    print("\n[Scenario 1] IID Data - FedAvg")
+    start = time.perf_counter()
+    results = run_scenarios(scenarios, workers=workers, threads_per_worker=threads_per_worker)
+    elapsed = time.perf_counter() - start
+
+    print("\n[Report] Final Global Metrics")
     print("------------------------------")
-    run_experiment(
-        algorithm_class=FedAVG,
-        distribution="iid",
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-    )
+    print(format_report(results))
+    print(f"\n{len(results)} scenarios finished in {elapsed:.2f}s.")
+    if results_db is not None:
+        print(f"Runs appended to {results_db} (query with: uv run -m src.results {results_db})")
+    return results
 
-    # 2. Challenge: Non-IID Data with FedAvg
-    # Using Dirichlet distribution for Non-IID skew
-    print("\n[Scenario 2] Non-IID Data (Dirichlet Skew) - FedAvg")
-    print("---------------------------------------------------")
-    run_experiment(
-        algorithm_class=FedAVG,
-        distribution="dir",
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-    )
 
-    # 3. Treatment: Non-IID Data with FedProx
-    print("\n[Scenario 3] Non-IID Data (Dirichlet Skew) - FedProx (Treatment)")
-    print("----------------------------------------------------------------")
-    run_experiment(
-        algorithm_class=FedProx,
-        distribution="dir",
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-        extra_client_params={"mu": 0.1},  # Proximal term weight
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run all the experiment scenarios.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: one per scenario, capped at the CPU count; 1 = sequential)",
     )
-
-    # 4. Privacy: Differential Privacy with DPFedAVG
-    print("\n[Scenario 4] Privacy Preservation - DPFedAVG")
-    print("------------------------------------------------")
-
-    # 4.1 Moderate Privacy
-    print("Running with Moderate Privacy (Noise Multiplier=1.0)...")
-    run_experiment(
-        algorithm_class=DPFedAVG,
-        distribution="iid",  # Using IID to isolate privacy impact
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-        extra_client_params={
-            "noise_mul": 1.0,
-            "max_grad_norm": 1.0,
-            "clipping": 1.0,  # Ensure clipping is enabled
-        },
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="torch intra-op threads per worker (default: CPU count // workers)",
     )
-
-    # 4.2 High Privacy
-    print("\nRunning with High Privacy (Noise Multiplier=2.0)...")
-    run_experiment(
-        algorithm_class=DPFedAVG,
-        distribution="iid",
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-        extra_client_params={"noise_mul": 2.0, "max_grad_norm": 1.0, "clipping": 1.0},
+    parser.add_argument(
+        "--target",
+        default=None,
+        help="Stop a scenario once a global metric reaches a value, e.g. macro_f1=0.62",
     )
-
-    # 5. Fairness & Scalability
-    print("\n[Scenario 5] Fairness & Scalability")
-    print("-----------------------------------")
-
-    from src.fairness.algorithm import FairFedAVG
-    from src.fairness.evaluator import FairnessEvaluator
-
-    # Identify protected attribute index (e.g. 'race' or 'gender')
-    # For demonstration, we'll use index 0.
-    protected_attr_idx = 0
-
-    # 5.1 Fairness Analysis with Mitigation
-    print("\nRunning Fairness Analysis with Mitigation (Lambda=0.5)...")
-    fair_evaluator = FairnessEvaluator(
-        eval_every=1, n_classes=2, protected_attr_index=protected_attr_idx
+    parser.add_argument(
+        "--patience",
+        type=int,
+        default=None,
+        help="Stop a scenario after this many rounds without improvement of the target metric",
     )
-
-    run_experiment(
-        algorithm_class=FairFedAVG,
-        distribution="iid",
-        n_clients=N_CLIENTS,
-        n_rounds=N_ROUNDS,
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-        evaluator=fair_evaluator,  # Inject our custom fairness evaluator
-        extra_client_params={
-            "fairness_lambda": 0.5  # Strength of fairness regularization
-        },
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Wall-clock budget of each scenario's training, in seconds",
     )
-
-    # 5.2 Scalability Test
-    print("\n[Scenario 5.2] Scalability Test (50 Clients, 20% Participation)")
-    print("---------------------------------------------------------------")
-
-    # We use standard FedAVG for scalability test, but with many more clients
-    run_experiment(
-        algorithm_class=FedAVG,
-        distribution="iid",
-        n_clients=50,  # Large number of clients
-        n_rounds=5,  # Reduced rounds for speed in this demo
-        batch_size=BATCH_SIZE,
-        lr=LR,
-        epochs=EPOCHS,
-        seed=42,
-        sample_size=SAMPLE_SIZE,
-        eligible_perc=0.2,  # Only 20% of clients (10 clients) participate per round
+    parser.add_argument(
+        "--results-db",
+        default=DEFAULT_RESULTS_DB,
+        help="SQLite results store the runs are appended to ('' to disable)",
+    )
+    parser.add_argument(
+        "--async-eval",
+        type=int,
+        default=0,
+        help="Evaluate the global model in the background, with at most N rounds in flight "
+        "(0 = synchronous; early stopping may then act up to N rounds late)",
+    )
+    parser.add_argument(
+        "--fast-dp",
+        action="store_true",
+        help="Also run the privacy scenarios with FastDPFedAVG (no Poisson sampling or accounting)",
     )
+    return parser.parse_args()
+
+
+def stopping_params(args: argparse.Namespace) -> Dict[str, Any]:
+    stopping: Dict[str, Any] = dict(patience=args.patience, time_budget=args.time_budget)
+    if args.target is not None:
+        metric, _, value = args.target.rpartition("=")
+        stopping.update(target=float(value), target_metric=metric or "accuracy")
+    return stopping
 
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
-        main()
+        main(
+            workers=args.workers,
+            threads_per_worker=args.threads_per_worker,
+            stopping=stopping_params(args),
+            results_db=args.results_db or None,
+            fast_dp=args.fast_dp,
+            async_eval=args.async_eval,
+        )
     except Exception as e:
         print(f"\nAn error occurred: {e}")
         import traceback
@@ -0,0 +1,40 @@
+"""Compose fluke algorithms with server mixins.
+
+The optional features of `src.simulation.run_experiment` (client workers,
+background evaluation, compression, robust aggregation, early stopping,
+tracing...) are server mixins: classes overriding a few `fluke.server.Server`
+methods and calling ``super()``. `with_server_mixin` returns a variant of an
+algorithm whose server class has the mixin in front, so they stack in the
+order they are applied (the last one applied runs first).
+"""
+
+from functools import lru_cache
+
+from fluke.algorithms import CentralizedFL
+from fluke.server import Server
+
+
+@lru_cache(maxsize=None)
+def server_class_with(server_class: type[Server], mixin: type) -> type[Server]:
+    """``server_class`` with ``mixin`` in front of it (e.g. ``FlatAggregationServer``)."""
+    prefix = mixin.__name__.removesuffix("Mixin").removesuffix("Rounds")
+    return type(f"{prefix}{server_class.__name__}", (mixin, server_class), {})
+
+
+@lru_cache(maxsize=None)
+def with_server_mixin(algorithm_class: type[CentralizedFL], mixin: type) -> type[CentralizedFL]:
+    """Return a variant of ``algorithm_class`` whose server uses ``mixin``.
+
+    The mixin's options are read from the server hyper-parameters (e.g.
+    ``client_workers``, ``eval_queue_size``).
+    """
+
+    def get_server_class(self) -> type[Server]:
+        return server_class_with(algorithm_class.get_server_class(self), mixin)
+
+    # Keep the original name: it shows up in logs and reports
+    return type(
+        algorithm_class.__name__,
+        (algorithm_class,),
+        {"get_server_class": get_server_class, "__module__": __name__},
+    )
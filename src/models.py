@@ -3,12 +3,12 @@ import torch.nn.functional as F
 
 
 class BinaryClassifier(nn.Module):
-    def __init__(self, input_dim, hidden_dim=64):
+    def __init__(self, input_dim, hidden_dim=64, dropout=0.3):
         super(BinaryClassifier, self).__init__()
         self.layer1 = nn.Linear(input_dim, hidden_dim)
         self.layer2 = nn.Linear(hidden_dim, hidden_dim // 2)
         self.layer3 = nn.Linear(hidden_dim // 2, 2)  # Output 2 classes for CrossEntropy
-        self.dropout = nn.Dropout(0.3)
+        self.dropout = nn.Dropout(dropout)
 
     def forward(self, x):
         x = F.relu(self.layer1(x))
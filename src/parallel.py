@@ -0,0 +1,357 @@
+"""Concurrent client training within a round.
+
+fluke's `Server.fit` broadcasts the global model to the selected clients and
+then calls ``local_update`` on them one after the other. The clients of a
+`parallel_rounds` algorithm (`RoundClientMixin`) hand that call over to their
+server: the first one of a round trains all the selected clients at once
+(`ParallelRoundsMixin._train_clients`), the others find their update done.
+The rest of the round (selection, progress, aggregation, evaluation) is
+fluke's own loop.
+
+Updates run on a `ClientWorkerPool`: persistent worker processes, each owning
+a fixed subset of the clients (their data, model and optimizer state stay
+resident in the worker), that only exchange model state dicts with the server.
+
+Each client update runs under its own torch/numpy RNG seed, derived from the
+experiment seed, the round and the client index (`client_seed`), so the
+outcome does not depend on which process trains the client or in which order.
+With ``client_workers=0`` the same seeded updates run in-process, and the
+parallel run matches this sequential run exactly (given the same number of
+torch threads).
+
+Use `parallel_rounds` to get a parallel variant of any `CentralizedFL`
+algorithm, e.g. ``parallel_rounds(FedAVG)``.
+"""
+
+import multiprocessing as mp
+import traceback
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.multiprocessing  # noqa: F401  (registers the shared-memory tensor reductions)
+from fluke import FlukeENV
+from fluke.algorithms import CentralizedFL
+from fluke.client import Client
+from fluke.comm import Channel, Message
+
+from src.mixins import with_server_mixin
+
+
+def client_seed(seed: int, round: int, index: int) -> int:
+    """Seed of client ``index``'s local update at ``round``."""
+    return int(np.random.SeedSequence([seed, round, index]).generate_state(1)[0])
+
+
+def seeded_local_update(
+    client: Client, round: int, seed: int, update: Optional[Callable[[int], None]] = None
+) -> None:
+    """Run ``client.local_update(round)`` (or ``update(round)``) under its own RNG seed.
+
+    The global torch and numpy RNG states are restored afterwards, so the
+    caller's random streams (e.g. the server's client selection) are unaffected.
+    """
+    np_state = np.random.get_state()
+    with torch.random.fork_rng(devices=[]):
+        s = client_seed(seed, round, client.index)
+        # Not torch.manual_seed: it also queues lazy CUDA/XPU seeding, which is
+        # slow when called once per client per round.
+        torch.default_generator.manual_seed(s)
+        np.random.seed(s % 2**32)
+        try:
+            (update or client.local_update)(round)
+        finally:
+            np.random.set_state(np_state)
+
+
+class _EventRecorder:
+    """Client observer recording every notification, to replay them in the server process."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, dict]] = []
+
+    def __getattr__(self, event: str) -> Callable[..., None]:
+        if event.startswith("_"):
+            raise AttributeError(event)
+        # Models are not sent back: the replay passes the client's updated model
+        return lambda **kwargs: self.events.append(
+            (event, {name: value for name, value in kwargs.items() if name != "model"})
+        )
+
+
+def _worker_main(conn, threads: int) -> None:
+    torch.set_num_threads(threads)
+    channel = Channel()
+    clients: Dict[int, Client] = {}
+    model = recorder = None
+
+    while True:
+        cmd, *args = conn.recv()
+        if cmd == "close":
+            break
+        try:
+            if cmd == "init":
+                owned, model, device = args
+                FlukeENV().set_device(device)
+                recorder = _EventRecorder()
+                for client in owned:
+                    client.set_channel(channel)
+                    client.attach(recorder)
+                    clients[client.index] = client
+                conn.send(("ok", None))
+            elif cmd == "train":
+                round, seed, indices, global_state = args
+                model.load_state_dict(global_state)
+                states, events = {}, {}
+                for index in indices:
+                    # send() deep-copies the payload, as the server broadcast does
+                    channel.send(Message(model, "model", "server", inmemory=None), index)
+                    seeded_local_update(clients[index], round, seed)
+                    states[index] = channel.receive("server", index, "model").payload.state_dict()
+                    events[index], recorder.events = recorder.events, []
+                conn.send(("ok", (states, events)))
+        except Exception:
+            conn.send(("error", traceback.format_exc()))
+    conn.close()
+
+
+class ClientWorkerPool:
+    """Persistent worker processes, each owning a fixed subset of the clients.
+
+    Clients are assigned round-robin on their position in ``clients`` and are
+    shipped to their worker once; afterwards only state dicts travel. A client
+    always trains in the same worker, so its persistent state (e.g. optimizer
+    momentum, loader permutation) carries over between rounds as it would in
+    the server process.
+
+    Args:
+        clients: All the clients of the federation.
+        model: The global model, used as a template in the workers.
+        n_workers: Number of worker processes.
+        threads_per_worker: torch intra-op threads in each worker.
+    """
+
+    def __init__(
+        self,
+        clients: Sequence[Client],
+        model: torch.nn.Module,
+        n_workers: int,
+        threads_per_worker: int = 1,
+    ):
+        ctx = mp.get_context("spawn")
+        self.owner = {client.index: i % n_workers for i, client in enumerate(clients)}
+        self._conns = []
+        self._procs = []
+        for worker in range(n_workers):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker_main, args=(child_conn, threads_per_worker), daemon=True
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+        device = str(FlukeENV().get_device())
+        for worker, conn in enumerate(self._conns):
+            owned = [
+                self._detached(client) for client in clients if self.owner[client.index] == worker
+            ]
+            conn.send(("init", owned, model, device))
+        self._collect(range(n_workers))
+
+    @staticmethod
+    def _detached(client: Client) -> Client:
+        # The channel, the observers and the server live in the server process:
+        # the worker runs the client's own local update (the class it extends)
+        client_class = getattr(client, "base_class", type(client))
+        clone = client_class.__new__(client_class)
+        clone.__dict__.update(client.__dict__)
+        clone.__dict__.pop("_executor", None)
+        clone._channel = None
+        clone._observers = []
+        return clone
+
+    def _collect(self, workers) -> List:
+        results = []
+        for worker in workers:
+            status, payload = self._conns[worker].recv()
+            if status == "error":
+                raise RuntimeError(f"Client worker {worker} failed:\n{payload}")
+            results.append(payload)
+        return results
+
+    def train(
+        self, round: int, seed: int, indices: Sequence[int], global_state: dict
+    ) -> Tuple[Dict[int, dict], Dict[int, List[Tuple[str, dict]]]]:
+        """Run the local updates of clients ``indices``.
+
+        Returns their model state dicts and the ``(event, kwargs)`` notifications
+        of each client during its update (without the ``model`` argument).
+        """
+        busy = []
+        for worker, conn in enumerate(self._conns):
+            owned = [index for index in indices if self.owner[index] == worker]
+            if owned:
+                conn.send(("train", round, seed, owned, global_state))
+                busy.append(worker)
+
+        states, events = {}, {}
+        for worker_states, worker_events in self._collect(busy):
+            states.update(worker_states)
+            events.update(worker_events)
+        return states, events
+
+    def close(self) -> None:
+        for conn in self._conns:
+            try:
+                conn.send(("close",))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns, self._procs = [], []
+
+
+class RoundClientMixin:
+    """Client mixin handing ``local_update`` over to the server's `ParallelRoundsMixin`.
+
+    Without a server attached (e.g. in a worker process) it is the client's own
+    local update.
+    """
+
+    #: The client class this mixin extends
+    base_class: type[Client] = Client
+    _executor = None
+
+    def local_update(self, current_round: int) -> None:
+        if self._executor is None:
+            self.own_local_update(current_round)
+        else:
+            self._executor.train_client(self, current_round)
+
+    def own_local_update(self, current_round: int) -> None:
+        """The local update of `base_class`."""
+        super().local_update(current_round)
+
+
+class ParallelRoundsMixin:
+    """Server mixin training the selected clients of a round concurrently.
+
+    The clients must be `RoundClientMixin` instances (see `parallel_rounds`).
+    With ``client_workers > 0``, the updated models are loaded back into the
+    server-side clients and their notifications in the workers (e.g.
+    ``start_fit``, ``end_fit``) are replayed on them, so the observers see the
+    same events. The rest of the client state (e.g. optimizer momentum) lives
+    in the workers: features reading it in the server process, such as
+    checkpoints, need ``client_workers=0``.
+
+    Args:
+        client_workers: Number of worker processes. ``0`` runs the (seeded)
+            local updates sequentially in the server process.
+        threads_per_worker: torch intra-op threads in each worker.
+    """
+
+    def __init__(self, *args, client_workers: int = 0, threads_per_worker: int = 1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client_workers = client_workers
+        self.threads_per_worker = threads_per_worker
+        self._pool = None
+        self._pending: List[Client] = []
+        self._trained: set = set()
+        for client in self.clients:
+            if not isinstance(client, RoundClientMixin):
+                raise TypeError(
+                    f"{type(self).__name__} needs RoundClientMixin clients (see parallel_rounds)"
+                )
+            client._executor = self
+
+    def broadcast_model(self, eligible: Sequence[Client]) -> None:
+        super().broadcast_model(eligible)
+        # The first local_update of the round trains them all (see train_client)
+        self._pending = list(eligible)
+
+    def train_client(self, client: Client, round: int) -> None:
+        """``client.local_update(round)``: the first call of a round trains all its clients."""
+        if self._pending:
+            eligible, self._pending = self._pending, []
+            self._train_clients(round, eligible)
+            self._trained = {c.index for c in eligible}
+        if client.index not in self._trained:
+            raise RuntimeError(f"Client {client.index} was not sent the model of round {round}")
+        self._trained.discard(client.index)
+
+    def _train_clients(self, round: int, eligible: Sequence[Client]) -> None:
+        seed = FlukeENV().get_seed()
+
+        if self.client_workers <= 0:
+            for client in eligible:
+                seeded_local_update(client, round, seed, client.own_local_update)
+            return
+
+        if self._pool is None:
+            self._pool = ClientWorkerPool(
+                self.clients, self.model, self.client_workers, self.threads_per_worker
+            )
+        states, events = self._pool.train(
+            round, seed, [client.index for client in eligible], self.model.state_dict()
+        )
+        self._send_client_models(round, eligible, states)
+        for client in eligible:
+            for event, kwargs in events[client.index]:
+                if event in ("start_fit", "end_fit"):
+                    kwargs = dict(kwargs, model=client.model)
+                client.notify(event, **kwargs)
+
+    def _send_client_models(
+        self, round: int, eligible: Sequence[Client], states: Dict[int, dict]
+    ) -> None:
+        # Each client takes the broadcast model, loads its update into it and sends
+        # it to the server, as its own local update would have
+        for client in eligible:
+            client._last_round = round
+            client.receive_model()
+            client.model.load_state_dict(states[client.index])
+            client.send_model()
+
+    def fit(self, *args, **kwargs) -> None:
+        try:
+            super().fit(*args, **kwargs)
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+
+@lru_cache(maxsize=None)
+def round_client_class(client_class: type[Client]) -> type[Client]:
+    return type(
+        f"Round{client_class.__name__}",
+        (RoundClientMixin, client_class),
+        {"base_class": client_class},
+    )
+
+
+@lru_cache(maxsize=None)
+def parallel_rounds(
+    algorithm_class: type[CentralizedFL], mixin: type = ParallelRoundsMixin
+) -> type[CentralizedFL]:
+    """Return a variant of ``algorithm_class`` training its rounds with ``mixin``.
+
+    ``mixin`` is `ParallelRoundsMixin` or a subclass of it (e.g.
+    `src.vmap_engine.VmapRoundsMixin`); its options are read from the server
+    hyper-parameters (``client_workers``, ``threads_per_worker``).
+    """
+
+    def get_client_class(self) -> type[Client]:
+        return round_client_class(algorithm_class.get_client_class(self))
+
+    round_clients = type(
+        algorithm_class.__name__,
+        (algorithm_class,),
+        {"get_client_class": get_client_class, "__module__": __name__},
+    )
+    return with_server_mixin(round_clients, mixin)
@@ -0,0 +1,413 @@
+"""Vectorized client partitions, cached on disk as per-client index ranges.
+
+fluke's `DataSplitter` draws a new partition at every `run_experiment` call,
+with per-class Python lists and sets (``dir``) that take minutes for millions
+of rows. Here a partition is computed by NumPy over all the rows at once, from
+a generator seeded by the run's seed, as one client id per row:
+
+* ``iid``: a random permutation dealt round-robin (sizes differ by at most one);
+* ``dir``: label skew, every class spread over the clients with proportions
+  drawn from ``Dirichlet(beta)``, after ``min_ex_class`` rows of every class
+  for every client (fluke's ``label_dirichlet_skew``, without ``balanced``);
+* ``qnt``: quantity skew, client sizes drawn from the power law ``alpha * x **
+  (alpha - 1)`` above ``min_quantity`` rows each (fluke's ``quantity_skew``);
+* ``natural``: one client per value of a source ``column`` of the dataset
+  (e.g. ``admission_source_id``). With fewer clients than values, the values
+  are packed onto the clients largest first, each onto the smallest client so
+  far.
+
+Each client's rows are then shuffled and the first ``client_split`` of them
+become its local test set. A `Partition` stores the rows grouped by client in
+two arrays (train and test) with the clients' offsets, so a client's rows are
+a slice of one array. `PartitionCache` keeps partitions on disk, keyed by the
+labels (and source groups), the method, its arguments, the client count and
+the seed, and memory-maps them back. `NativeDataSplitter` hands out these
+slices as `IndexedDataLoader` views over the shared feature tensors: no client
+copies its features.
+
+The draws differ from fluke's, so a native split is not the same partition as
+fluke's for the same seed (only the same kind of partition).
+"""
+
+import hashlib
+import heapq
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+import torch
+from fluke.data import DataContainer, FastDataLoader
+
+from src.cache import CACHE_VERSION, PreprocessingCache
+from src.feature_store import IndexedDataLoader
+
+DEFAULT_PARTITION_DIR = ".cache/partitions"
+DISTRIBUTIONS = ("iid", "dir", "qnt", "natural")
+
+
+def _client_ids(n_clients: int) -> type:
+    # numpy's stable sort is a radix sort on 16-bit integers
+    return np.uint16 if n_clients <= 1 << 16 else np.int64
+
+
+def iid(n_rows: int, n_clients: int, rng: np.random.Generator) -> np.ndarray:
+    """Client of every row: a random permutation dealt round-robin."""
+    if n_rows < n_clients:
+        raise ValueError(f"{n_rows} rows cannot be split over {n_clients} clients")
+    return (rng.permutation(n_rows) % n_clients).astype(_client_ids(n_clients))
+
+
+def quantity_skew(
+    n_rows: int,
+    n_clients: int,
+    rng: np.random.Generator,
+    min_quantity: int = 2,
+    alpha: float = 4.0,
+) -> np.ndarray:
+    """Client of every row, with power-law client sizes of at least ``min_quantity`` rows."""
+    if min_quantity * n_clients > n_rows:
+        raise ValueError(
+            f"{n_rows} rows cannot give {min_quantity} to each of {n_clients} clients"
+        )
+    dtype = _client_ids(n_clients)
+    drawn = (rng.power(alpha, n_rows - min_quantity * n_clients) * n_clients).astype(dtype)
+    clients = np.concatenate([drawn, np.repeat(np.arange(n_clients, dtype=dtype), min_quantity)])
+    rng.shuffle(clients)
+    return clients
+
+
+def dirichlet_skew(
+    labels: np.ndarray,
+    n_clients: int,
+    rng: np.random.Generator,
+    beta: float = 0.5,
+    min_ex_class: int = 1,
+) -> np.ndarray:
+    """Client of every row, each class spread with ``Dirichlet(beta)`` proportions."""
+    if beta <= 0:
+        raise ValueError(f"beta must be > 0, got {beta}")
+    n_classes = int(labels.max()) + 1
+    proportions = rng.dirichlet([beta] * n_clients, size=n_classes)
+    clients = np.empty(len(labels), dtype=_client_ids(n_clients))
+    by_class = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[by_class], np.arange(n_classes + 1))
+    for c in range(n_classes):
+        rows = rng.permutation(by_class[bounds[c] : bounds[c + 1]])
+        reserved = min_ex_class * n_clients
+        if 0 < len(rows) < reserved:
+            raise ValueError(
+                f"Class {c} has {len(rows)} rows, fewer than min_ex_class={min_ex_class}"
+                f" for each of {n_clients} clients"
+            )
+        reserved = min(reserved, len(rows))
+        clients[rows[:reserved]] = np.arange(reserved) // max(min_ex_class, 1)
+        # The other rows go to the client whose cumulative proportion covers their position
+        rest = len(rows) - reserved
+        cuts = np.floor(np.cumsum(proportions[c]) * rest).astype(np.int64)
+        cuts[-1] = rest  # Rounding must not leave the last rows past the last client
+        clients[rows[reserved:]] = np.searchsorted(cuts, np.arange(rest), side="right")
+    return clients
+
+
+def natural(groups: np.ndarray, n_clients: int) -> tuple:
+    """Client of every row from its source group, and the groups of every client.
+
+    Groups are packed onto the clients largest first, each onto the client with
+    the fewest rows so far (one group per client when there are as many).
+    """
+    sizes = np.bincount(groups)
+    present = np.flatnonzero(sizes)
+    if n_clients > len(present):
+        raise ValueError(f"{len(present)} groups cannot make {n_clients} clients")
+    client_of_group = np.zeros(len(sizes), dtype=_client_ids(n_clients))
+    members = [[] for _ in range(n_clients)]
+    heap = [(0, c) for c in range(n_clients)]
+    for group in present[np.argsort(-sizes[present], kind="stable")]:
+        load, client = heapq.heappop(heap)
+        client_of_group[group] = client
+        members[client].append(int(group))
+        heapq.heappush(heap, (load + int(sizes[group]), client))
+    return client_of_group[groups], members
+
+
+def column_groups(
+    X: torch.Tensor, feature_names: Sequence[str], column: str, chunk_rows: int = 1 << 18
+) -> tuple:
+    """Source group code of every row for ``column``, and the value of every code.
+
+    A feature named ``column`` is grouped by its distinct values; otherwise the
+    one-hot encoded column (``<column>_<value>`` features) is decoded from its
+    block of features, ``chunk_rows`` rows at a time, so a memory-mapped ``X``
+    is never loaded whole.
+    """
+    if column in feature_names:
+        feature = X[:, list(feature_names).index(column)].numpy()
+        values, groups = np.unique(feature, return_inverse=True)
+        return groups.astype(np.int64), values.tolist()
+    prefix = f"{column}_"
+    one_hot = [i for i, name in enumerate(feature_names) if name.startswith(prefix)]
+    if not one_hot:
+        raise ValueError(f"Unknown column {column!r} (not a feature nor a one-hot prefix)")
+    values = [feature_names[i][len(prefix) :] for i in one_hot]
+    columns = torch.as_tensor(one_hot)
+    groups = np.empty(X.shape[0], dtype=np.int64)
+    for start in range(0, X.shape[0], chunk_rows):
+        block = X[start : start + chunk_rows].index_select(1, columns)
+        groups[start : start + chunk_rows] = block.argmax(dim=1).numpy()
+    return groups, values
+
+
+@dataclass
+class Partition:
+    """The rows of every client, grouped by client.
+
+    ``train_rows[train_offsets[c] : train_offsets[c + 1]]`` are client ``c``'s
+    training rows, and likewise for its test rows. ``groups`` lists the source
+    group codes of every client (``natural`` only).
+    """
+
+    train_rows: np.ndarray
+    train_offsets: np.ndarray
+    test_rows: np.ndarray
+    test_offsets: np.ndarray
+    groups: Optional[list] = None
+
+    @property
+    def n_clients(self) -> int:
+        return len(self.train_offsets) - 1
+
+    def train(self, client: int) -> np.ndarray:
+        return self.train_rows[self.train_offsets[client] : self.train_offsets[client + 1]]
+
+    def test(self, client: int) -> np.ndarray:
+        return self.test_rows[self.test_offsets[client] : self.test_offsets[client + 1]]
+
+    def sizes(self) -> np.ndarray:
+        return np.diff(self.train_offsets) + np.diff(self.test_offsets)
+
+
+def _offsets(counts: np.ndarray) -> np.ndarray:
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def partition(
+    labels: np.ndarray,
+    n_clients: int,
+    distribution: str = "iid",
+    seed: int = 42,
+    client_split: float = 0.2,
+    groups: Optional[np.ndarray] = None,
+    **dist_args: Any,
+) -> Partition:
+    """Split the rows of ``labels`` over ``n_clients`` (see the module docstring).
+
+    Args:
+        labels: The label of every row.
+        n_clients: Number of clients.
+        distribution: One of `DISTRIBUTIONS`.
+        seed: Seed of the draws.
+        client_split: Fraction of every client's rows kept as its test set.
+        groups: Source group code of every row (``natural`` only, see `column_groups`).
+        **dist_args: Arguments of the distribution (``beta``, ``min_ex_class``,
+            ``min_quantity``, ``alpha``).
+    """
+    rng = np.random.default_rng(seed)
+    labels = np.asarray(labels)
+    n_rows = len(labels)
+    members = None
+    if distribution == "iid":
+        clients = iid(n_rows, n_clients, rng)
+    elif distribution == "qnt":
+        clients = quantity_skew(n_rows, n_clients, rng, **dist_args)
+    elif distribution == "dir":
+        clients = dirichlet_skew(labels, n_clients, rng, **dist_args)
+    elif distribution == "natural":
+        if groups is None:
+            raise ValueError("The natural distribution needs the rows' source groups")
+        clients, members = natural(np.asarray(groups), n_clients)
+    else:
+        raise ValueError(
+            f"Unknown distribution {distribution!r} (expected one of {DISTRIBUTIONS})"
+        )
+
+    counts = np.bincount(clients, minlength=n_clients)
+    if counts.min() == 0:
+        raise ValueError(f"{int((counts == 0).sum())} of the {n_clients} clients get no rows")
+
+    # Rows grouped by client, shuffled within each client (stable sort of a permutation)
+    shuffled = rng.permutation(n_rows)
+    order = shuffled[np.argsort(clients[shuffled], kind="stable")]
+    offsets = _offsets(counts)
+
+    # The first client_split of every client's rows are its test rows
+    n_test = np.floor(counts * client_split).astype(np.int64)
+    owner = np.repeat(np.arange(n_clients), counts)
+    is_test = np.arange(n_rows) - offsets[owner] < n_test[owner]
+    return Partition(
+        train_rows=order[~is_test],
+        train_offsets=_offsets(counts - n_test),
+        test_rows=order[is_test],
+        test_offsets=_offsets(n_test),
+        groups=members,
+    )
+
+
+class PartitionCache(PreprocessingCache):
+    """On-disk cache of `Partition` arrays (same layout and eviction as the preprocessing cache).
+
+    Args:
+        cache_dir: Directory where entries are stored.
+        max_bytes: Upper bound on the total size of the cache on disk.
+    """
+
+    array_names = ("train_rows", "train_offsets", "test_rows", "test_offsets")
+
+    def __init__(self, cache_dir: str = DEFAULT_PARTITION_DIR, max_bytes: int = 1 << 30):
+        super().__init__(cache_dir, max_bytes)
+
+    def partition_key(
+        self, labels: np.ndarray, groups: Optional[np.ndarray] = None, **params: Any
+    ) -> str:
+        """Cache key of the partition of ``labels`` (and ``groups``) made with ``params``."""
+        digest = hashlib.sha256()
+        header = {"version": CACHE_VERSION, **params}
+        digest.update(json.dumps(header, sort_keys=True, default=str).encode())
+        for array in (labels, groups):
+            if array is not None:
+                array = np.ascontiguousarray(array)
+                digest.update(f"{array.dtype}{array.shape}".encode())
+                digest.update(memoryview(array).cast("B"))
+        return digest.hexdigest()
+
+    def partition(
+        self,
+        labels: np.ndarray,
+        n_clients: int,
+        distribution: str = "iid",
+        seed: int = 42,
+        client_split: float = 0.2,
+        groups: Optional[np.ndarray] = None,
+        **dist_args: Any,
+    ) -> Partition:
+        """`partition`, served memory-mapped from the cache when it was computed before."""
+        params = dict(
+            n_clients=n_clients,
+            distribution=distribution,
+            seed=seed,
+            client_split=client_split,
+            dist_args=dist_args,
+        )
+        key = self.partition_key(labels, groups, **params)
+        entry = self.get(key, mmap=True)
+        if entry is None:
+            result = partition(
+                labels, n_clients, distribution, seed, client_split, groups, **dist_args
+            )
+            arrays = {name: getattr(result, name) for name in self.array_names}
+            self.put(key, arrays, {"groups": result.groups}, meta=params)
+            entry = self.get(key, mmap=True)
+        arrays = {name: entry[name] for name in self.array_names}
+        return Partition(**arrays, groups=entry["groups"])
+
+
+class NativeDataSplitter:
+    """Splitter assigning the clients a cached `Partition` of the training rows.
+
+    Clients get `IndexedDataLoader` views over the dataset's training tensors
+    (their rows are slices of the partition's arrays); the server tests on the
+    dataset's test set, as with fluke's splitter (``server_test=True``,
+    ``keep_test=True``).
+
+    Args:
+        dataset: The data container (for ``natural``, with ``feature_names``).
+        distribution: One of `DISTRIBUTIONS`.
+        client_split: Fraction of every client's rows kept as its test set.
+        seed: Seed of the partition.
+        dist_args: Arguments of the distribution; ``natural`` takes the source ``column``.
+        cache: Where partitions are kept (``None``: computed at every call).
+    """
+
+    def __init__(
+        self,
+        dataset: DataContainer,
+        distribution: str = "iid",
+        client_split: float = 0.2,
+        seed: int = 42,
+        dist_args: Optional[Dict[str, Any]] = None,
+        cache: Optional[PartitionCache] = None,
+    ):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(
+                f"Unknown distribution {distribution!r} (expected one of {DISTRIBUTIONS})"
+            )
+        self.data_container = dataset
+        self.distribution = distribution
+        self.client_split = client_split
+        self.seed = seed
+        self.dist_args = dict(dist_args or {})
+        self.cache = cache
+        self.num_classes = dataset.num_classes
+        self.partition: Optional[Partition] = None
+        self.group_values: Optional[list] = None
+
+    def make_partition(self, n_clients: int) -> Partition:
+        X, y = self.data_container.train
+        dist_args = dict(self.dist_args)
+        groups = None
+        if self.distribution == "natural":
+            column = dist_args.pop("column", None)
+            if column is None:
+                raise ValueError("The natural distribution needs dist_args={'column': ...}")
+            groups, self.group_values = column_groups(
+                X, self.data_container.feature_names, column
+            )
+        split = self.cache.partition if self.cache is not None else partition
+        return split(
+            y.numpy(),
+            n_clients,
+            self.distribution,
+            self.seed,
+            self.client_split,
+            groups,
+            **dist_args,
+        )
+
+    def assign(
+        self, n_clients: int, batch_size: int = 32
+    ) -> tuple[tuple[list[FastDataLoader], list[FastDataLoader]], FastDataLoader]:
+        self.partition = self.make_partition(n_clients)
+        X, y = self.data_container.train
+        clients_tr, clients_te = [], []
+        for c in range(n_clients):
+            clients_tr.append(
+                IndexedDataLoader(
+                    X,
+                    y,
+                    indices=self.partition.train(c),
+                    num_labels=self.num_classes,
+                    batch_size=batch_size,
+                    shuffle=True,
+                )
+            )
+            test = self.partition.test(c)
+            clients_te.append(
+                IndexedDataLoader(
+                    X,
+                    y,
+                    indices=test,
+                    num_labels=self.num_classes,
+                    batch_size=batch_size,
+                    shuffle=False,
+                )
+                if len(test)
+                else None
+            )
+
+        server_X, server_y = self.data_container.test
+        server_te = FastDataLoader(
+            server_X, server_y, num_labels=self.num_classes, batch_size=128, shuffle=False
+        )
+        return (clients_tr, clients_te), server_te
@@ -0,0 +1,141 @@
+"""Differentially private FedAVG with per-sample gradients from ``torch.func``.
+
+fluke's `DPFedAVG` wraps every client with Opacus, whose hooks, per-layer
+gradient samplers and DataLoader conversion dominate the local update of a
+small MLP. `FastDPClient` runs the same DP-SGD step directly:
+
+1. per-sample gradients in one batched pass, ``vmap(grad(...))`` over the
+   samples of the mini-batch;
+2. each sample's gradient is clipped to ``max_grad_norm`` (L2 norm over all
+   the parameters, computed vectorized);
+3. the clipped gradients are summed, Gaussian noise with standard deviation
+   ``noise_mul * max_grad_norm`` is added once per batch, and the result is
+   divided by the batch size;
+4. ``clipping`` (the usual fluke client parameter) then clips the noisy batch
+   gradient, exactly as for a non-private client, before the optimizer step.
+
+Unlike Opacus' default, batches are the client's shuffled fixed-size batches
+rather than Poisson-sampled ones, and no privacy accountant is kept.
+
+On the small MLP of this project it is not faster than `DPFedAVG` (2.50 s
+against 2.37 s in `src.benchmarks.dp`).
+"""
+
+import torch
+from fluke.algorithms import CentralizedFL
+from fluke.client import Client
+from fluke.config import OptimizerConfigurator
+from fluke.data import FastDataLoader
+from fluke.server import Server
+from fluke.utils import clear_cuda_cache
+from torch.func import functional_call, grad_and_value, vmap
+
+
+class FastDPClient(Client):
+    def __init__(
+        self,
+        index: int,
+        train_set: FastDataLoader,
+        test_set: FastDataLoader,
+        optimizer_cfg: OptimizerConfigurator,
+        loss_fn: torch.nn.Module,
+        local_epochs: int = 3,
+        fine_tuning_epochs: int = 0,
+        clipping: float = 0,
+        noise_mul: float = 1.1,
+        max_grad_norm: float = 1.0,
+        **kwargs,
+    ):
+        super().__init__(
+            index=index,
+            train_set=train_set,
+            test_set=test_set,
+            optimizer_cfg=optimizer_cfg,
+            loss_fn=loss_fn,
+            local_epochs=local_epochs,
+            fine_tuning_epochs=fine_tuning_epochs,
+            clipping=clipping,
+            **kwargs,
+        )
+        self.hyper_params.update(noise_mul=noise_mul, max_grad_norm=max_grad_norm)
+
+    def _per_sample_grads(self):
+        model = self.model
+        loss_fn = self.hyper_params.loss_fn
+
+        def sample_loss(params, buffers, x, y):
+            out = functional_call(model, (params, buffers), (x.unsqueeze(0),))
+            return loss_fn(out, y.unsqueeze(0))
+
+        return vmap(
+            grad_and_value(sample_loss), in_dims=(None, None, 0, 0), randomness="different"
+        )
+
+    def _private_grads(
+        self, grads: dict[str, torch.Tensor], batch_size: int
+    ) -> dict[str, torch.Tensor]:
+        """Clip per-sample ``grads``, sum them, add the noise and average."""
+        max_norm = self.hyper_params.max_grad_norm
+        noise_std = self.hyper_params.noise_mul * max_norm
+
+        norms = torch.sqrt(sum(g.pow(2).flatten(1).sum(1) for g in grads.values()))
+        factor = torch.clamp(max_norm / (norms + 1e-6), max=1.0)
+
+        private = {}
+        for name, g in grads.items():
+            summed = torch.tensordot(factor, g, dims=1)
+            noise = torch.normal(0.0, noise_std, size=summed.shape, device=summed.device)
+            private[name] = (summed + noise) / batch_size
+        return private
+
+    def fit(self, override_local_epochs: int = 0) -> float:
+        epochs = (
+            override_local_epochs if override_local_epochs > 0 else self.hyper_params.local_epochs
+        )
+
+        self.model.train()
+        self.model.to(self.device)
+
+        if self.optimizer is None:
+            self.optimizer, self.scheduler = self._optimizer_cfg(self.model)
+
+        per_sample_grads = self._per_sample_grads()
+        named_params = dict(self.model.named_parameters())
+        buffers = {name: b.detach() for name, b in self.model.named_buffers()}
+
+        running_loss = 0.0
+        for _ in range(epochs):
+            for X, y in self.train_set:
+                X, y = X.to(self.device), y.to(self.device)
+                self.optimizer.zero_grad()
+
+                params = {name: p.detach() for name, p in named_params.items()}
+                grads, losses = per_sample_grads(params, buffers, X, y)
+                private = self._private_grads(grads, X.shape[0])
+                for name, p in named_params.items():
+                    p.grad = private[name]
+
+                self._clip_grads(self.model)
+                self.optimizer.step()
+                running_loss += losses.mean().item()
+
+            self.scheduler.step()
+
+        running_loss /= epochs * len(self.train_set)
+        self.model.cpu()
+        clear_cuda_cache()
+        return running_loss
+
+
+class FastDPFedAVG(CentralizedFL):
+    """DP-SGD FedAVG with the ``noise_mul``/``max_grad_norm``/``clipping`` of fluke's `DPFedAVG`.
+
+    Not a drop-in replacement: batches are fixed-size rather than Poisson-sampled,
+    and no privacy accountant is kept (no epsilon is reported).
+    """
+
+    def get_client_class(self) -> type[Client]:
+        return FastDPClient
+
+    def get_server_class(self) -> type[Server]:
+        return Server
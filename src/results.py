@@ -0,0 +1,359 @@
+"""Append-only store of experiment results, with a small query API.
+
+``run_experiment(instrumentation=InstrumentationOptions(results_db=...))``
+appends every run to a SQLite database (`ResultsDB`) instead of leaving its
+numbers in the printed log. A run is recorded as:
+
+* a row of ``runs``: its name, start time, the main settings as columns
+  (``algorithm``, ``distribution``, ``n_clients``, ``eligible_perc``,
+  ``batch_size``, ``lr``, ``epochs``, ``seed``, ``sample_size``, ``n_rounds``)
+  and all of its arguments and final metrics as JSON;
+* its numeric final metrics in ``run_metrics`` (``run_id, name, value``), e.g.
+  ``accuracy``, ``macro_f1``, ``runtime_seconds``;
+* its per-round global evaluations and timings in ``round_metrics``
+  (``run_id, round, name, value``): every metric of the round's global
+  evaluation, ``round_seconds``, and with tracing the seconds spent in each
+  span kind (``<span>_seconds``, see `Tracer.round_table`).
+
+`RunRecorder` collects the rounds in memory while the run trains and the run
+is written in a single transaction when it ends, so the store costs one
+commit per run. Several processes (e.g. the scenario workers of
+``src/main.py``) can append to the same file: the database is in WAL mode and
+writers wait for each other's locks.
+
+The query API covers the usual reports without reading the log, e.g.::
+
+    db = ResultsDB("results/experiments.sqlite")
+    db.best("macro_f1", by="algorithm")            # best run per algorithm
+    db.trend("n_clients", "runtime_seconds")       # mean runtime per client count
+    db.runs(algorithm="FedProx", distribution="dir")
+    db.rounds(run_id)                              # per-round metrics of one run
+
+`ResultsDB.query` runs arbitrary SQL. From the command line::
+
+    uv run -m src.results results/experiments.sqlite --best macro_f1 --by algorithm
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from dataclasses import fields, is_dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+from fluke.utils import ServerObserver
+
+from src.tracing import get_tracer
+
+DEFAULT_RESULTS_DB = "results/experiments.sqlite"
+
+# Settings of `run_experiment` stored as columns of ``runs`` (the rest is in ``config``)
+RUN_COLUMNS = (
+    "algorithm",
+    "distribution",
+    "n_clients",
+    "n_rounds",
+    "eligible_perc",
+    "batch_size",
+    "lr",
+    "epochs",
+    "seed",
+    "sample_size",
+)
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    name TEXT,
+    started_at REAL,
+    {", ".join(RUN_COLUMNS)},
+    config TEXT,
+    metrics TEXT
+);
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS round_metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    round INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS run_metrics_by_name ON run_metrics(name, run_id);
+CREATE INDEX IF NOT EXISTS round_metrics_by_run ON round_metrics(run_id, round);
+"""
+
+
+def _jsonable(value: Any) -> Any:
+    """``value`` as JSON data that is the same in every process (it is hashed by sweeps).
+
+    Options dataclasses (e.g. `DataOptions`) are recorded as their fields, other
+    objects only through a ``describe()`` method returning their settings (e.g.
+    `LatencyModel`, `ClientSampler`); anything else raises
+    `TypeError` rather than falling back to a ``repr`` that may hold a memory address.
+    """
+    if isinstance(value, type):
+        return f"{value.__module__}.{value.__qualname__}"
+    if hasattr(value, "describe"):
+        cls = type(value)
+        return {"class": f"{cls.__module__}.{cls.__qualname__}", **_jsonable(value.describe())}
+    if is_dataclass(value):
+        return {f.name: _jsonable(getattr(value, f.name)) for f in fields(value)}
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    if isinstance(value, Mapping):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (np.integer, np.floating)):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    raise TypeError(
+        f"Cannot record a {type(value).__name__} as settings: "
+        "pass plain values or give its class a describe() method"
+    )
+
+
+def _numeric(values: Mapping[str, Any]) -> Dict[str, float]:
+    return {
+        name: float(value)
+        for name, value in values.items()
+        if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(value, bool)
+    }
+
+
+class RunRecorder(ServerObserver):
+    """Collects the per-round global metrics and timings of a run for `ResultsDB.add_run`."""
+
+    def __init__(self):
+        self.rounds: Dict[int, Dict[str, float]] = {}
+        self._round_start: Optional[float] = None
+
+    def _round(self, round: int) -> Dict[str, float]:
+        return self.rounds.setdefault(round, {})
+
+    def start_round(self, round: int, global_model: Any) -> None:
+        self._round_start = time.perf_counter()
+
+    def end_round(self, round: int) -> None:
+        self._round(round)["round_seconds"] = time.perf_counter() - self._round_start
+        tracer = get_tracer()
+        if tracer is not None and round in tracer.rounds:
+            # The tracer's round totals are complete once the round has ended
+            self._round(round).update(
+                (f"{name}_seconds", seconds)
+                for name, seconds in tracer.rounds[round].items()
+                if name not in ("round", "rss", "peak_rss", "allocations")
+            )
+
+    def server_evaluation(self, round: int, eval_type: str, evals: dict, **kwargs) -> None:
+        if eval_type == "global":
+            self._round(round).update(_numeric(evals))
+
+    def state_dict(self) -> Dict[str, Any]:
+        """The rounds recorded so far, for checkpoints (see `src.checkpoint`)."""
+        return {"rounds": {round: dict(values) for round, values in self.rounds.items()}}
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        self.rounds = {round: dict(values) for round, values in state["rounds"].items()}
+
+
+class ResultsDB:
+    """SQLite store of experiment runs (see the module docstring).
+
+    Args:
+        path: The database file (created with its parent directories).
+        timeout: Seconds to wait for another process's write lock.
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_RESULTS_DB, timeout: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> "ResultsDB":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Writing
+
+    def add_runs(self, runs: Iterable[Mapping[str, Any]]) -> List[int]:
+        """Append runs in one transaction; returns their ``run_id``.
+
+        Each run is a mapping with ``config`` (the `run_experiment` arguments),
+        ``metrics`` (the final metrics) and optionally ``name``, ``started_at``
+        and ``rounds`` (``{round: {metric: value}}``).
+        """
+        run_ids = []
+        columns = ("name", "started_at", *RUN_COLUMNS, "config", "metrics")
+        insert = f"INSERT INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        with self.connection:
+            for run in runs:
+                config = _jsonable(run["config"])
+                metrics = _jsonable(run["metrics"])
+                row = [run.get("name"), run.get("started_at", time.time())]
+                row += [config.get(column) for column in RUN_COLUMNS]
+                row += [json.dumps(config, sort_keys=True), json.dumps(metrics)]
+                run_id = self.connection.execute(insert, row).lastrowid
+                self.connection.executemany(
+                    "INSERT INTO run_metrics VALUES (?, ?, ?)",
+                    [(run_id, name, value) for name, value in _numeric(run["metrics"]).items()],
+                )
+                self.connection.executemany(
+                    "INSERT INTO round_metrics VALUES (?, ?, ?, ?)",
+                    [
+                        (run_id, round, name, value)
+                        for round, values in run.get("rounds", {}).items()
+                        for name, value in _numeric(values).items()
+                    ],
+                )
+                run_ids.append(run_id)
+        return run_ids
+
+    def add_run(
+        self,
+        config: Mapping[str, Any],
+        metrics: Mapping[str, Any],
+        rounds: Optional[Mapping[int, Mapping[str, float]]] = None,
+        name: Optional[str] = None,
+        started_at: Optional[float] = None,
+    ) -> int:
+        """Append one run (see `add_runs`); returns its ``run_id``."""
+        run = dict(config=config, metrics=metrics, rounds=rounds or {}, name=name)
+        if started_at is not None:
+            run["started_at"] = started_at
+        return self.add_runs([run])[0]
+
+    # Reading
+
+    def query(self, sql: str, *params: Any) -> List[Dict[str, Any]]:
+        """Rows of an arbitrary SQL query, as dicts."""
+        return [dict(row) for row in self.connection.execute(sql, params)]
+
+    def _column(self, name: str) -> str:
+        if name not in ("run_id", "name", "started_at", *RUN_COLUMNS):
+            raise ValueError(f"Unknown run column {name!r} (expected one of {list(RUN_COLUMNS)})")
+        return name
+
+    def runs(self, **where: Any) -> List[Dict[str, Any]]:
+        """Every run matching ``where`` (run column = value), with its final metrics as keys."""
+        conditions = " AND ".join(f"r.{self._column(name)} = ?" for name in where)
+        rows = self.query(
+            f"""SELECT r.run_id, r.name, r.started_at, {", ".join(f"r.{c}" for c in RUN_COLUMNS)},
+                       m.name AS metric, m.value
+                FROM runs r LEFT JOIN run_metrics m ON m.run_id = r.run_id
+                {f"WHERE {conditions}" if where else ""}
+                ORDER BY r.run_id""",
+            *where.values(),
+        )
+        runs: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            metric, value = row.pop("metric"), row.pop("value")
+            run = runs.setdefault(row["run_id"], row)
+            if metric is not None:
+                run[metric] = value
+        return list(runs.values())
+
+    def rounds(self, run_id: int) -> List[Dict[str, Any]]:
+        """The per-round metrics of a run, one dict per round."""
+        rounds: Dict[int, Dict[str, Any]] = {}
+        for row in self.connection.execute(
+            "SELECT round, name, value FROM round_metrics WHERE run_id = ? ORDER BY round",
+            (run_id,),
+        ):
+            rounds.setdefault(row["round"], {"round": row["round"]})[row["name"]] = row["value"]
+        return list(rounds.values())
+
+    def best(
+        self, metric: str, by: str = "algorithm", higher_is_better: bool = True
+    ) -> List[Dict[str, Any]]:
+        """The run with the best final ``metric`` in each group of ``by``."""
+        by = self._column(by)
+        # SQLite returns the bare columns of the row holding the MAX/MIN of a group
+        aggregate = "MAX" if higher_is_better else "MIN"
+        rows = self.query(
+            f"""SELECT r.{by}, {aggregate}(m.value) AS value, r.run_id, r.name, r.config
+                FROM runs r JOIN run_metrics m ON m.run_id = r.run_id
+                WHERE m.name = ?
+                GROUP BY r.{by}
+                ORDER BY value {"DESC" if higher_is_better else "ASC"}""",
+            metric,
+        )
+        for row in rows:
+            row[metric] = row.pop("value")
+        return rows
+
+    def trend(self, x: str, y: str, by: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Mean, min, max and count of the final metric ``y`` per value of the run column ``x``."""
+        groups = [self._column(x)] + ([self._column(by)] if by is not None else [])
+        keys = ", ".join(f"r.{g}" for g in groups)
+        return self.query(
+            f"""SELECT {keys}, AVG(m.value) AS mean, MIN(m.value) AS min,
+                       MAX(m.value) AS max, COUNT(*) AS runs
+                FROM runs r JOIN run_metrics m ON m.run_id = r.run_id
+                WHERE m.name = ?
+                GROUP BY {keys}
+                ORDER BY {keys}""",
+            y,
+        )
+
+
+def format_rows(rows: Sequence[Mapping[str, Any]], columns: Optional[Sequence[str]] = None) -> str:
+    """A plain-text table of query rows."""
+    if not rows:
+        return "(no runs)"
+    columns = list(columns or rows[0])
+    cells = [
+        [f"{row.get(c):.5g}" if isinstance(row.get(c), float) else str(row.get(c, "-")) for c in columns]
+        for row in rows
+    ]
+    widths = [max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines.append("-" * len(lines[0]))
+    lines += ["  ".join(v.rjust(w) for v, w in zip(line, widths)) for line in cells]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the experiment results store.")
+    parser.add_argument("db", nargs="?", default=DEFAULT_RESULTS_DB)
+    parser.add_argument("--best", metavar="METRIC", help="Best run per --by group on METRIC")
+    parser.add_argument("--lower-is-better", action="store_true")
+    parser.add_argument("--trend", nargs=2, metavar=("X", "METRIC"), help="METRIC per value of X")
+    parser.add_argument("--by", default=None, help="Grouping run column (default: algorithm)")
+    parser.add_argument("--rounds", type=int, metavar="RUN_ID", help="Per-round metrics of a run")
+    parser.add_argument("--sql", help="An arbitrary SQL query")
+    args = parser.parse_args()
+
+    with ResultsDB(args.db) as db:
+        if args.best:
+            rows = db.best(args.best, args.by or "algorithm", not args.lower_is_better)
+            print(format_rows(rows, [args.by or "algorithm", args.best, "run_id", "name"]))
+        elif args.trend:
+            print(format_rows(db.trend(*args.trend, by=args.by)))
+        elif args.rounds is not None:
+            print(format_rows(db.rounds(args.rounds)))
+        elif args.sql:
+            print(format_rows(db.query(args.sql)))
+        else:
+            columns = ["run_id", "name", "algorithm", "distribution", "n_clients", "seed"]
+            runs = db.runs()
+            print(format_rows(runs, columns + ["accuracy", "macro_f1", "runtime_seconds"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Run independent experiment scenarios in a process pool.
+
+A scenario is a declarative description of one `run_experiment` call. Every
+scenario seeds its own run (``FlukeENV.set_seed``), so scenarios do not depend
+on each other and can run in any order or in parallel. The results are the same
+as in a sequential run, as long as both use the same number of torch threads:
+the worker initializer caps intra-op threads so that the workers together do
+not oversubscribe the cores, and the default cap depends on the number of
+workers (a sequential run gets every core), so pass ``threads_per_worker`` to
+compare runs with different ``workers``.
+"""
+
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Scenario:
+    """One `run_experiment` call.
+
+    Args:
+        name: Short identifier used in the report.
+        title: Header printed before the scenario output.
+        params: Keyword arguments for `run_experiment`.
+        evaluator: Optional zero-argument factory for the evaluator, called in
+            the worker (evaluators hold torchmetrics state and are not shared).
+    """
+
+    name: str
+    title: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    evaluator: Optional[Callable[[], Any]] = None
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    title: str
+    metrics: Dict[str, Any]
+    output: str
+    wall_seconds: float
+
+
+def default_workers(n_scenarios: int) -> int:
+    return max(1, min(n_scenarios, os.cpu_count() or 1))
+
+
+def _init_worker(threads: int) -> None:
+    # Must run before torch spins up its thread pools
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    import torch
+
+    torch.set_num_threads(threads)
+
+
+def run_scenario(scenario: Scenario) -> ScenarioResult:
+    """Run one scenario, capturing everything it prints."""
+    from src.simulation import run_experiment
+
+    params = dict(scenario.params)
+    params.setdefault("run_name", scenario.name)
+    if scenario.evaluator is not None:
+        params["evaluator"] = scenario.evaluator()
+
+    buffer = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        _, metrics = run_experiment(**params)
+    return ScenarioResult(
+        name=scenario.name,
+        title=scenario.title,
+        metrics=metrics,
+        output=buffer.getvalue(),
+        wall_seconds=time.perf_counter() - start,
+    )
+
+
+def _print_result(result: ScenarioResult) -> None:
+    print(f"\n{result.title}")
+    print("-" * len(result.title))
+    print(result.output, end="")
+
+
+def run_scenarios(
+    scenarios: List[Scenario],
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+) -> List[ScenarioResult]:
+    """Run ``scenarios`` and return their results in the order of the list.
+
+    Each scenario's output is printed as one block, in list order, as soon as
+    it and all the scenarios before it are done.
+
+    Args:
+        scenarios: The scenarios to run.
+        workers: Number of worker processes. Defaults to one per scenario, capped
+            at the number of CPUs. ``workers=1`` runs in the current process and
+            restores its torch thread count afterwards.
+        threads_per_worker: torch intra-op threads per worker. Defaults to
+            ``cpu_count // workers``; results only match across ``workers`` values
+            run with the same thread count.
+    """
+    workers = workers or default_workers(len(scenarios))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    if workers == 1:
+        # In-process: cap the threads for the runs only, the caller keeps its own setting
+        import torch
+
+        previous = torch.get_num_threads()
+        torch.set_num_threads(threads)
+        try:
+            results = []
+            for scenario in scenarios:
+                results.append(run_scenario(scenario))
+                _print_result(results[-1])
+        finally:
+            torch.set_num_threads(previous)
+        return results
+
+    # spawn: fresh interpreters, so the thread caps apply before torch is imported
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    ) as pool:
+        futures = [pool.submit(run_scenario, scenario) for scenario in scenarios]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            _print_result(results[-1])
+    return results
+
+
+def format_report(results: List[ScenarioResult]) -> str:
+    """One line per scenario with its final metrics, in scenario order."""
+    metric_names = []
+    for result in results:
+        for name in result.metrics:
+            if name not in metric_names:
+                metric_names.append(name)
+
+    header = f"{'scenario':<20}" + "".join(f"{name[:16]:>17}" for name in metric_names)
+    lines = [header, "-" * len(header)]
+    for result in results:
+        row = f"{result.name:<20}"
+        for name in metric_names:
+            value = result.metrics.get(name)
+            row += f"{value:>17.5f}" if isinstance(value, float) else f"{str(value):>17}"
+        lines.append(row)
+    return "\n".join(lines)
@@ -0,0 +1,242 @@
+"""Pluggable client selection for partial participation.
+
+fluke's `Server` picks ``eligible_perc`` of the clients uniformly at random.
+`ClientSamplingMixin` delegates the choice to a `ClientSampler` instead:
+
+* ``uniform``: fluke's selection, draw for draw (the default behaviour).
+* ``power_of_choice`` [Cho et al., 2022]: draw ``candidates`` times as many
+  clients as needed, in proportion to their data size, and keep those on
+  which the current global model has the highest loss. A client's loss is
+  cached and only recomputed once it is ``refresh_every`` rounds old.
+* ``importance``: draw clients with probability proportional to their data
+  size (``by="size"``) or to the norm of their last update (``by="norm"``;
+  clients not seen yet get the largest norm seen so far), mixed with a
+  uniform share ``explore`` so no client starves.
+* ``clustered`` [Fraboni et al., 2021]: group the clients into as many
+  clusters as clients per round by k-means on their label distributions
+  (computed once), then draw one client per cluster in proportion to data size.
+
+The samplers draw from numpy's global RNG, as fluke does, so the selection is
+seeded by the experiment seed and captured by checkpoints. Their state (loss
+and update-norm caches, clusters) lives on the sampler, itself kept on the
+server as ``client_sampler``. Aggregation is left unchanged: the clients'
+weights are their data sizes, whatever made them selected.
+"""
+
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+from fluke.client import Client
+
+
+def _train_tensors(client: Client) -> tuple:
+    """The client's training features and labels, without iterating (and reshuffling) its loader."""
+    loader = client.train_set
+    X, y = loader.tensors[:2]
+    return X[: loader.size], y[: loader.size]
+
+
+def _data_sizes(clients: Sequence[Client]) -> np.ndarray:
+    return np.array([client.train_set.size for client in clients], dtype=float)
+
+
+class ClientSampler(ABC):
+    """Chooses the clients of each round; see the module docstring."""
+
+    @abstractmethod
+    def select(self, server, n: int) -> List[int]:
+        """Indices of the ``n`` clients of ``server`` taking part in the next round."""
+
+    def observe(self, round: int, client_index: int, update_norm: float) -> None:
+        """Called with the norm of every update the server receives."""
+
+    def describe(self) -> Dict[str, Any]:
+        """The settings of the sampler (not its state), recorded with the results."""
+        return {}
+
+
+class UniformSampler(ClientSampler):
+    def select(self, server, n: int) -> List[int]:
+        return list(np.random.choice(server.n_clients, n, replace=False))
+
+
+class PowerOfChoiceSampler(ClientSampler):
+    """Highest-loss clients among size-weighted candidates.
+
+    Args:
+        candidates: Number of candidates, as a multiple of the clients per round.
+        refresh_every: Age, in rounds, after which a cached loss is recomputed.
+    """
+
+    def __init__(self, candidates: float = 2.0, refresh_every: int = 1):
+        self.candidates = candidates
+        self.refresh_every = refresh_every
+        self.losses: Dict[int, float] = {}
+        self._loss_rounds: Dict[int, int] = {}
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(candidates=self.candidates, refresh_every=self.refresh_every)
+
+    @torch.no_grad()
+    def _loss(self, server, client: Client) -> float:
+        X, y = _train_tensors(client)
+        model = server.model.to(server.device)
+        # Eval mode: no dropout, so no draws from the training RNG either
+        training = model.training
+        model.eval()
+        logits = model(X.to(server.device))
+        model.train(training)
+        return float(client.hyper_params.loss_fn(logits, y.to(server.device)))
+
+    def select(self, server, n: int) -> List[int]:
+        sizes = _data_sizes(server.clients)
+        d = min(server.n_clients, max(n, math.ceil(self.candidates * n)))
+        candidates = np.random.choice(server.n_clients, d, replace=False, p=sizes / sizes.sum())
+        round = server.rounds + 1
+        for index in candidates:
+            if round - self._loss_rounds.get(index, -math.inf) >= self.refresh_every:
+                self.losses[index] = self._loss(server, server.clients[index])
+                self._loss_rounds[index] = round
+        server.model.cpu()
+        # Stable sort: ties keep the draw order
+        ranked = sorted(candidates, key=lambda index: -self.losses[index])
+        return ranked[:n]
+
+
+class ImportanceSampler(ClientSampler):
+    """Clients drawn in proportion to their data size or last update norm.
+
+    Args:
+        by: ``"size"`` or ``"norm"``.
+        explore: Share of the probability mass spread uniformly over the clients.
+    """
+
+    def __init__(self, by: str = "size", explore: float = 0.1):
+        if by not in ("size", "norm"):
+            raise ValueError(f"Unknown importance {by!r} (expected 'size' or 'norm')")
+        self.by = by
+        self.explore = explore
+        self.norms: Dict[int, float] = {}
+
+    def describe(self) -> Dict[str, Any]:
+        return dict(by=self.by, explore=self.explore)
+
+    def observe(self, round: int, client_index: int, update_norm: float) -> None:
+        self.norms[client_index] = update_norm
+
+    def probabilities(self, server) -> np.ndarray:
+        if self.by == "size":
+            weights = _data_sizes(server.clients)
+        else:
+            unseen = max(self.norms.values(), default=1.0)
+            weights = np.array([self.norms.get(i, unseen) for i in range(server.n_clients)])
+        if weights.sum() <= 0:
+            weights = np.ones(server.n_clients)
+        p = (1 - self.explore) * weights / weights.sum() + self.explore / server.n_clients
+        return p / p.sum()
+
+    def select(self, server, n: int) -> List[int]:
+        p = self.probabilities(server)
+        return list(np.random.choice(server.n_clients, n, replace=False, p=p))
+
+
+def _kmeans(points: np.ndarray, k: int, iterations: int = 50) -> np.ndarray:
+    """Cluster labels of ``points``; deterministic farthest-point initialisation."""
+    centers = [points[0]]
+    for _ in range(1, k):
+        distance = np.min([((points - c) ** 2).sum(1) for c in centers], axis=0)
+        centers.append(points[distance.argmax()])
+    centers = np.stack(centers)
+    labels = np.zeros(len(points), dtype=int)
+    for iteration in range(iterations):
+        new_labels = ((points[:, None] - centers[None]) ** 2).sum(-1).argmin(1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for j in range(k):
+            if (labels == j).any():
+                centers[j] = points[labels == j].mean(0)
+    return labels
+
+
+class ClusteredSampler(ClientSampler):
+    """One client per cluster of similar label distributions."""
+
+    def __init__(self):
+        self.clusters: Optional[np.ndarray] = None
+        self._n_clusters = 0
+
+    def _cluster(self, server, n: int) -> np.ndarray:
+        histograms = []
+        for client in server.clients:
+            _, y = _train_tensors(client)
+            counts = torch.bincount(y.long(), minlength=client.train_set.num_labels).double()
+            histograms.append((counts / counts.sum().clamp_min(1)).numpy())
+        return _kmeans(np.stack(histograms), n)
+
+    def select(self, server, n: int) -> List[int]:
+        if self.clusters is None or self._n_clusters != n:
+            self.clusters, self._n_clusters = self._cluster(server, n), n
+        sizes = _data_sizes(server.clients)
+        selected = []
+        for j in range(n):
+            members = np.flatnonzero(self.clusters == j)
+            if len(members):
+                p = sizes[members] / sizes[members].sum()
+                selected.append(int(np.random.choice(members, p=p)))
+        # Fewer non-empty clusters than clients per round: fill in uniformly
+        rest = np.setdiff1d(np.arange(server.n_clients), selected)
+        selected.extend(np.random.choice(rest, n - len(selected), replace=False))
+        return selected
+
+
+SAMPLERS = {
+    "uniform": UniformSampler,
+    "power_of_choice": PowerOfChoiceSampler,
+    "importance": ImportanceSampler,
+    "clustered": ClusteredSampler,
+}
+
+
+def make_sampler(sampler: Union[str, ClientSampler]) -> ClientSampler:
+    """A sampler from its `SAMPLERS` name (or the sampler itself)."""
+    if isinstance(sampler, ClientSampler):
+        return sampler
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Unknown client sampler {sampler!r} (expected one of {list(SAMPLERS)})")
+    return SAMPLERS[sampler]()
+
+
+class ClientSamplingMixin:
+    """Server mixin selecting each round's clients with a `ClientSampler`.
+
+    Args:
+        client_sampler: A `ClientSampler` or the name of one in `SAMPLERS`.
+    """
+
+    def __init__(self, *args, client_sampler: Union[str, ClientSampler] = "uniform", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.client_sampler = make_sampler(client_sampler)
+
+    def get_eligible_clients(self, eligible_perc: float) -> Sequence[Client]:
+        if eligible_perc == 1:
+            return super().get_eligible_clients(eligible_perc)
+        n = max(1, int(self.n_clients * eligible_perc))
+        return [self.clients[index] for index in self.client_sampler.select(self, n)]
+
+    def receive_client_models(
+        self, eligible: Iterable[Client], state_dict: bool = True
+    ) -> Iterable:
+        round = self.rounds + 1
+        base = [p.detach().clone() for p in self.model.parameters()]
+        models = super().receive_client_models(eligible, state_dict=False)
+        for client, model in zip(eligible, models):
+            with torch.no_grad():
+                norm = math.sqrt(
+                    sum(float(((p - b) ** 2).sum()) for p, b in zip(model.parameters(), base))
+                )
+            self.client_sampler.observe(round, client.index, norm)
+            yield model.state_dict() if state_dict else model
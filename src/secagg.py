@@ -0,0 +1,303 @@
+"""Secure aggregation with pairwise masks, simulated over flat parameter buffers.
+
+With secure aggregation [Bonawitz et al., 2017] the server only learns the sum
+of the clients' updates. Every pair of clients (i, j) of a round agrees on a
+seed; client i adds the pseudo-random mask expanded from it and client j
+subtracts it, so the masks cancel in the sum. Each client also adds a mask
+from a seed of its own ("double masking"), which the server removes once the
+surviving clients reveal those seeds. Updates are encoded as ``precision``-bit
+fixed-point integers and summed modulo 2**64, so the masks cancel exactly.
+
+`SecAggFedAVG` is FedAVG whose server runs the protocol on the client models
+as it receives them: as for the compression of `src/compression.py`, the
+clients' side is computed at the server end of the channel, so every client
+class and round executor works unchanged. What grows with the model and the
+number of clients is computed for real:
+
+* the masks come from a counter-based PRG (splitmix64, as in the test split of
+  `src/dataset.py`) evaluated over a whole ``[pairs x parameters]`` block at
+  once, instead of one generator per pair and tensor. Each pair's mask is
+  expanded once, added to one client's flat update and subtracted from the
+  other's (both ends would derive the same mask from the seed);
+* with ``neighbours=k``, each client shares masks with ``k`` others only, its
+  neighbours on a ring shuffled every round (as in SecAgg+ [Bell et al.,
+  2020]): ``n * k / 2`` masks per round instead of ``n * (n - 1) / 2``;
+* every client of a round drops out with probability ``dropout``, after the
+  masks are agreed: its masked update never arrives. The server regenerates
+  the masks the survivors shared with the dropped clients, as it would from
+  the seeds they reveal, and removes them from the sum. With fewer than
+  ``threshold`` of the round's clients left, the seeds cannot be recovered
+  and the round is lost (the global model is unchanged).
+
+The key agreement and the secret sharing of the seeds are not simulated: the
+seeds are drawn from a generator seeded by the experiment seed and the round,
+and splitmix64 is fast but not a cryptographic PRG (a deployment would expand
+the seeds with AES-CTR or ChaCha20). The aggregate is the survivors' weighted
+average, renormalized over them, applied as fluke does
+(``global.lerp(aggregate, lr)``). Buffers are averaged in the clear.
+
+The server records, per round, the seconds spent masking (the clients' side)
+and unmasking (the server's side) in ``secagg_seconds``, the int64 working
+memory (masked updates plus one mask block) in ``secagg_bytes``, the bytes of
+the masked uploads (8 per parameter instead of 4) in ``upload_bytes``, and the
+clients that dropped out in ``dropped``. Lost rounds are listed in ``failed_rounds``.
+"""
+
+import math
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import torch
+from fluke import FlukeENV
+from fluke.algorithms import CentralizedFL
+from fluke.client import Client
+from fluke.server import Server
+
+from src.aggregation import flat_parameters
+from src.tracing import span
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX = (
+    (np.uint64(30), np.uint64(0xBF58476D1CE4E5B9)),
+    (np.uint64(27), np.uint64(0x94D049BB133111EB)),
+)
+
+# Mixed into the round generator's seed, so its draws differ from other per-round streams
+_SALT = 0x5EC466
+
+
+@lru_cache(maxsize=4)
+def _counters(size: int) -> np.ndarray:
+    with np.errstate(over="ignore"):
+        return np.arange(1, size + 1, dtype=np.uint64) * _GOLDEN
+
+
+def prg_masks(seeds: np.ndarray, size: int) -> np.ndarray:
+    """The first ``size`` outputs of splitmix64 for each of ``seeds`` (a ``[seeds x size]`` block).
+
+    splitmix64 is counter-based (output ``k`` only depends on ``seed + (k + 1) *
+    golden``), so every row and column is evaluated at once, in place.
+    """
+    z = np.add(seeds.astype(np.uint64)[:, None], _counters(size)[None, :])
+    tmp = np.empty_like(z)
+    for shift, multiplier in _MIX:
+        np.right_shift(z, shift, out=tmp)
+        z ^= tmp
+        z *= multiplier
+    np.right_shift(z, np.uint64(31), out=tmp)
+    z ^= tmp
+    return z
+
+
+def mask_pairs(n: int, neighbours: Optional[int], rng: np.random.Generator) -> tuple:
+    """The pairs of the ``n`` clients of a round that share a mask, as two index arrays.
+
+    All the pairs when ``neighbours`` is ``None`` (or covers them), otherwise each
+    client and its ``neighbours // 2`` successors on a ring shuffled by ``rng``.
+    """
+    half = (neighbours or n) // 2
+    if 2 * half >= n - 1:
+        first, second = np.triu_indices(n, 1)
+        return first, second
+    ring = rng.permutation(n)
+    first = np.tile(ring, half)
+    second = np.concatenate([np.roll(ring, -offset) for offset in range(1, half + 1)])
+    return first, second
+
+
+def add_masks(
+    target: torch.Tensor,
+    seeds: np.ndarray,
+    add: Optional[np.ndarray] = None,
+    subtract: Optional[np.ndarray] = None,
+    block_size: int = 1 << 20,
+) -> int:
+    """Add mask ``seeds[i]`` to row ``add[i]`` of ``target`` and subtract it from ``subtract[i]``.
+
+    The masks are expanded ``block_size`` elements at a time, once each
+    whatever the rows they go to (arithmetic is modulo 2**64). Returns the
+    bytes of the largest block (with its scratch copy).
+    """
+    size = target.shape[1]
+    step = max(1, block_size // size)
+    largest = 0
+    for start in range(0, len(seeds), step):
+        block = prg_masks(seeds[start : start + step], size)
+        largest = max(largest, 2 * block.nbytes)
+        block = torch.from_numpy(block.view(np.int64))
+        for rows, alpha in ((add, 1), (subtract, -1)):
+            if rows is not None:
+                index = torch.from_numpy(rows[start : start + step])
+                target.index_add_(0, index, block, alpha=alpha)
+    return largest
+
+
+def _random_seeds(rng: np.random.Generator, size: int) -> np.ndarray:
+    return rng.integers(0, np.iinfo(np.uint64).max, size=size, dtype=np.uint64, endpoint=True)
+
+
+def _zeros(size: int) -> np.ndarray:
+    # Row indices all pointing at a single-row target
+    return np.zeros(size, dtype=np.int64)
+
+
+def mask_updates(
+    masked: torch.Tensor,
+    self_seeds: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    pair_seeds: np.ndarray,
+    block_size: int = 1 << 20,
+) -> int:
+    """The clients' side: add every client's self mask and its pair masks to its row, in place.
+
+    ``masked`` holds one fixed-point update per row; pair ``k`` adds mask
+    ``pair_seeds[k]`` to row ``first[k]`` and subtracts it from row ``second[k]``.
+    Returns the bytes of the largest mask block.
+    """
+    return max(
+        add_masks(masked, self_seeds, add=np.arange(len(self_seeds)), block_size=block_size),
+        add_masks(masked, pair_seeds, add=first, subtract=second, block_size=block_size),
+    )
+
+
+def unmask_sum(
+    masked: torch.Tensor,
+    alive: np.ndarray,
+    self_seeds: np.ndarray,
+    first: np.ndarray,
+    second: np.ndarray,
+    pair_seeds: np.ndarray,
+    block_size: int = 1 << 20,
+) -> torch.Tensor:
+    """The server's side: the ``[1 x size]`` sum of the unmasked updates of the ``alive`` rows.
+
+    Sums the masked rows that arrived, then removes the survivors' self masks
+    and the masks they shared with the clients that dropped out.
+    """
+    survivors = np.flatnonzero(alive)
+    total = masked[torch.from_numpy(survivors)].sum(dim=0, keepdim=True)
+    # A survivor paired with a dropped client leaves its side of their mask in
+    # the sum: +mask from the first of the pair, -mask from the second
+    first_left = alive[first] & ~alive[second]
+    second_left = ~alive[first] & alive[second]
+    extra = np.concatenate([self_seeds[survivors], pair_seeds[first_left]])
+    missing = pair_seeds[second_left]
+    add_masks(total, extra, subtract=_zeros(len(extra)), block_size=block_size)
+    add_masks(total, missing, add=_zeros(len(missing)), block_size=block_size)
+    return total
+
+
+class SecAggServer(Server):
+    """FedAVG server aggregating pairwise-masked updates (see the module docstring).
+
+    Args:
+        dropout: Probability that a client of the round drops out before its upload.
+        threshold: Fraction of the round's clients that must survive to unmask the sum.
+        neighbours: Number of clients each client shares masks with, rounded down to
+            an even number (``None``: all of them).
+        precision: Fractional bits of the fixed-point encoding.
+        block_size: Mask elements expanded at once (bounds the working memory).
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        test_set,
+        clients: Sequence[Client],
+        weighted: bool = False,
+        dropout: float = 0.0,
+        threshold: float = 0.5,
+        neighbours: Optional[int] = None,
+        precision: int = 32,
+        block_size: int = 1 << 20,
+        **kwargs,
+    ):
+        super().__init__(model, test_set, clients, weighted=weighted, **kwargs)
+        if not 0.0 <= dropout < 1.0:
+            raise ValueError(f"dropout must be in [0, 1), got {dropout}")
+        if neighbours is not None and neighbours < 2:
+            raise ValueError(f"neighbours must be at least 2, got {neighbours}")
+        self.hyper_params.update(
+            dropout=dropout,
+            threshold=threshold,
+            neighbours=neighbours,
+            precision=precision,
+            block_size=block_size,
+        )
+        self.secagg_seconds: Dict[int, Dict[str, float]] = {}
+        self.secagg_bytes: Dict[int, int] = {}
+        self.upload_bytes: Dict[int, Dict[int, int]] = {}
+        self.dropped: Dict[int, List[int]] = {}
+        self.failed_rounds: List[int] = []
+
+    @torch.no_grad()
+    def aggregate(self, eligible: Sequence[Client], client_models: Iterable) -> None:
+        cfg = self.hyper_params
+        round = self.rounds + 1
+        n = len(eligible)
+        weights = self._get_client_weights(eligible)
+        scale = 2.0**cfg.precision
+
+        # The round's key agreement: pair and self seeds, and who drops out
+        rng = np.random.default_rng([FlukeENV().get_seed(), round, _SALT])
+        first, second = mask_pairs(n, cfg.neighbours, rng)
+        pair_seeds = _random_seeds(rng, len(first))
+        self_seeds = _random_seeds(rng, n)
+        alive = rng.random(n) >= cfg.dropout
+
+        # Clients: encode the update in fixed point, add the self and pair masks
+        flat = flat_parameters(self.model)
+        masked = torch.empty((n, flat.numel()), dtype=torch.int64)
+        buffers = []
+        for row, model in enumerate(client_models):
+            update = flat_parameters(model).to("cpu", torch.float64)
+            masked[row] = update.mul_(weights[row] * scale).round_().to(torch.int64)
+            if alive[row]:
+                buffers.append((weights[row], dict(model.named_buffers())))
+
+        block = cfg.block_size
+        start = time.perf_counter()
+        with span("mask"):
+            block_bytes = mask_updates(masked, self_seeds, first, second, pair_seeds, block)
+        mask_seconds = time.perf_counter() - start
+
+        survivors = np.flatnonzero(alive)
+        upload = flat.numel() * masked.element_size()
+        self.upload_bytes[round] = {eligible[i].index: upload for i in survivors}
+        self.dropped[round] = [eligible[i].index for i in np.flatnonzero(~alive)]
+        self.secagg_bytes[round] = masked.nbytes + block_bytes
+
+        # Server: the sum of the updates that arrived, once unmasked
+        start = time.perf_counter()
+        lost = len(survivors) == 0 or len(survivors) < math.ceil(cfg.threshold * n)
+        if not lost:
+            with span("unmask"):
+                total = unmask_sum(masked, alive, self_seeds, first, second, pair_seeds, block)
+                weight = sum(weights[i] for i in survivors)
+                aggregated = total[0].to(torch.float64).div_(scale * weight)
+        self.secagg_seconds[round] = {"mask": mask_seconds, "unmask": time.perf_counter() - start}
+
+        if lost:
+            self.failed_rounds.append(round)
+            return
+
+        flat.lerp_(aggregated.to(flat.device, flat.dtype), cfg.lr)
+        for name, buffer in self.model.named_buffers():
+            if "num_batches_tracked" in name:
+                buffer.fill_(max(int(b[name]) for _, b in buffers))
+            else:
+                average = sum(w * b[name].to(buffer.device) for w, b in buffers) / weight
+                buffer.lerp_(average, cfg.lr)
+
+
+class SecAggFedAVG(CentralizedFL):
+    """FedAVG with simulated secure aggregation (options through ``extra_server_params``)."""
+
+    def get_client_class(self) -> type[Client]:
+        return Client
+
+    def get_server_class(self) -> type[Server]:
+        return SecAggServer
@@ -1,4 +1,7 @@
+import copy
 import time
+from dataclasses import dataclass, is_dataclass
+from typing import Any, Mapping, Optional, Union
 
 import torch.nn as nn
 from fluke import DDict, FlukeENV
@@ -7,8 +10,271 @@ from fluke.algorithms.fedavg import FedAVG
 from fluke.data import DataSplitter
 from fluke.evaluation import ClassificationEval
 
-from src.dataset import get_fluke_dataset
+from src.aggregation import FlatAggregationMixin
+from src.async_eval import AsyncEvalMixin
+from src.cache import DEFAULT_CACHE_DIR, PreprocessingCache
+from src.checkpoint import Checkpointer, load_checkpoint, restore
+from src.compression import CompressedUpdatesMixin
+from src.dataset import DIABETES_FILE, get_fluke_dataset
+from src.feature_store import IndexedDataSplitter
+from src.fedbuff import FedBuff, VirtualClockMixin
+from src.mixins import with_server_mixin
 from src.models import BinaryClassifier
+from src.parallel import parallel_rounds
+from src.partition import DEFAULT_PARTITION_DIR, NativeDataSplitter, PartitionCache
+from src.results import ResultsDB, RunRecorder, _jsonable
+from src.sampling import ClientSamplingMixin
+from src.secagg import SecAggFedAVG, SecAggServer
+from src.stopping import EarlyStopper, EarlyStoppingMixin
+from src.tracing import TracedServerMixin, Tracer, TracingObserver, set_tracer, span
+from src.vmap_engine import VmapRoundsMixin
+
+
+@dataclass
+class DataOptions:
+    """Where the data comes from and how it is split over the clients.
+
+    Args:
+        filepath: The Diabetes 130-US Hospitals CSV.
+        cache_dir: On-disk cache of the preprocessed tensors (``None`` disables it).
+        chunk_size: Stream the CSV in chunks of this many rows (out-of-core).
+        mmap: Memory-map the features and give the clients index views over them.
+        native_split: Split with the vectorized, cached partitioner of
+            `src.partition` (always the case for ``distribution="natural"``).
+        dist_args: Arguments of the distribution, e.g. ``beta`` or the ``column``
+            of a natural split.
+        partition_dir: On-disk cache of the native partitions (``None`` disables it).
+    """
+
+    filepath: str = DIABETES_FILE
+    cache_dir: Optional[str] = DEFAULT_CACHE_DIR
+    chunk_size: Optional[int] = None
+    mmap: bool = False
+    native_split: bool = False
+    dist_args: Optional[Mapping[str, Any]] = None
+    partition_dir: Optional[str] = DEFAULT_PARTITION_DIR
+
+
+@dataclass
+class ServerOptions:
+    """Optional server features, each one applied as a server mixin.
+
+    Args:
+        client_workers: Train the clients of a round on this many worker
+            processes (``0``: seeded, in-process; ``None``: fluke's own loop).
+        threads_per_worker: torch intra-op threads of each worker.
+        vmap_clients: Train the clients of a round at once with the vmap engine.
+        async_eval: Evaluate the global model in a background thread, with at
+            most this many rounds in flight (``0``: synchronously).
+        compression: Compress the clients' updates (see `src.compression`).
+        aggregation: Aggregate the client models as one matrix (see `src.aggregation`).
+        latency_model: Put the rounds on a virtual clock (see `src.fedbuff`).
+        client_sampler: Choose each round's clients (see `src.sampling`).
+    """
+
+    client_workers: Optional[int] = None
+    threads_per_worker: int = 1
+    vmap_clients: bool = False
+    async_eval: int = 0
+    compression: Union[str, Mapping[str, Any], None] = None
+    aggregation: Union[str, Mapping[str, Any], None] = None
+    latency_model: Any = None
+    client_sampler: Any = None
+
+
+@dataclass
+class StoppingOptions:
+    """When to stop before ``n_rounds`` (see `src.stopping.EarlyStopper`).
+
+    Args:
+        target: Value of ``target_metric`` to reach.
+        target_metric: The global metric the target and the patience apply to.
+        stop_at_target: Stop once the target is reached (else only report when it was).
+        patience: Stop after this many rounds without a ``min_delta`` improvement.
+        min_delta: Smallest change counted as an improvement.
+        time_budget: Stop once this many seconds of training are spent.
+    """
+
+    target: Optional[float] = None
+    target_metric: str = "accuracy"
+    stop_at_target: bool = True
+    patience: Optional[int] = None
+    min_delta: float = 0.0
+    time_budget: Optional[float] = None
+
+
+@dataclass
+class CheckpointOptions:
+    """Per-round checkpoints (see `src.checkpoint`).
+
+    Args:
+        checkpoint_dir: Directory of the checkpoints (``None``: no checkpoints).
+        checkpoint_every: Rounds between two checkpoints.
+        keep_checkpoints: Number of most recent checkpoints kept.
+        resume_from: Checkpoint file or directory of a previous run to continue.
+    """
+
+    checkpoint_dir: Optional[str] = None
+    checkpoint_every: int = 1
+    keep_checkpoints: int = 3
+    resume_from: Optional[str] = None
+
+
+@dataclass
+class InstrumentationOptions:
+    """What the run records besides its printed metrics.
+
+    Args:
+        trace: Path of the Chrome trace of the run's spans (see `src.tracing`).
+        trace_allocations: Also count the tensor allocations of the local updates.
+        results_db: SQLite results store the run is appended to (see `src.results`).
+    """
+
+    trace: Optional[str] = None
+    trace_allocations: bool = False
+    results_db: Optional[str] = None
+
+
+# An options object, a dict of its fields, or None for the defaults
+Options = Union[Mapping[str, Any], None]
+
+
+def _options(cls: type, value: Any) -> Any:
+    """``value`` as a ``cls`` options object."""
+    if value is None:
+        return cls()
+    if isinstance(value, cls):
+        return value
+    return cls(**value)
+
+
+def _make_splitter(
+    filepath,
+    distribution,
+    batch_size,
+    sample_size,
+    cache_dir,
+    chunk_size,
+    mmap,
+    seed=42,
+    native_split=False,
+    dist_args=None,
+    partition_dir=DEFAULT_PARTITION_DIR,
+):
+    """Load the (cached) preprocessed data and build the splitter for ``distribution``."""
+    # Preprocessed tensors are cached on disk (cache_dir=None disables it)
+    # chunk_size streams the CSV instead of loading it whole (out-of-core)
+    # mmap keeps the features memory-mapped and gives clients index views over them
+    print("Loading data...")
+    cache = PreprocessingCache(cache_dir) if cache_dir is not None else None
+    data_container, input_dim = get_fluke_dataset(
+        filepath=filepath,
+        batch_size=batch_size,
+        sample_size=sample_size,
+        cache=cache,
+        chunk_size=chunk_size,
+        mmap=mmap,
+    )
+
+    print(f"Splitting data ({distribution})...")
+
+    # Native partitions (src/partition.py) are vectorized, cached on disk under
+    # partition_dir (None disables it) and handed out as index views; the
+    # "natural" split by a source column (dist_args={"column": ...}) only exists there
+    if native_split or distribution == "natural":
+        partitions = PartitionCache(partition_dir) if partition_dir is not None else None
+        splitter = NativeDataSplitter(
+            data_container,
+            distribution,
+            client_split=0.2,
+            seed=seed,
+            dist_args=dist_args,
+            cache=partitions,
+        )
+        return splitter, input_dim
+
+    # Configure distribution arguments if needed (e.g. for Dirichlet), then dist_args
+    fluke_args = DDict()
+    if distribution == "dir":
+        fluke_args = DDict(beta=0.5, min_ex_class=1, balanced=False)
+    fluke_args.update(dist_args or {})
+
+    splitter_class = IndexedDataSplitter if mmap or chunk_size is not None else DataSplitter
+    splitter = splitter_class(
+        dataset=data_container,
+        distribution=distribution,
+        server_test=True,
+        keep_test=True,
+        client_split=0.2,
+        dist_args=fluke_args,
+    )
+    return splitter, input_dim
+
+
+def _with_server_features(
+    algorithm_class: type[CentralizedFL], server: ServerOptions, server_config: DDict
+) -> type[CentralizedFL]:
+    """``algorithm_class`` with the server mixins of the features enabled in
+    ``server``, their settings added to ``server_config``."""
+    # Choose each round's clients with a sampler ("power_of_choice", "importance",
+    # "clustered" or a ClientSampler; fluke's uniform draw when None)
+    if server.client_sampler is not None:
+        if issubclass(algorithm_class, FedBuff):
+            raise ValueError("FedBuff replaces the clients itself (no client_sampler)")
+        algorithm_class = with_server_mixin(algorithm_class, ClientSamplingMixin)
+        server_config.update(client_sampler=copy.deepcopy(server.client_sampler))
+
+    # FedBuff drives its own asynchronous rounds on a virtual clock; the
+    # synchronous algorithms are put on the same clock when a latency_model is set
+    buffered = issubclass(algorithm_class, FedBuff)
+    if buffered and (server.vmap_clients or server.client_workers is not None):
+        raise ValueError("FedBuff trains its clients one at a time (no client_workers/vmap)")
+    if server.latency_model is not None and not buffered:
+        algorithm_class = with_server_mixin(algorithm_class, VirtualClockMixin)
+    if server.latency_model is not None:
+        # A copy: runs given the same model draw the same latencies
+        server_config.update(latency_model=copy.deepcopy(server.latency_model))
+
+    # Train the clients of a round concurrently (0 = seeded, but in-process),
+    # or all at once with the vmap engine (falling back to client_workers)
+    if server.vmap_clients:
+        algorithm_class = parallel_rounds(algorithm_class, VmapRoundsMixin)
+    elif server.client_workers is not None:
+        algorithm_class = parallel_rounds(algorithm_class)
+    if server.vmap_clients or server.client_workers is not None:
+        server_config.update(
+            client_workers=server.client_workers or 0,
+            threads_per_worker=server.threads_per_worker,
+        )
+
+    # Evaluate the global model in a background thread, with at most
+    # async_eval snapshots in flight (0 = evaluate synchronously)
+    if server.async_eval:
+        algorithm_class = with_server_mixin(algorithm_class, AsyncEvalMixin)
+        server_config.update(eval_queue_size=server.async_eval)
+
+    # Compress the clients' updates ("topk", "qsgd", "lowrank", or a dict with
+    # "method" and its options) and count the uploaded bytes
+    if server.compression is not None:
+        compression = server.compression
+        if isinstance(compression, str):
+            compression = {"method": compression}
+        algorithm_class = with_server_mixin(algorithm_class, CompressedUpdatesMixin)
+        server_config.update(compression=DDict(compression))
+
+    # Aggregate the client models as one [clients x parameters] matrix: "fedavg"
+    # (a single matmul), or the robust "median", "trimmed_mean" or "krum" (or a
+    # dict with "method" and its options, e.g. trim_ratio or byzantine)
+    if server.aggregation is not None:
+        if buffered:
+            raise ValueError("FedBuff applies its buffered updates itself (no aggregation)")
+        aggregation = server.aggregation
+        if isinstance(aggregation, str):
+            aggregation = {"method": aggregation}
+        algorithm_class = with_server_mixin(algorithm_class, FlatAggregationMixin)
+        server_config.update(aggregation=DDict(aggregation))
+
+    return algorithm_class
 
 
 def run_experiment(
@@ -24,7 +290,38 @@ def run_experiment(
     sample_size=None,
     evaluator=None,
     eligible_perc=1.0,
+    data: Union[DataOptions, Options] = None,
+    server: Union[ServerOptions, Options] = None,
+    callbacks=None,
+    split_cache=None,
+    checkpoints: Union[CheckpointOptions, Options] = None,
+    extra_server_params=None,
+    stopping: Union[StoppingOptions, Options] = None,
+    instrumentation: Union[InstrumentationOptions, Options] = None,
+    run_name=None,
 ):
+    """Run one federated experiment and return the algorithm and its final metrics.
+
+    The optional features are grouped in options objects (e.g. `DataOptions`),
+    each of which may also be given as a dict of its fields.
+    """
+    data = _options(DataOptions, data)
+    server = _options(ServerOptions, server)
+    stopping = _options(StoppingOptions, stopping)
+    checkpoints = _options(CheckpointOptions, checkpoints)
+    instrumentation = _options(InstrumentationOptions, instrumentation)
+
+    # The arguments of the run, as recorded in the results store
+    params = dict(locals())
+    started_at = time.time()
+
+    # 0. Instrumentation: with a trace path, the spans of the run (src/tracing.py)
+    # are written there as a Chrome trace, and a per-round summary is printed
+    tracer = None
+    if instrumentation.trace is not None:
+        tracer = Tracer(allocations=instrumentation.trace_allocations)
+    set_tracer(tracer)
+
     # 1. Setup Environment
     # Re-instantiating FlukeENV singleton to update settings if needed
     env = FlukeENV()
@@ -36,28 +333,57 @@ def run_experiment(
         evaluator = ClassificationEval(eval_every=1, n_classes=2)
     env.set_evaluator(evaluator)
 
-    # 2. Prepare Data
-    print("Loading data...")
-    data_container, input_dim = get_fluke_dataset(
-        batch_size=batch_size, sample_size=sample_size
-    )
-
-    # 3. Create Data Splitter
-    print(f"Splitting data ({distribution})...")
-
-    # Configure distribution arguments if needed (e.g. for Dirichlet)
-    dist_args = None
-    if distribution == "dir":
-        dist_args = DDict(beta=0.5, min_ex_class=1, balanced=False)
+    # The settings recorded in the results store, as JSON up front: a setting that
+    # cannot be recorded fails here rather than after training
+    results_db = instrumentation.results_db
+    if results_db is not None:
+        config = dict(params)
+        # Options are recorded as their fields, e.g. cache_dir rather than data
+        for name, value in params.items():
+            if is_dataclass(value):
+                del config[name]
+                config.update(vars(value))
+        for name in ("callbacks", "split_cache", "results_db", "run_name"):
+            del config[name]
+        config["algorithm"] = params["algorithm_class"].__name__
+        config["evaluator"] = type(evaluator).__name__
+        config = _jsonable(config)
 
-    splitter = DataSplitter(
-        dataset=data_container,
-        distribution=distribution,
-        server_test=True,
-        keep_test=True,
-        client_split=0.2,
-        dist_args=dist_args or DDict(),
+    # 2-3. Prepare Data and Data Splitter
+    # With a split_cache, runs on the same data/seed/distribution reuse one split
+    split_key = (
+        data.filepath,
+        sample_size,
+        data.chunk_size,
+        data.mmap,
+        distribution,
+        seed,
+        n_clients,
+        batch_size,
+        data.native_split,
+        repr(sorted((data.dist_args or {}).items())),
     )
+    cached = split_cache.get(split_key) if split_cache is not None else None
+    if cached is not None:
+        print(f"Reusing data split ({distribution})...")
+        splitter, input_dim = cached
+    else:
+        with span("load_data"):
+            splitter, input_dim = _make_splitter(
+                data.filepath,
+                distribution,
+                batch_size,
+                sample_size,
+                data.cache_dir,
+                data.chunk_size,
+                data.mmap,
+                seed,
+                data.native_split,
+                data.dist_args,
+                data.partition_dir,
+            )
+        if split_cache is not None:
+            splitter = split_cache.recording(split_key, splitter, input_dim)
 
     # 4. Define Model
     model = BinaryClassifier(input_dim=input_dim)
@@ -75,28 +401,132 @@ def run_experiment(
     if extra_client_params:
         client_config.update(extra_client_params)
 
-    hyper_params = DDict(model=model, client=client_config, server=DDict(weighted=True))
+    server_config = DDict(weighted=True)
+
+    if extra_server_params:
+        server_config.update(extra_server_params)
+
+    buffered = issubclass(algorithm_class, FedBuff)
+    if buffered and (checkpoints.checkpoint_dir is not None or checkpoints.resume_from is not None):
+        raise ValueError("Checkpoints do not cover FedBuff's in-flight updates")
+    algorithm_class = _with_server_features(algorithm_class, server, server_config)
+
+    # Secure aggregation (SecAggFedAVG) only reveals the sum of the dense masked updates
+    secure = issubclass(algorithm_class, SecAggFedAVG)
+    if secure and (server.compression is not None or server.aggregation is not None):
+        raise ValueError("SecAggFedAVG sums masked dense updates (no compression/aggregation)")
+
+    # See the stopping policy below
+    if (
+        (stopping.target is not None and stopping.stop_at_target)
+        or stopping.patience is not None
+        or stopping.time_budget is not None
+    ):
+        algorithm_class = with_server_mixin(algorithm_class, EarlyStoppingMixin)
+
+    if tracer is not None:
+        algorithm_class = with_server_mixin(algorithm_class, TracedServerMixin)
+
+    hyper_params = DDict(model=model, client=client_config, server=server_config)
 
     # 6. Initialize Algorithm
     algo_name = algorithm_class.__name__
     print(f"Initializing {algo_name} with {n_clients} clients...")
-    algo = algorithm_class(
-        n_clients=n_clients, data_splitter=splitter, hyper_params=hyper_params
+    with span("init"):
+        algo = algorithm_class(
+            n_clients=n_clients, data_splitter=splitter, hyper_params=hyper_params
+        )
+
+    # Observers (e.g. fluke ServerObserver) attached to the server, clients and channel
+    if callbacks:
+        algo.set_callbacks(callbacks)
+    if tracer is not None:
+        algo.set_callbacks(TracingObserver(tracer))
+    recorder = None
+    if results_db is not None:
+        recorder = RunRecorder()
+        algo.server.attach(recorder)
+
+    # Stop when target_metric reaches target (or only report when it did, with
+    # stop_at_target=False), after patience rounds without a min_delta improvement,
+    # or once time_budget seconds are spent; also counts the client work
+    stopper = EarlyStopper(
+        stopping.target,
+        stopping.target_metric,
+        stop_at_target=stopping.stop_at_target,
+        patience=stopping.patience,
+        min_delta=stopping.min_delta,
+        max_seconds=stopping.time_budget,
     )
+    algo.server.attach(stopper)
+
+    # Checkpoints every checkpoint_every rounds (written in the background);
+    # resume_from (a checkpoint file or directory) continues a previous run
+    checkpoint_dir, resume_from = checkpoints.checkpoint_dir, checkpoints.resume_from
+    if (checkpoint_dir is not None or resume_from is not None) and server.client_workers:
+        raise ValueError("Checkpoints need in-process clients (client_workers=0 or None)")
+    # The stopper and recorder accumulate over the run: their state is checkpointed too
+    observers = [observer for observer in (stopper, recorder) if observer is not None]
+    checkpointer = None
+    if checkpoint_dir is not None:
+        checkpointer = Checkpointer(
+            algo,
+            checkpoint_dir,
+            checkpoints.checkpoint_every,
+            checkpoints.keep_checkpoints,
+            observers=observers,
+        )
+        algo.server.attach(checkpointer)
+
+    done_rounds = 0
+    if resume_from is not None:
+        done_rounds = restore(algo, load_checkpoint(resume_from), observers)
+        print(f"Resumed from round {done_rounds}.")
 
     # 7. Run Experiment
-    print(f"Starting training for {n_rounds} rounds...")
+    print(f"Starting training for {n_rounds - done_rounds} rounds...")
     start_time = time.perf_counter()
-    algo.run(n_rounds=n_rounds, eligible_perc=eligible_perc)
+    try:
+        with span("train"):
+            algo.run(n_rounds=n_rounds - done_rounds, eligible_perc=eligible_perc)
+    finally:
+        if checkpointer is not None:
+            checkpointer.close()
     runtime = time.perf_counter() - start_time
 
     # 8. Final Evaluation
     print("Evaluating final model...")
-    metrics = algo.server.evaluate(evaluator, algo.server.test_set)
+    with span("final_eval"):
+        metrics = algo.server.evaluate(evaluator, algo.server.test_set)
     metrics = dict(metrics)
     metrics["runtime_seconds"] = round(runtime, 2)
+    if server.compression is not None:
+        metrics["upload_bytes"] = sum(
+            sum(per_client.values()) for per_client in algo.server.upload_bytes.values()
+        )
+    if isinstance(algo.server, SecAggServer):
+        metrics["secagg_seconds"] = round(
+            sum(sum(seconds.values()) for seconds in algo.server.secagg_seconds.values()), 3
+        )
+        metrics["dropped_clients"] = sum(len(dropped) for dropped in algo.server.dropped.values())
+        metrics["failed_rounds"] = len(algo.server.failed_rounds)
+    metrics["rounds"] = algo.server.rounds
+    metrics.update(stopper.summary())
+    if buffered or server.latency_model is not None:
+        metrics["virtual_seconds"] = round(algo.server.clock, 2)
     print(f"Final Global Metrics: {metrics}")
 
+    if tracer is not None:
+        set_tracer(None)
+        tracer.export(instrumentation.trace)
+        print(f"\n{tracer.round_table()}\nTrace written to {instrumentation.trace}")
+
+    # 9. Append the run (settings, final and per-round metrics) to the results store
+    if results_db is not None:
+        with ResultsDB(results_db) as db:
+            run_id = db.add_run(config, metrics, recorder.rounds, run_name, started_at)
+        print(f"Results appended to {results_db} (run {run_id})")
+
     print(f"{algo_name} Experiment finished in {runtime:.2f}s.")
     return algo, metrics
 
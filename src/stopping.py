@@ -0,0 +1,196 @@
+"""Stopping policies and time-to-target accounting.
+
+`TargetTracker` is a `ServerObserver` recording the first round whose
+global evaluation reaches ``target`` on ``metric`` (e.g. 0.62 macro F1),
+which makes runs comparable by how fast they learn rather than only by where
+they end.
+
+`EarlyStopper` extends it into a stopping policy for `run_experiment`. It
+stops training when:
+
+* the target is reached (``stop_at_target``);
+* the metric has not improved by more than ``min_delta`` for ``patience``
+  rounds (a plateau);
+* ``max_seconds`` of wall-clock time have been spent.
+
+The decision is taken on the round boundary: the stopper raises fluke's
+`EarlyStopping` from the next ``start_round``, once the server has counted the
+finished round, so the round counter, the checkpoints and `finalize` all see a
+complete run. With asynchronous evaluation the metrics of a round arrive up
+to ``async_eval`` rounds late, and so does a target or plateau stop. The round
+the target was reached, and its wall-clock time, are still exact.
+
+fluke's `Server.fit` notifies ``early_stop`` without the round its observers
+expect; `EarlyStoppingMixin` fills it in, and `run_experiment` adds it to the
+server whenever a stopping criterion is set.
+
+It also counts the client work: ``client_updates`` (local updates run) and
+``client_samples`` (training examples processed, i.e. each selected client's
+training-set size times its local epochs). These do not depend on how the
+updates were executed (in-process, worker processes, vmap or FedBuff).
+"""
+
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from fluke.client import Client
+from fluke.server import EarlyStopping
+from fluke.utils import ServerObserver
+
+
+class TargetTracker(ServerObserver):
+    """Record the first round whose global ``metric`` reaches ``target``.
+
+    Args:
+        target: The value to reach.
+        metric: The global evaluation metric to watch.
+        higher_is_better: Whether ``metric`` must rise to ``target`` (e.g.
+            accuracy) rather than fall to it (e.g. loss).
+    """
+
+    def __init__(self, target: float, metric: str = "accuracy", higher_is_better: bool = True):
+        self.target = target
+        self.metric = metric
+        self.higher_is_better = higher_is_better
+        self.round: Optional[int] = None
+
+    def reached(self, value: float) -> bool:
+        if self.target is None:
+            return False
+        return value >= self.target if self.higher_is_better else value <= self.target
+
+    def server_evaluation(self, round: int, eval_type: str, evals: dict, **kwargs) -> None:
+        if eval_type != "global" or self.metric not in evals:
+            return
+        # Asynchronous evaluations may be delivered late, but always in round order
+        if self.round is None and self.reached(evals[self.metric]):
+            self.round = round
+
+
+class EarlyStopper(TargetTracker):
+    """Stop on a target, a plateau or a time budget (see the module docstring).
+
+    Args:
+        target: The value of ``metric`` to reach (``None``: no target).
+        metric: The global evaluation metric to watch.
+        higher_is_better: Whether ``metric`` must rise (e.g. accuracy) or fall (e.g. loss).
+        stop_at_target: Whether to stop once ``target`` is reached, or only record it.
+        patience: Rounds without improvement after which training stops (``None``: never).
+        min_delta: Smallest change of ``metric`` counted as an improvement.
+        max_seconds: Wall-clock budget of the training, in seconds (``None``: unlimited).
+    """
+
+    def __init__(
+        self,
+        target: Optional[float] = None,
+        metric: str = "accuracy",
+        higher_is_better: bool = True,
+        stop_at_target: bool = True,
+        patience: Optional[int] = None,
+        min_delta: float = 0.0,
+        max_seconds: Optional[float] = None,
+    ):
+        super().__init__(target, metric, higher_is_better)
+        self.stop_at_target = stop_at_target
+        self.patience = patience
+        self.min_delta = min_delta
+        self.max_seconds = max_seconds
+
+        self.stop_reason: Optional[str] = None
+        self.seconds: Optional[float] = None
+        self.best: Optional[float] = None
+        self.best_round: Optional[int] = None
+        self.client_updates = 0
+        self.client_samples = 0
+        self._start: Optional[float] = None
+        self._round_ends: Dict[int, float] = {}
+
+    def elapsed(self) -> float:
+        return 0.0 if self._start is None else time.perf_counter() - self._start
+
+    def _improved(self, value: float) -> bool:
+        if self.best is None:
+            return True
+        change = value - self.best if self.higher_is_better else self.best - value
+        return change > self.min_delta
+
+    def start_round(self, round: int, global_model: Any) -> None:
+        if self._start is None:
+            self._start = time.perf_counter()
+        if self.stop_reason is None and self.max_seconds is not None:
+            if self.elapsed() >= self.max_seconds:
+                self.stop_reason = "time_budget"
+        if self.stop_reason is not None:
+            raise EarlyStopping(round)
+
+    def selected_clients(self, round: int, clients: Sequence[Client]) -> None:
+        self.client_updates += len(clients)
+        self.client_samples += sum(
+            client.train_set.size * client.hyper_params.local_epochs for client in clients
+        )
+
+    def server_evaluation(self, round: int, eval_type: str, evals: dict, **kwargs) -> None:
+        if eval_type != "global" or self.metric not in evals:
+            return
+        value = evals[self.metric]
+        if self.round is None and self.reached(value):
+            self.round = round
+            # The evaluation of a round may end after the round (asynchronous evaluation)
+            self.seconds = self._round_ends.get(round, self.elapsed())
+            if self.stop_at_target and self.stop_reason is None:
+                self.stop_reason = "target"
+
+        if self._improved(value):
+            self.best, self.best_round = value, round
+        elif self.patience is not None and round - self.best_round >= self.patience:
+            self.stop_reason = self.stop_reason or "plateau"
+
+    def end_round(self, round: int) -> None:
+        self._round_ends[round] = self.elapsed()
+
+    def state_dict(self) -> Dict[str, Any]:
+        """The progress of the run so far, for checkpoints (see `src.checkpoint`)."""
+        return {
+            "round": self.round,
+            "stop_reason": self.stop_reason,
+            "seconds": self.seconds,
+            "best": self.best,
+            "best_round": self.best_round,
+            "client_updates": self.client_updates,
+            "client_samples": self.client_samples,
+            "elapsed": self.elapsed(),
+            "round_ends": dict(self._round_ends),
+        }
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        """Continue from ``state`` (see `state_dict`); the clock resumes at its elapsed time."""
+        self.round = state["round"]
+        self.stop_reason = state["stop_reason"]
+        self.seconds = state["seconds"]
+        self.best, self.best_round = state["best"], state["best_round"]
+        self.client_updates = state["client_updates"]
+        self.client_samples = state["client_samples"]
+        self._start = time.perf_counter() - state["elapsed"]
+        self._round_ends = dict(state["round_ends"])
+
+    def summary(self) -> Dict[str, Any]:
+        """The stopping metrics reported by `run_experiment`."""
+        summary = {
+            "client_updates": self.client_updates,
+            "client_samples": self.client_samples,
+        }
+        if self.target is not None:
+            summary["rounds_to_target"] = self.round
+            summary["seconds_to_target"] = None if self.seconds is None else round(self.seconds, 2)
+        if self.stop_reason is not None:
+            summary["stop_reason"] = self.stop_reason
+        return summary
+
+
+class EarlyStoppingMixin:
+    """Server mixin giving the ``early_stop`` notification its ``round`` (the last one run)."""
+
+    def notify(self, event: str, **kwargs) -> None:
+        if event == "early_stop":
+            kwargs.setdefault("round", self.rounds)
+        super().notify(event, **kwargs)
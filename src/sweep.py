@@ -0,0 +1,307 @@
+"""Hyper-parameter sweeps over `run_experiment`.
+
+A sweep expands a search space over `run_experiment` keyword arguments into
+trials, one per (configuration, seed), and runs them on the process pool of
+`src.runner`. Keys of the space may be dotted to reach into a dict or options
+argument, e.g. ``"extra_client_params.mu"`` or ``"server.client_workers"``.
+
+* ``search="grid"`` takes the cartesian product of the value lists;
+  ``search="random"`` draws ``n_trials`` configurations, each value being picked
+  from its list or drawn by calling it with a `numpy.random.Generator`
+  (e.g. ``lambda rng: 10 ** rng.uniform(-3, -1)`` for a log-uniform ``lr``).
+* Each finished trial is appended to a JSON-lines `ResultStore` as soon as it
+  completes. Trials whose key (a hash of their full parameters and seed) is
+  already in the store are skipped, so re-running an interrupted sweep resumes
+  it, and growing a grid only runs the new points.
+* The preprocessed data comes from the on-disk cache shared by all the
+  workers, and every worker keeps a `SplitCache`, so trials with the same
+  seed and distribution split the data once per process. Trials are queued
+  grouped by that split.
+* `aggregate` reduces the seed replicates of each configuration to the mean
+  and standard deviation of every metric.
+
+Example::
+
+    results = run_sweep(
+        {"lr": [0.01, 0.05], "extra_client_params.mu": [0.01, 0.1]},
+        base=dict(algorithm_class=FedProx, distribution="dir", n_rounds=10),
+        seeds=(0, 1, 2),
+        store="results/fedprox.jsonl",
+    )
+    print(format_sweep(results, metric="accuracy"))
+"""
+
+import hashlib
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, is_dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from src.feature_store import SplitCache
+from src.results import _jsonable
+from src.runner import Scenario, _init_worker, default_workers, run_scenario
+
+Space = Mapping[str, Union[Sequence[Any], Callable[[np.random.Generator], Any]]]
+
+_SPLITS: Optional[SplitCache] = None
+
+
+def _key(params: Mapping[str, Any]) -> str:
+    text = json.dumps(_jsonable(params), sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def _with_dotted(target: Any, name: str, value: Any) -> Any:
+    """A copy of ``target`` (a dict, an options dataclass or ``None``) with ``name`` set."""
+    head, _, rest = name.partition(".")
+    if is_dataclass(target):
+        if rest:
+            value = _with_dotted(getattr(target, head), rest, value)
+        return replace(target, **{head: value})
+    target = dict(target or {})
+    target[head] = _with_dotted(target.get(head), rest, value) if rest else value
+    return target
+
+
+def _set_dotted(params: Dict[str, Any], name: str, value: Any) -> None:
+    head, _, rest = name.partition(".")
+    params[head] = _with_dotted(params.get(head), rest, value) if rest else value
+
+
+def grid(space: Space) -> List[Dict[str, Any]]:
+    """Every combination of the value lists of ``space``."""
+    names = list(space)
+    for name in names:
+        if callable(space[name]):
+            raise ValueError(f"{name!r}: samplers are only supported by random search")
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_search(space: Space, n_trials: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """``n_trials`` configurations drawn from ``space`` (distinct when it is a finite grid)."""
+    rng = np.random.default_rng(seed)
+    if not any(callable(values) for values in space.values()):
+        points = grid(space)
+        picked = rng.choice(len(points), size=min(n_trials, len(points)), replace=False)
+        return [points[i] for i in picked]
+
+    configs = []
+    for _ in range(n_trials):
+        config = {}
+        for name, values in space.items():
+            config[name] = values(rng) if callable(values) else values[rng.integers(len(values))]
+        configs.append(config)
+    return configs
+
+
+@dataclass
+class Trial:
+    """One `run_experiment` call of a sweep."""
+
+    config: Dict[str, Any]
+    seed: int
+    params: Dict[str, Any]
+
+    @property
+    def key(self) -> str:
+        return _key(self.params)
+
+    @property
+    def config_key(self) -> str:
+        return _key({k: v for k, v in self.params.items() if k != "seed"})
+
+
+def make_trials(
+    configs: Sequence[Mapping[str, Any]], base: Mapping[str, Any], seeds: Sequence[int]
+) -> List[Trial]:
+    trials = []
+    for config in configs:
+        for seed in seeds:
+            params = {k: dict(v) if isinstance(v, Mapping) else v for k, v in base.items()}
+            for name, value in config.items():
+                _set_dotted(params, name, value)
+            params["seed"] = seed
+            trials.append(Trial(dict(config), seed, params))
+    return trials
+
+
+class ResultStore:
+    """Append-only JSON-lines file of finished trials, keyed by `Trial.key`.
+
+    Every record is flushed and fsynced as it is added. A truncated last line
+    (e.g. the process was killed mid-write) is ignored when loading.
+
+    Args:
+        path: The file to append to (created with its parent directories).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.records: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[record["key"]] = record
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.records
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(self.records.values())
+
+    def add(self, record: Dict[str, Any]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.records[record["key"]] = record
+
+
+def _run_trial(scenario: Scenario) -> Dict[str, Any]:
+    global _SPLITS
+    if _SPLITS is None:
+        _SPLITS = SplitCache()
+    result = run_scenario(replace(scenario, params=dict(scenario.params, split_cache=_SPLITS)))
+    return {"metrics": result.metrics, "wall_seconds": result.wall_seconds}
+
+
+def _split_group(trial: Trial) -> tuple:
+    return (trial.seed, str(trial.params.get("distribution", "iid")))
+
+
+def run_sweep(
+    space: Space,
+    base: Optional[Mapping[str, Any]] = None,
+    seeds: Sequence[int] = (42,),
+    search: str = "grid",
+    n_trials: Optional[int] = None,
+    store: Union[str, Path] = "results/sweep.jsonl",
+    evaluator: Optional[Callable[[], Any]] = None,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    search_seed: int = 0,
+) -> List[Dict[str, Any]]:
+    """Run the trials of a sweep not yet in ``store`` and aggregate all of them.
+
+    Args:
+        space: ``{run_experiment argument (dotted for nested dicts and options): values}``.
+        base: Fixed `run_experiment` arguments shared by every trial.
+        seeds: The seeds every configuration is run with.
+        search: ``"grid"`` or ``"random"``.
+        n_trials: Number of configurations drawn by random search.
+        store: Path of the JSON-lines result store.
+        evaluator: Optional zero-argument evaluator factory (see `Scenario`).
+            It is not part of the trial keys: use one store per evaluator.
+        workers: Worker processes (as in `run_scenarios`; 1 = in-process).
+        threads_per_worker: torch intra-op threads per worker.
+        search_seed: Seed of the random search.
+
+    Returns:
+        List[Dict[str, Any]]: `aggregate` of the sweep's trials, in configuration order.
+    """
+    if search == "grid":
+        configs = grid(space)
+    elif search == "random":
+        if n_trials is None:
+            raise ValueError("random search needs n_trials")
+        configs = random_search(space, n_trials, search_seed)
+    else:
+        raise ValueError(f"Unknown search {search!r} (expected 'grid' or 'random')")
+
+    results = ResultStore(store)
+    trials = make_trials(configs, base or {}, seeds)
+    todo = sorted((trial for trial in trials if trial.key not in results), key=_split_group)
+    print(f"Sweep: {len(trials)} trials, {len(trials) - len(todo)} already in {results.path}")
+
+    def record(trial: Trial, outcome: Dict[str, Any]) -> None:
+        results.add(
+            {
+                "key": trial.key,
+                "config_key": trial.config_key,
+                "config": _jsonable(trial.config),
+                "seed": trial.seed,
+                "params": _jsonable(trial.params),
+                "finished_at": time.time(),
+                **outcome,
+            }
+        )
+        print(f"[{len(results.records)}/{len(trials)}] {trial.config} seed={trial.seed}: {outcome['metrics']}")
+
+    scenarios = [Scenario(trial.key, trial.key, trial.params, evaluator) for trial in todo]
+    workers = workers or default_workers(len(todo))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    if todo and workers == 1:
+        _init_worker(threads)
+        for trial, scenario in zip(todo, scenarios):
+            record(trial, _run_trial(scenario))
+    elif todo:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(threads,),
+        ) as pool:
+            futures = {
+                pool.submit(_run_trial, scenario): trial
+                for trial, scenario in zip(todo, scenarios)
+            }
+            for future in as_completed(futures):
+                record(futures[future], future.result())
+
+    return aggregate(results.records[trial.key] for trial in trials if trial.key in results)
+
+
+def aggregate(records) -> List[Dict[str, Any]]:
+    """Mean and standard deviation over seeds of every numeric metric, per configuration.
+
+    Returns:
+        List[Dict[str, Any]]: One ``{"config", "seeds", "mean", "std"}`` entry per
+        configuration, in order of first appearance.
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault(record["config_key"], []).append(record)
+
+    summary = []
+    for replicates in groups.values():
+        names = [
+            name
+            for name, value in replicates[0]["metrics"].items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        values = {
+            name: np.array([r["metrics"][name] for r in replicates if name in r["metrics"]])
+            for name in names
+        }
+        summary.append(
+            {
+                "config": replicates[0]["config"],
+                "seeds": sorted(r["seed"] for r in replicates),
+                "mean": {name: float(v.mean()) for name, v in values.items()},
+                "std": {name: float(v.std(ddof=1)) if len(v) > 1 else 0.0 for name, v in values.items()},
+            }
+        )
+    return summary
+
+
+def format_sweep(summary: List[Dict[str, Any]], metric: str = "accuracy") -> str:
+    """One line per configuration, best mean ``metric`` first."""
+    rows = sorted(summary, key=lambda s: s["mean"].get(metric, float("-inf")), reverse=True)
+    lines = [f"{metric + ' (mean ± std)':>24}  {'seeds':>5}  config", "-" * 60]
+    for s in rows:
+        mean, std = s["mean"].get(metric, float("nan")), s["std"].get(metric, float("nan"))
+        lines.append(f"{mean:>15.5f} ± {std:<7.5f} {len(s['seeds']):>5}  {s['config']}")
+    return "\n".join(lines)
@@ -0,0 +1,456 @@
+"""Synthetic Diabetes-130 rows for scale testing.
+
+`fit` learns, from a real ``diabetic_data.csv``, the marginal distribution of
+every column and the pairwise joint distributions of the columns the loader
+of `src/dataset.py` turns into features (``MEDICATION_COLUMNS``,
+``CATEGORICAL_COLUMNS``, ``SCALER_COLUMNS``, ``gender``, ``age`` and the
+``readmitted`` target). From the pairwise counts it keeps a Chow-Liu tree
+[Chow and Liu, 1968]: the spanning tree of maximum mutual information,
+without the edges between columns a G-test finds independent (so a forest,
+rooted at ``readmitted`` where it can be). Every feature column is then
+sampled given its parent (or from its marginal), so the strongest pairwise
+dependencies (e.g. ``insulin`` and ``change``, or the target and
+``number_inpatient``) are reproduced. The columns the loader drops
+(``DROP_COLUMNS``) are sampled from their marginals, ``encounter_id`` is the
+row number and ``patient_nbr`` is drawn uniformly.
+
+Values are kept as the raw CSV text (``"?"``, ``"None"``, ``"[70-80)"``,
+``">30"``...), so the synthetic file goes through `load_and_preprocess_data`
+like the real one (``chunk_size`` included). The model (`SyntheticModel`)
+only holds value counts, is saved as a ``.npz`` file and can be copied to
+machines that must not hold the real data.
+
+`generate` streams ``n_rows`` rows to a CSV file (gzip-compressed when the
+path ends in ``.gz``, which pandas reads transparently) in chunks of
+``chunk_rows`` rows. The chunks are sampled and formatted by a pool of
+``workers`` processes and written in order, with at most two chunks per
+worker in flight, so memory does not depend on ``n_rows`` (about 1.5 KiB per
+row of a chunk in each process). Chunk ``i`` is drawn from a generator seeded
+by ``(seed, i)``: the output only depends on the seed and the chunk size, not
+on the number of workers. From the command line::
+
+    uv run -m src.synthetic fit diabetic_data.csv -o diabetes_model.npz
+    uv run -m src.synthetic generate diabetes_model.npz synthetic.csv.gz --rows 10000000
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing as mp
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ID_COLUMNS = ["encounter_id", "patient_nbr"]
+TARGET_COLUMN = "readmitted"
+# Columns the loader needs (the other feature columns are optional)
+REQUIRED_COLUMNS = ["race", "gender", "age", TARGET_COLUMN]
+# The number of digits of an ID is 1 + the number of powers of ten up to it
+_POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.int64)
+
+
+@dataclass
+class SyntheticModel:
+    """Value counts learned by `fit`.
+
+    Args:
+        columns: The CSV header, in order.
+        vocabularies: The raw values of each non-ID column.
+        parents: The parent of each non-ID column in the Chow-Liu forest
+            (``None`` for the roots and the marginal-only columns).
+        counts: Per non-ID column, its value counts, or its ``[parent x column]``
+            joint counts when it has a parent.
+        n_rows: The number of rows the counts come from.
+    """
+
+    columns: List[str]
+    vocabularies: Dict[str, List[str]]
+    parents: Dict[str, Optional[str]]
+    counts: Dict[str, np.ndarray]
+    n_rows: int
+
+    @property
+    def order(self) -> List[str]:
+        """The sampled columns, every parent before its children."""
+        order, done = [], set()
+        pending = list(self.vocabularies)
+        while pending:
+            column = pending.pop(0)
+            parent = self.parents[column]
+            if parent is None or parent in done:
+                order.append(column)
+                done.add(column)
+            else:
+                pending.append(column)
+        return order
+
+    @cached_property
+    def _cdfs(self) -> Dict[str, np.ndarray]:
+        # Inverse-CDF tables; a conditional table has row p shifted by p, so one
+        # searchsorted over the flattened table samples every row given its parent
+        cdfs = {}
+        for column, counts in self.counts.items():
+            counts = np.atleast_2d(counts).astype(np.float64)
+            cdf = np.cumsum(counts, axis=1) / counts.sum(axis=1, keepdims=True)
+            cdf[:, -1] = 1.0
+            cdfs[column] = (cdf + np.arange(len(cdf))[:, None]).ravel()
+        return cdfs
+
+    def sample(self, n_rows: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+        """The vocabulary codes of ``n_rows`` sampled rows, per non-ID column."""
+        codes = {}
+        for column in self.order:
+            size = len(self.vocabularies[column])
+            parent = self.parents[column]
+            offset = codes[parent] if parent is not None else np.zeros(n_rows, dtype=np.int64)
+            flat = np.searchsorted(self._cdfs[column], offset + rng.random(n_rows), side="right")
+            codes[column] = np.minimum(flat - offset * size, size - 1)
+        return codes
+
+    def save(self, path: str) -> None:
+        meta = {
+            "columns": self.columns,
+            "vocabularies": self.vocabularies,
+            "parents": self.parents,
+            "n_rows": self.n_rows,
+        }
+        arrays = {f"counts_{i}": self.counts[column] for i, column in enumerate(self.vocabularies)}
+        with open(path, "wb") as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "SyntheticModel":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            counts = {
+                column: data[f"counts_{i}"] for i, column in enumerate(meta["vocabularies"])
+            }
+        return cls(counts=counts, **meta)
+
+
+def _read_chunks(path: Path, columns: List[str], chunk_size: int):
+    import pandas as pd
+
+    # Raw text: "?", "None" and empty cells are values like any other
+    return pd.read_csv(
+        path, usecols=columns, dtype=str, keep_default_na=False, chunksize=chunk_size
+    )
+
+
+def _mutual_information(joint: np.ndarray, alpha: float) -> float:
+    """Plug-in mutual information minus its Miller-Madow bias, 0 unless significant.
+
+    The pair is only dependent if a G-test (``2 n MI`` is chi-squared under
+    independence) rejects independence at level ``alpha``. Without it,
+    columns with many values (``num_lab_procedures``) win edges on noise alone.
+    """
+    from scipy.stats import chi2
+
+    n = joint.sum()
+    p = joint / n
+    rows, cols = p.sum(axis=1, keepdims=True), p.sum(axis=0, keepdims=True)
+    nonzero = p > 0
+    information = float((p[nonzero] * np.log(p[nonzero] / (rows * cols)[nonzero])).sum())
+    dof = (np.count_nonzero(rows) - 1) * (np.count_nonzero(cols) - 1)
+    if dof == 0 or chi2.sf(2 * n * information, dof) >= alpha:
+        return 0.0
+    return information - dof / (2 * n)
+
+
+def _chow_liu(
+    columns: List[str], joints: Dict[tuple, np.ndarray], root: str, alpha: float
+) -> dict:
+    """Parent of each column in the maximum mutual-information spanning forest.
+
+    The forest (Kruskal) only has edges of significant information; each of
+    its trees is rooted at ``root`` or at its first column.
+    """
+    weights = {pair: _mutual_information(joint, alpha) for pair, joint in joints.items()}
+    component = list(range(len(columns)))
+    neighbours = [[] for _ in columns]
+
+    def find(i):
+        while component[i] != i:
+            i = component[i]
+        return i
+
+    for (i, j), weight in sorted(weights.items(), key=lambda item: -item[1]):
+        if weight <= 0:
+            break
+        if find(i) != find(j):
+            component[find(i)] = find(j)
+            neighbours[i].append(j)
+            neighbours[j].append(i)
+
+    parents = dict.fromkeys(columns)
+    visited = set()
+    for start in [columns.index(root), *range(len(columns))]:
+        if start in visited:
+            continue
+        visited.add(start)
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            for j in neighbours[i]:
+                if j not in visited:
+                    visited.add(j)
+                    parents[columns[j]] = columns[i]
+                    queue.append(j)
+    return parents
+
+
+def fit(
+    filepath: Optional[str] = None, chunk_size: int = 100_000, alpha: float = 1e-6
+) -> SyntheticModel:
+    """Learn the marginal and forest-structured pairwise counts of a Diabetes-130 CSV.
+
+    The CSV is read twice in chunks of ``chunk_size`` rows: a first pass
+    collects the vocabulary of every column, a second one the joint counts of
+    every pair of feature columns. Pairs whose dependence is not significant at
+    level ``alpha`` (about 1e-3 over the ~900 pairs) are not linked. Defaults to
+    ``DIABETES_FILE``.
+    """
+    # Imported here: the generator's workers only need numpy (src.dataset imports torch)
+    import pandas as pd
+
+    from src.dataset import (
+        CATEGORICAL_COLUMNS,
+        DIABETES_FILE,
+        DROP_COLUMNS,
+        MEDICATION_COLUMNS,
+        SCALER_COLUMNS,
+        _resolve_filepath,
+    )
+
+    path = _resolve_filepath(filepath or DIABETES_FILE)
+    header = list(pd.read_csv(path, nrows=0).columns)
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"Columns {missing} are required to fit the generator.")
+    sampled = [column for column in header if column not in ID_COLUMNS]
+    features = [column for column in sampled if column not in DROP_COLUMNS]
+    schema = {"gender", "age", TARGET_COLUMN, *MEDICATION_COLUMNS, *CATEGORICAL_COLUMNS}
+    schema.update(SCALER_COLUMNS)
+    unknown = [column for column in features if column not in schema]
+    if unknown:
+        raise ValueError(f"Columns {unknown} are not part of the schema in src/dataset.py.")
+
+    # Pass 1: vocabularies
+    seen = {column: set() for column in sampled}
+    for chunk in _read_chunks(path, sampled, chunk_size):
+        for column in sampled:
+            seen[column].update(chunk[column].unique())
+    vocabularies = {column: sorted(values) for column, values in seen.items()}
+
+    # Pass 2: marginal and pairwise counts
+    sizes = [len(vocabularies[column]) for column in features]
+    marginals = {column: np.zeros(len(vocabularies[column]), np.int64) for column in sampled}
+    joints = {
+        (i, j): np.zeros((sizes[i], sizes[j]), np.int64)
+        for i in range(len(features))
+        for j in range(i + 1, len(features))
+    }
+    n_rows = 0
+    for chunk in _read_chunks(path, sampled, chunk_size):
+        n_rows += len(chunk)
+        codes = {
+            column: pd.Categorical(chunk[column], vocabularies[column]).codes.astype(np.int64)
+            for column in sampled
+        }
+        for column in sampled:
+            marginals[column] += np.bincount(codes[column], minlength=len(marginals[column]))
+        for (i, j), joint in joints.items():
+            pairs = codes[features[i]] * sizes[j] + codes[features[j]]
+            joint += np.bincount(pairs, minlength=joint.size).reshape(joint.shape)
+
+    parents = dict.fromkeys(sampled)
+    parents.update(_chow_liu(features, joints, TARGET_COLUMN, alpha))
+    counts = dict(marginals)
+    for (i, j), joint in joints.items():
+        if parents[features[j]] == features[i]:
+            counts[features[j]] = joint
+        elif parents[features[i]] == features[j]:
+            counts[features[i]] = joint.T.copy()
+    return SyntheticModel(header, vocabularies, parents, counts, n_rows)
+
+
+def _csv_cell(value: str) -> str:
+    if any(char in value for char in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+class _CsvWriter:
+    """Formats sampled rows as CSV bytes with a single gather, without pandas.
+
+    Every cell is a slice of a byte buffer: the vocabulary values of the model
+    (each followed by its separator) or the block's IDs. The slices are copied
+    into the output with one fancy index per block of ``block_rows`` rows.
+    """
+
+    def __init__(self, model: SyntheticModel, block_rows: int = 1 << 14):
+        self.model = model
+        self.block_rows = block_rows
+        self.ends = {
+            column: "\n" if i == len(model.columns) - 1 else ","
+            for i, column in enumerate(model.columns)
+        }
+        cells, self.cells = [], {}
+        offset = 0
+        for column, values in model.vocabularies.items():
+            encoded = [(_csv_cell(value) + self.ends[column]).encode() for value in values]
+            lengths = np.array([len(cell) for cell in encoded], dtype=np.int64)
+            self.cells[column] = (offset + np.cumsum(lengths) - lengths, lengths)
+            cells += encoded
+            offset += int(lengths.sum())
+        self.table = b"".join(cells)
+
+    def format(self, codes: Dict[str, np.ndarray], ids: Dict[str, np.ndarray]) -> bytes:
+        """The CSV rows of the vocabulary ``codes`` and the integer ``ids`` columns."""
+        n_rows = len(next(iter(codes.values())))
+        out = []
+        for first in range(0, n_rows, self.block_rows):
+            rows = slice(first, first + self.block_rows)
+            block_codes = {column: values[rows] for column, values in codes.items()}
+            out.append(self._format_block(block_codes, {c: v[rows] for c, v in ids.items()}))
+        return b"".join(out)
+
+    def _format_block(self, codes: Dict[str, np.ndarray], ids: Dict[str, np.ndarray]) -> bytes:
+        buffers, offset = [self.table], len(self.table)
+        starts, lengths = [], []
+        for column in self.model.columns:
+            if column in ids:
+                end = self.ends[column]
+                text = "".join(f"{value}{end}" for value in ids[column].tolist()).encode()
+                length = np.searchsorted(_POWERS_OF_TEN, ids[column], side="right") + 2
+                starts.append(offset + np.cumsum(length) - length)
+                lengths.append(length)
+                buffers.append(text)
+                offset += len(text)
+            else:
+                cell_starts, cell_lengths = self.cells[column]
+                starts.append(cell_starts[codes[column]])
+                lengths.append(cell_lengths[codes[column]])
+        source = np.frombuffer(b"".join(buffers), dtype=np.uint8)
+        lengths = np.stack(lengths, axis=1).ravel()
+        # Output byte k of a cell copies source byte start + k
+        shift = np.stack(starts, axis=1).ravel() - np.cumsum(lengths) + lengths
+        index = np.repeat(shift, lengths)
+        index += np.arange(len(index))
+        return source[index].tobytes()
+
+
+# The formatter of the generator's worker processes (set by _init_worker)
+_worker_writer: Optional[_CsvWriter] = None
+
+
+def _init_worker(model: SyntheticModel) -> None:
+    global _worker_writer
+    _worker_writer = _CsvWriter(model)
+
+
+def _generate_chunk(
+    index: int, start: int, n_rows: int, n_total: int, seed: int, compresslevel: Optional[int]
+) -> bytes:
+    rng = np.random.default_rng([seed, index])
+    codes = _worker_writer.model.sample(n_rows, rng)
+    ids = {
+        "encounter_id": np.arange(start + 1, start + n_rows + 1),
+        "patient_nbr": rng.integers(1, n_total + 1, size=n_rows),
+    }
+    text = _worker_writer.format(codes, ids)
+    # Concatenated gzip members form a valid gzip file (mtime=0: reproducible bytes)
+    if compresslevel is None:
+        return text
+    return gzip.compress(text, compresslevel, mtime=0)
+
+
+def generate(
+    model: SyntheticModel,
+    path: str,
+    n_rows: int,
+    chunk_rows: int = 100_000,
+    workers: Optional[int] = None,
+    seed: int = 0,
+    compresslevel: int = 1,
+) -> int:
+    """Write ``n_rows`` synthetic rows to the CSV ``path`` and return its size in bytes.
+
+    Args:
+        model: The counts to sample from (see `fit`).
+        path: The output CSV, gzip-compressed when it ends in ``.gz``.
+        n_rows: The number of rows.
+        chunk_rows: Rows sampled, formatted and written at once.
+        workers: Worker processes. Defaults to the number of CPUs; ``workers=1``
+            generates in the current process.
+        seed: The seed of the sampling.
+        compresslevel: The gzip level of a ``.gz`` output.
+    """
+    workers = workers or os.cpu_count() or 1
+    level = compresslevel if str(path).endswith(".gz") else None
+    header = (",".join(model.columns) + "\n").encode()
+    chunks = [
+        (index, start, min(chunk_rows, n_rows - start), n_rows, seed, level)
+        for index, start in enumerate(range(0, n_rows, chunk_rows))
+    ]
+
+    with open(path, "wb") as f:
+        f.write(gzip.compress(header, level, mtime=0) if level is not None else header)
+        if workers == 1:
+            _init_worker(model)
+            for chunk in chunks:
+                f.write(_generate_chunk(*chunk))
+            return f.tell()
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model,),
+        ) as pool:
+            # A bounded window of chunks in flight, written in order
+            pending = deque()
+            for chunk in chunks:
+                if len(pending) == 2 * workers:
+                    f.write(pending.popleft().result())
+                pending.append(pool.submit(_generate_chunk, *chunk))
+            while pending:
+                f.write(pending.popleft().result())
+        return f.tell()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fit and run the synthetic Diabetes-130 generator.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fit_parser = commands.add_parser("fit", help="Learn the counts of a real CSV")
+    fit_parser.add_argument("data", nargs="?", default=None, help="Default: diabetic_data.csv")
+    fit_parser.add_argument("-o", "--output", default="diabetes_model.npz")
+    generate_parser = commands.add_parser("generate", help="Write synthetic rows")
+    generate_parser.add_argument("model")
+    generate_parser.add_argument("output", help="CSV path (.csv.gz for gzip)")
+    generate_parser.add_argument("--rows", type=int, default=1_000_000)
+    generate_parser.add_argument("--chunk-rows", type=int, default=100_000)
+    generate_parser.add_argument("--workers", type=int, default=None)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "fit":
+        model = fit(args.data)
+        model.save(args.output)
+        print(f"Fitted on {model.n_rows} rows, saved to {args.output}")
+    else:
+        model = SyntheticModel.load(args.model)
+        size = generate(
+            model, args.output, args.rows, args.chunk_rows, args.workers, args.seed
+        )
+        print(f"Wrote {args.rows} rows ({size / 2**20:.1f} MiB) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
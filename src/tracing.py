@@ -0,0 +1,305 @@
+"""Instrumentation: timed spans, memory counters and a Chrome trace export.
+
+Code marks its hot paths with ``with span("name"):``. While no `Tracer` is
+installed, `span` returns one shared no-op context manager, so an
+instrumented loop pays a global lookup and a ``None`` check per span, which is
+why the spans can stay in the code for production runs. Installing a tracer
+(``run_experiment(instrumentation=InstrumentationOptions(trace=...))``)
+records every span as a Chrome trace "complete" event, viewable in
+``chrome://tracing`` or https://ui.perfetto.dev.
+
+The spans of a run are:
+
+* ``load_data``, ``init``, ``train`` and ``final_eval`` in `run_experiment`;
+* ``round``, and within it ``select``, ``broadcast``, ``train_clients`` (with
+  `ParallelRoundsMixin`), ``receive`` (one per client model), ``aggregate`` and
+  ``evaluate`` from `TracedServerMixin`;
+* ``client.fit`` for every local update (from the clients' ``start_fit`` and
+  ``end_fit`` notifications), and inside `FairClient.fit` its ``forward``,
+  ``backward`` and ``step`` per batch.
+
+Clients trained in worker processes (``client_workers`` > 0) or by the vmap
+engine do not notify, so their rounds only show the server-side spans.
+
+At the end of each round the tracer also samples the process RSS and peak RSS
+(``VmRSS``/``VmHWM``) as counter events. With ``allocations=True`` it counts the
+tensors allocated during each local update (and their bytes) with a torch
+dispatch mode. This costs a Python call per tensor operation, so it is off by
+default.
+
+`Tracer.round_table` sums the spans per round into the per-round summary
+printed by `run_experiment`.
+"""
+
+import contextlib
+import json
+import os
+import resource
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import torch
+from fluke.client import Client
+from fluke.utils import ClientObserver, ServerObserver
+from torch.utils._python_dispatch import TorchDispatchMode
+from torch.utils._pytree import tree_flatten
+
+
+_TRACER: Optional["Tracer"] = None
+_NULL_SPAN = contextlib.nullcontext()
+
+# Columns of `Tracer.round_table` (span name: header)
+ROUND_COLUMNS = {
+    "round": "round s",
+    "select": "select",
+    "broadcast": "bcast",
+    "train_clients": "train",
+    "client.fit": "fit",
+    "forward": "fwd",
+    "backward": "bwd",
+    "step": "step",
+    "receive": "recv",
+    "aggregate": "aggr",
+    "evaluate": "eval",
+}
+
+
+def _now_us() -> float:
+    return time.perf_counter_ns() / 1000
+
+
+def memory_mib() -> Dict[str, float]:
+    """Current (``rss``) and peak (``peak_rss``) resident memory of the process, in MiB."""
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == "VmRSS":
+                    fields["rss"] = int(value.split()[0]) / 1024
+                elif name == "VmHWM":
+                    fields["peak_rss"] = int(value.split()[0]) / 1024
+    except OSError:
+        # Not Linux: only the peak is available (kB on Linux, bytes on macOS)
+        fields["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return fields
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.tracer.complete(self.name, self.start, _now_us() - self.start, self.args)
+
+
+class _AllocationCounter(TorchDispatchMode):
+    """Counts the tensors returned by torch operations that do not alias an input."""
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.bytes = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        out = func(*args, **(kwargs or {}))
+        inputs = {
+            t.untyped_storage().data_ptr()
+            for t in tree_flatten((args, kwargs))[0]
+            if isinstance(t, torch.Tensor)
+        }
+        for t in tree_flatten(out)[0]:
+            if isinstance(t, torch.Tensor) and t.untyped_storage().data_ptr() not in inputs:
+                self.count += 1
+                self.bytes += t.untyped_storage().nbytes()
+        return out
+
+
+class Tracer:
+    """Collects spans and counters as Chrome trace events.
+
+    Args:
+        allocations: Whether to count the tensor allocations of the local updates.
+    """
+
+    def __init__(self, allocations: bool = False):
+        self.allocations = allocations
+        self.events: List[Dict[str, Any]] = []
+        self.round: Optional[int] = None
+        self.rounds: Dict[int, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._pid = os.getpid()
+
+    def span(self, name: str, **args) -> _Span:
+        return _Span(self, name, args)
+
+    def complete(self, name: str, start_us: float, duration_us: float, args: Dict[str, Any]) -> None:
+        """Record a finished span (times in microseconds)."""
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start_us,
+            "dur": duration_us,
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+        if self.round is not None:
+            self.rounds[self.round][name] += duration_us / 1e6
+
+    def counter(self, name: str, values: Dict[str, float]) -> None:
+        self.events.append(
+            {"name": name, "ph": "C", "ts": _now_us(), "pid": self._pid, "args": values}
+        )
+        if self.round is not None:
+            self.rounds[self.round].update(values)
+
+    def export(self, path: Union[str, Path]) -> None:
+        """Write the Chrome trace (JSON object format)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def round_table(self) -> str:
+        """Seconds per span kind, memory and allocations of every round."""
+        extra = {"rss": "RSS MiB", "peak_rss": "peak MiB", "allocations": "allocs"}
+        extra = {
+            name: title
+            for name, title in extra.items()
+            if any(name in totals for totals in self.rounds.values())
+        }
+        header = f"{'round':>5}" + "".join(f"{h:>9}" for h in ROUND_COLUMNS.values())
+        header += "".join(f"{title:>10}" for title in extra.values())
+        lines = [header, "-" * len(header)]
+        for round in sorted(self.rounds):
+            totals = self.rounds[round]
+            line = f"{round:>5}" + "".join(
+                f"{totals.get(name, 0.0):>9.3f}" for name in ROUND_COLUMNS
+            )
+            line += "".join(f"{totals.get(name, 0):>10.0f}" for name in extra)
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def span(name: str, **args):
+    """A span recorded by the installed `Tracer`, or a no-op when tracing is off."""
+    if _TRACER is None:
+        return _NULL_SPAN
+    return _TRACER.span(name, **args)
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _TRACER
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """Install ``tracer`` (``None`` turns tracing off); returns the previous one."""
+    global _TRACER
+    previous, _TRACER = _TRACER, tracer
+    return previous
+
+
+@contextlib.contextmanager
+def tracing(tracer: Optional[Tracer]):
+    """Install ``tracer`` for the duration of the block."""
+    previous = set_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        set_tracer(previous)
+
+
+class TracingObserver(ServerObserver, ClientObserver):
+    """Round boundaries, memory counters and ``client.fit`` spans for a `Tracer`."""
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._round_start: Optional[float] = None
+        self._fit_start: Dict[int, float] = {}
+        self._counters: Dict[int, _AllocationCounter] = {}
+
+    def start_round(self, round: int, global_model: Any) -> None:
+        self.tracer.round = round
+        self._round_start = _now_us()
+
+    def end_round(self, round: int) -> None:
+        self.tracer.complete("round", self._round_start, _now_us() - self._round_start, {"round": round})
+        self.tracer.counter("memory", memory_mib())
+        # Spans after the last round (e.g. the final evaluation) belong to no round
+        self.tracer.round = None
+
+    def start_fit(self, round: int, client_id: int, model: Any, **kwargs) -> None:
+        if self.tracer.allocations:
+            counter = self._counters[client_id] = _AllocationCounter()
+            counter.__enter__()
+        self._fit_start[client_id] = _now_us()
+
+    def end_fit(self, round: int, client_id: int, model: Any, loss: float, **kwargs) -> None:
+        start = self._fit_start.pop(client_id)
+        args = {"client": client_id, "loss": loss}
+        counter = self._counters.pop(client_id, None)
+        if counter is not None:
+            counter.__exit__(None, None, None)
+            args.update(allocations=counter.count, allocated_bytes=counter.bytes)
+            self.tracer.rounds[round]["allocations"] += counter.count
+        self.tracer.complete("client.fit", start, _now_us() - start, args)
+
+
+class TracedServerMixin:
+    """Server mixin wrapping the steps of a round in spans."""
+
+    def get_eligible_clients(self, eligible_perc: float) -> Iterable[Client]:
+        with span("select"):
+            return super().get_eligible_clients(eligible_perc)
+
+    def broadcast_model(self, eligible: Iterable[Client]) -> None:
+        with span("broadcast"):
+            super().broadcast_model(eligible)
+
+    def _train_clients(self, round: int, eligible: Iterable[Client]) -> None:
+        # Only reached under `ParallelRoundsMixin` (e.g. the worker processes' round trip)
+        with span("train_clients"):
+            super()._train_clients(round, eligible)
+
+    def receive_client_models(self, eligible: Iterable[Client], state_dict: bool = True) -> Iterable:
+        models = iter(super().receive_client_models(eligible, state_dict=state_dict))
+        while True:
+            start = _now_us()
+            model = next(models, None)
+            if model is None:
+                return
+            tracer = get_tracer()
+            if tracer is not None:
+                duration = _now_us() - start
+                tracer.complete("receive", start, duration, {})
+                self._received_us = getattr(self, "_received_us", 0.0) + duration
+            yield model
+
+    def aggregate(self, eligible: Iterable[Client], client_models: Iterable) -> None:
+        self._received_us = 0.0
+        start = _now_us()
+        super().aggregate(eligible, client_models)
+        tracer = get_tracer()
+        if tracer is not None:
+            tracer.complete("aggregate", start, _now_us() - start, {})
+            # The client models are received (and timed) lazily, while aggregating:
+            # the round table counts that time under "receive" only
+            if tracer.round is not None:
+                tracer.rounds[tracer.round]["aggregate"] -= self._received_us / 1e6
+
+    def _compute_evaluation(self, round: int, eligible: Iterable[Client]) -> None:
+        with span("evaluate"):
+            super()._compute_evaluation(round, eligible)
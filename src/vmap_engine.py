@@ -0,0 +1,201 @@
+"""Vectorized multi-client training with ``torch.func`` (vmap over clients).
+
+`BinaryClassifier` is a tiny MLP, so a client's local update is dominated by
+Python and kernel-launch overhead rather than FLOPs. `train_clients_vmap`
+trains all the selected clients of a round together: their parameters are
+stacked along a leading client dimension and every optimisation step is one
+``vmap(grad(functional_call(...)))`` over clients.
+
+Each client's mini-batches are the ones its own loader yields (seeded with
+`src.parallel.client_seed`, like the other round executors), padded to the
+largest batch with a per-sample mask and to the largest number of steps with a
+per-client "active" flag, so clients with fewer batches simply stop updating.
+Every client keeps its own SGD momentum buffers across rounds, as fluke's
+persistent client optimizers do.
+
+Dropout is where the two paths part. The per-client loop draws each client's
+masks from its own seeded stream, interleaved with its loader's shuffles; the
+vmap engine draws the masks of all the clients (``randomness="different"``)
+from one stream seeded by the experiment seed, the round and the selected
+clients, and draws each client's shuffles up front. With dropout the result is
+therefore a different (equally valid) random draw than the per-client loop's;
+without dropout (``p=0`` or an eval-mode model) the parameters match it up to
+float rounding. Either way the caller's global RNG state is left untouched.
+
+Supported local updates are those of the base `fluke.client.Client` (FedAVG)
+with a plain ``SGD`` optimizer (lr, momentum, weight decay), a no-op scheduler,
+``CrossEntropyLoss`` and optional gradient-norm clipping. `VmapRoundsMixin`
+falls back to the seeded per-client loop for anything else (e.g. FedProx's
+proximal term or the FairClient regulariser).
+"""
+
+import copy
+from typing import Dict, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from fluke import FlukeENV
+from fluke.client import Client
+from torch.func import functional_call, grad, vmap
+from torch.optim.lr_scheduler import StepLR
+
+from src.parallel import ParallelRoundsMixin, client_seed
+
+
+_SGD_OPTIONS = {"lr", "momentum", "weight_decay", "dampening", "nesterov"}
+
+
+def supports_vmap(client: Client) -> bool:
+    """Whether ``client``'s local update can be reproduced by `train_clients_vmap`."""
+    cfg = client._optimizer_cfg
+    loss_fn = client.hyper_params.loss_fn
+    return (
+        type(client).fit is Client.fit
+        and cfg.optimizer is torch.optim.SGD
+        and set(cfg.optimizer_cfg) <= _SGD_OPTIONS
+        and not cfg.optimizer_cfg.get("nesterov", False)
+        and cfg.optimizer_cfg.get("dampening", 0) == 0
+        and cfg.scheduler is StepLR
+        and cfg.scheduler_cfg.get("gamma", 0.1) == 1
+        and type(loss_fn) is torch.nn.CrossEntropyLoss
+        and loss_fn.weight is None
+        and loss_fn.reduction == "mean"
+        and loss_fn.label_smoothing == 0
+    )
+
+
+def _client_batches(client: Client, round: int, seed: int) -> list:
+    """The batches ``client`` would see in its local update, drawn under its seed."""
+    epochs = client.hyper_params.local_epochs
+    with torch.random.fork_rng(devices=[]):
+        torch.default_generator.manual_seed(client_seed(seed, round, client.index))
+        return [batch for _ in range(epochs) for batch in client.train_set]
+
+
+def _pad_batches(batches: list, n_steps: int, batch_size: int, feature_shape: torch.Size):
+    X = torch.zeros(n_steps, batch_size, *feature_shape)
+    y = torch.zeros(n_steps, batch_size, dtype=torch.long)
+    mask = torch.zeros(n_steps, batch_size)
+    for step, (Xb, yb) in enumerate(batches):
+        n = Xb.shape[0]
+        X[step, :n] = Xb
+        y[step, :n] = yb
+        mask[step, :n] = 1.0
+    return X, y, mask
+
+
+def train_clients_vmap(
+    model: torch.nn.Module,
+    clients: Sequence[Client],
+    round: int,
+    seed: int,
+    momentum_buffers: Dict[int, Dict[str, torch.Tensor]],
+) -> Dict[int, dict]:
+    """Run the local updates of ``clients`` from ``model`` in one batched loop.
+
+    Args:
+        model: The global model every client starts from.
+        clients: The clients to train (see `supports_vmap`).
+        round: The current round, used to seed each client's batches.
+        seed: The experiment seed.
+        momentum_buffers: ``{client index: {param name: buffer}}``, updated in place.
+
+    Returns:
+        Dict[int, dict]: The state dict of every client after its local update.
+    """
+    model = copy.deepcopy(model).cpu()
+    model.train()
+    params = {name: p.detach() for name, p in model.named_parameters()}
+    buffers = {name: b.detach() for name, b in model.named_buffers()}
+    n_clients = len(clients)
+
+    batches = [_client_batches(client, round, seed) for client in clients]
+    n_steps = max(len(b) for b in batches)
+    batch_size = max((Xb.shape[0] for b in batches for Xb, _ in b), default=1)
+    feature_shape = next(Xb.shape[1:] for b in batches for Xb, _ in b)
+    padded = [_pad_batches(b, n_steps, batch_size, feature_shape) for b in batches]
+    X = torch.stack([p[0] for p in padded])  # [C, S, B, F]
+    y = torch.stack([p[1] for p in padded])
+    mask = torch.stack([p[2] for p in padded])
+    active = torch.tensor(
+        [[step < len(b) for step in range(n_steps)] for b in batches], dtype=torch.bool
+    )  # [C, S]
+
+    opt = [client._optimizer_cfg.optimizer_cfg for client in clients]
+    lr = torch.tensor([float(o["lr"]) for o in opt])
+    momentum = torch.tensor([float(o.get("momentum", 0.0)) for o in opt])
+    weight_decay = torch.tensor([float(o.get("weight_decay", 0.0)) for o in opt])
+    clipping = torch.tensor([float(c.hyper_params.clipping) for c in clients])
+
+    stacked = {name: p.expand(n_clients, *p.shape).clone() for name, p in params.items()}
+    momenta = {
+        name: torch.stack(
+            [momentum_buffers.get(c.index, {}).get(name, torch.zeros_like(p)) for c in clients]
+        )
+        for name, p in params.items()
+    }
+
+    def loss(p, Xb, yb, mb):
+        out = functional_call(model, (p, buffers), (Xb,))
+        losses = F.cross_entropy(out, yb, reduction="none")
+        return (losses * mb).sum() / mb.sum().clamp_min(1.0)
+
+    grad_fn = vmap(grad(loss), randomness="different")
+
+    def expand(t, like):
+        return t.view(n_clients, *([1] * (like.dim() - 1)))
+
+    # The dropout masks come from a stream of their own (see the module docstring)
+    dropout_seed = np.random.SeedSequence([seed, round, *(c.index for c in clients)])
+    with torch.random.fork_rng(devices=[]):
+        torch.default_generator.manual_seed(int(dropout_seed.generate_state(1)[0]))
+        for step in range(n_steps):
+            grads = grad_fn(stacked, X[:, step], y[:, step], mask[:, step])
+
+            if (clipping > 0).any():
+                # Same as torch.nn.utils.clip_grad_norm_ over all the client's parameters
+                norms = torch.sqrt(sum(g.pow(2).flatten(1).sum(1) for g in grads.values()))
+                coef = torch.clamp(clipping / (norms + 1e-6), max=1.0)
+                coef = torch.where(clipping > 0, coef, torch.ones_like(coef))
+                grads = {name: g * expand(coef, g) for name, g in grads.items()}
+
+            on = active[:, step]
+            for name, p in stacked.items():
+                g = grads[name] + expand(weight_decay, p) * p
+                buf = expand(momentum, p) * momenta[name] + g
+                new_p = p - expand(lr, p) * buf
+                keep = expand(on, p)
+                momenta[name] = torch.where(keep, buf, momenta[name])
+                stacked[name] = torch.where(keep, new_p, p)
+
+    states = {}
+    for i, client in enumerate(clients):
+        if momentum[i] != 0:
+            momentum_buffers[client.index] = {name: m[i].clone() for name, m in momenta.items()}
+        state = {name: stacked[name][i] for name in params}
+        state.update(buffers)
+        states[client.index] = {name: state[name] for name in model.state_dict()}
+    return states
+
+
+class VmapRoundsMixin(ParallelRoundsMixin):
+    """Server mixin training the selected clients of a round with `train_clients_vmap`.
+
+    Rounds where a client is not supported (see `supports_vmap`) fall back to
+    the seeded per-client executor of `ParallelRoundsMixin` (in-process, or on
+    ``client_workers`` processes).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._momentum_buffers: Dict[int, Dict[str, torch.Tensor]] = {}
+
+    def _train_clients(self, round: int, eligible: Sequence[Client]) -> None:
+        if not all(supports_vmap(client) for client in eligible):
+            return super()._train_clients(round, eligible)
+
+        states = train_clients_vmap(
+            self.model, eligible, round, FlukeENV().get_seed(), self._momentum_buffers
+        )
+        self._send_client_models(round, eligible, states)
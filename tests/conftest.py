@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+N_ROWS = 600
+
+
+def _diabetes_rows(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """A small random table with the columns of ``diabetic_data.csv`` the loader uses."""
+    rng = np.random.default_rng(seed)
+    inpatient = rng.poisson(0.6, n_rows)
+    # Readmissions follow the previous inpatient visits, so there is something to learn
+    readmitted = np.where(
+        rng.random(n_rows) < 0.3 + 0.15 * np.minimum(inpatient, 3),
+        rng.choice(["<30", ">30"], n_rows),
+        "NO",
+    )
+    return pd.DataFrame(
+        {
+            "encounter_id": np.arange(n_rows),
+            "patient_nbr": rng.integers(0, 10**6, n_rows),
+            "race": rng.choice(["Caucasian", "AfricanAmerican", "Other", "?"], n_rows),
+            "gender": rng.choice(["Female", "Male"], n_rows),
+            "age": rng.choice([f"[{a}-{a + 10})" for a in range(0, 100, 10)], n_rows),
+            "admission_type_id": rng.integers(1, 4, n_rows),
+            "time_in_hospital": rng.integers(1, 14, n_rows),
+            "num_lab_procedures": rng.integers(1, 100, n_rows),
+            "num_medications": rng.integers(1, 40, n_rows),
+            "number_inpatient": inpatient,
+            "max_glu_serum": rng.choice(["None", ">200", "Norm"], n_rows),
+            "A1Cresult": rng.choice(["None", ">7", ">8", "Norm"], n_rows),
+            "metformin": rng.choice(["No", "Steady", "Up", "Down"], n_rows),
+            "insulin": rng.choice(["No", "Steady", "Up", "Down"], n_rows),
+            "change": rng.choice(["No", "Ch"], n_rows),
+            "diabetesMed": rng.choice(["No", "Yes"], n_rows),
+            "readmitted": readmitted,
+        }
+    )
+
+
+@pytest.fixture(scope="session")
+def diabetes_csv(tmp_path_factory):
+    """Path of a small CSV shaped like the Diabetes 130-US Hospitals data."""
+    path = tmp_path_factory.mktemp("data") / "diabetic_data.csv"
+    _diabetes_rows(N_ROWS).to_csv(path, index=False)
+    return path
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+import torch
+
+from src.aggregation import krum, krum_scores, median, trimmed_mean
+
+
+def _updates(n: int, size: int = 32, seed: int = 0) -> torch.Tensor:
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(n, size, dtype=torch.float64, generator=generator)
+
+
+@pytest.mark.parametrize("n, byzantine", [(5, 1), (9, 2), (12, 3)])
+def test_krum_scores_match_brute_force(n, byzantine):
+    updates = _updates(n)
+    scores = krum_scores(updates, byzantine)
+    for i in range(n):
+        distances = sorted(
+            float(((updates[i] - updates[j]) ** 2).sum()) for j in range(n) if j != i
+        )
+        expected = sum(distances[: n - byzantine - 2])
+        assert float(scores[i]) == pytest.approx(expected, rel=1e-9)
+
+
+def test_krum_ignores_outliers():
+    updates = _updates(10) * 0.1
+    updates[[2, 7]] += 100.0
+    weights = torch.full((10,), 0.1, dtype=torch.float64)
+    selected = krum(updates, weights, byzantine=2)
+    assert any(torch.equal(selected, updates[i]) for i in range(10) if i not in (2, 7))
+    averaged = krum(updates, weights, byzantine=2, multi_krum=3)
+    assert averaged.abs().max() < 1.0
+
+
+def test_krum_needs_enough_clients():
+    with pytest.raises(ValueError):
+        krum_scores(_updates(4), byzantine=2)
+
+
+@pytest.mark.parametrize("n, trim_ratio", [(10, 0.1), (10, 0.25), (7, 0.3), (5, 0.0)])
+def test_trimmed_mean_matches_sort(n, trim_ratio):
+    updates = _updates(n)
+    weights = torch.full((n,), 1 / n, dtype=torch.float64)
+    k = int(n * trim_ratio)
+    expected = updates.sort(dim=0).values[k : n - k].mean(dim=0)
+    result = trimmed_mean(updates, weights, trim_ratio=trim_ratio)
+    assert torch.allclose(result, expected, rtol=0, atol=1e-12)
+
+
+def test_trimmed_mean_cannot_trim_everything():
+    updates = _updates(4)
+    with pytest.raises(ValueError):
+        trimmed_mean(updates, torch.full((4,), 0.25, dtype=torch.float64), trim_ratio=0.5)
+
+
+@pytest.mark.parametrize("n", [5, 6])
+def test_median_matches_numpy(n):
+    updates = _updates(n)
+    weights = torch.full((n,), 1 / n, dtype=torch.float64)
+    expected = torch.from_numpy(np.median(updates.numpy(), axis=0))
+    assert torch.allclose(median(updates, weights), expected, rtol=0, atol=1e-12)
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+import src.dataset
+from src.cache import PreprocessingCache
+from src.dataset import load_and_preprocess_data
+
+
+def _arrays(n_rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return {
+        "X_train": rng.random((n_rows, 4), dtype=np.float32),
+        "X_test": rng.random((n_rows // 4, 4), dtype=np.float32),
+        "y_train": rng.integers(0, 2, n_rows),
+        "y_test": rng.integers(0, 2, n_rows // 4),
+    }
+
+
+def _age(cache: PreprocessingCache, key: str, seconds: float) -> None:
+    """Date the last access of ``key`` (the LRU clock is the metadata file's mtime)."""
+    meta = cache.cache_dir / key / "meta.json"
+    os.utime(meta, (seconds, seconds))
+
+
+def test_second_load_is_a_cache_hit(diabetes_csv, tmp_path, monkeypatch):
+    cache = PreprocessingCache(tmp_path)
+    first = load_and_preprocess_data(diabetes_csv, cache=cache)
+    assert len(cache.entries()) == 1
+
+    def preprocess(*args, **kwargs):
+        raise AssertionError("cache miss")
+
+    monkeypatch.setattr(src.dataset, "_preprocess", preprocess)
+    second = load_and_preprocess_data(diabetes_csv, cache=cache)
+    for expected, actual in zip(first, second):
+        assert np.array_equal(actual.numpy(), expected.numpy())
+
+
+def test_other_parameters_miss(diabetes_csv, tmp_path):
+    cache = PreprocessingCache(tmp_path)
+    load_and_preprocess_data(diabetes_csv, cache=cache, seed=1)
+    load_and_preprocess_data(diabetes_csv, cache=cache, seed=2)
+    assert len(cache.entries()) == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PreprocessingCache(tmp_path)
+    transformers = {"imputer": None, "scaler": None, "feature_names": []}
+    for i, key in enumerate(("a", "b")):
+        cache.put(key, _arrays(100, seed=i), transformers)
+        _age(cache, key, 1_000 + i)
+    entry_bytes = cache.entries()["a"]["bytes"]
+
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    cache.max_bytes = 2 * entry_bytes + entry_bytes // 2
+    cache.put("c", _arrays(100, seed=2), transformers)
+    assert set(cache.entries()) == {"a", "c"}
+
+
+def test_entry_just_written_is_kept_over_budget(tmp_path):
+    cache = PreprocessingCache(tmp_path, max_bytes=1)
+    transformers = {"imputer": None, "scaler": None, "feature_names": []}
+    cache.put("a", _arrays(100), transformers)
+    cache.put("b", _arrays(100), transformers)
+    assert set(cache.entries()) == {"b"}
+
+
+def test_corrupted_entry_is_a_miss(tmp_path):
+    cache = PreprocessingCache(tmp_path)
+    cache.put("a", _arrays(100), {"imputer": None, "scaler": None, "feature_names": []})
+    (tmp_path / "a" / "X_train.npy").write_bytes(b"not an array")
+    assert cache.get("a") is None
+    assert "a" not in cache
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_cached_arrays_round_trip(tmp_path, mmap):
+    cache = PreprocessingCache(tmp_path)
+    arrays = _arrays(100)
+    cache.put("a", arrays, {"imputer": None, "scaler": None, "feature_names": ["f"]})
+    entry = cache.get("a", mmap=mmap)
+    for name, array in arrays.items():
+        assert np.array_equal(entry[name], array)
+    assert entry["feature_names"] == ["f"]
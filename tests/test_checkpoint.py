@@ -0,0 +1,83 @@
+import torch
+
+from src.results import ResultsDB
+from src.simulation import run_experiment
+
+N_ROUNDS = 6
+
+
+def _run(diabetes_csv, tmp_path, name, **kwargs):
+    _, metrics = run_experiment(
+        n_clients=3,
+        n_rounds=N_ROUNDS,
+        batch_size=16,
+        seed=7,
+        data=dict(filepath=diabetes_csv, cache_dir=None, partition_dir=None),
+        # No rise of accuracy is worth 1.0: the run stops on a plateau after round 3
+        stopping=dict(patience=2, min_delta=1.0),
+        instrumentation=dict(results_db=tmp_path / "runs.sqlite"),
+        run_name=name,
+        **kwargs,
+    )
+    # Wall-clock timings differ from run to run
+    return {name: value for name, value in metrics.items() if not name.endswith("seconds")}
+
+
+def _recorded_rounds(tmp_path, name):
+    with ResultsDB(tmp_path / "runs.sqlite") as db:
+        rows = db.query(
+            "SELECT DISTINCT round FROM round_metrics JOIN runs USING (run_id)"
+            " WHERE runs.name = ? ORDER BY round",
+            name,
+        )
+    return [row["round"] for row in rows]
+
+
+def test_resumed_run_stops_like_an_uninterrupted_one(diabetes_csv, tmp_path):
+    checkpoint_dir = tmp_path / "checkpoints"
+    uninterrupted = _run(
+        diabetes_csv,
+        tmp_path,
+        "uninterrupted",
+        checkpoints=dict(checkpoint_dir=checkpoint_dir, keep_checkpoints=0),
+    )
+    assert uninterrupted["stop_reason"] == "plateau"
+    assert uninterrupted["rounds"] == 3
+
+    # Interrupted after round 2: the plateau started before the checkpoint
+    resumed = _run(
+        diabetes_csv,
+        tmp_path,
+        "resumed",
+        checkpoints=dict(resume_from=checkpoint_dir / "round_00002.pt"),
+    )
+    assert resumed == uninterrupted
+    assert _recorded_rounds(tmp_path, "resumed") == _recorded_rounds(tmp_path, "uninterrupted")
+
+
+def test_resumed_run_ends_with_the_same_model(diabetes_csv, tmp_path):
+    common = dict(
+        n_clients=3,
+        n_rounds=4,
+        batch_size=16,
+        seed=5,
+        eligible_perc=0.67,
+        data=dict(filepath=diabetes_csv, cache_dir=None, partition_dir=None),
+    )
+    checkpoint_dir = tmp_path / "checkpoints"
+    uninterrupted, _ = run_experiment(
+        **common, checkpoints=dict(checkpoint_dir=checkpoint_dir, keep_checkpoints=2)
+    )
+    # Only the keep_checkpoints most recent ones are left
+    assert sorted(path.name for path in checkpoint_dir.iterdir()) == [
+        "round_00003.pt",
+        "round_00004.pt",
+    ]
+
+    resumed, metrics = run_experiment(
+        **common, checkpoints=dict(resume_from=checkpoint_dir / "round_00003.pt")
+    )
+    assert metrics["rounds"] == 4
+    expected = uninterrupted.server.model.state_dict()
+    for name, value in resumed.server.model.state_dict().items():
+        assert torch.equal(value, expected[name])
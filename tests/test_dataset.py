@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import StandardScaler
+
+from src.cache import PreprocessingCache
+from src.dataset import (
+    SCALER_COLUMNS,
+    _csv_read_options,
+    _feature_row_mask,
+    _load_feature_matrix,
+    _read_header,
+    _split_hash,
+    _target_values,
+    load_and_preprocess_data,
+)
+
+SEED = 42
+TEST_SIZE = 0.2
+
+
+def _streamed(path, cache_dir, chunk_size):
+    cache = PreprocessingCache(cache_dir)
+    return [t.numpy() for t in load_and_preprocess_data(path, cache=cache, chunk_size=chunk_size)]
+
+
+@pytest.mark.parametrize("chunk_size", [7, 64])
+def test_streaming_does_not_depend_on_the_chunk_size(diabetes_csv, tmp_path, chunk_size):
+    # Separate caches: the streaming entry is shared by every chunk_size
+    whole = _streamed(diabetes_csv, tmp_path / "whole", chunk_size=100_000)
+    chunked = _streamed(diabetes_csv, tmp_path / "chunked", chunk_size=chunk_size)
+    for expected, actual in zip(whole, chunked):
+        assert expected.shape == actual.shape
+        # The scaler statistics are accumulated block by block
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-5)
+
+
+def test_streaming_matches_in_memory_preprocessing_of_the_same_split(diabetes_csv, tmp_path):
+    X_train, X_test, y_train, y_test = _streamed(diabetes_csv, tmp_path, chunk_size=50)
+
+    # The in-memory encoding, split like the streaming mode (hash of encounter_id)
+    X, y, feature_names = _load_feature_matrix(diabetes_csv)
+    df = pd.read_csv(diabetes_csv, **_csv_read_options(_read_header(diabetes_csv)))
+    rows = np.flatnonzero(_feature_row_mask(df) & (_target_values(df) >= 0))
+    keys = pd.read_csv(diabetes_csv, usecols=["encounter_id"])["encounter_id"].to_numpy()
+    is_test = _split_hash(keys[rows], SEED) < TEST_SIZE
+
+    imputer = SimpleImputer(strategy="mean").fit(X[~is_test])
+    expected_train, expected_test = imputer.transform(X[~is_test]), imputer.transform(X[is_test])
+    scaled = [feature_names.index(col) for col in SCALER_COLUMNS if col in feature_names]
+    scaler = StandardScaler().fit(expected_train[:, scaled])
+    expected_train[:, scaled] = scaler.transform(expected_train[:, scaled])
+    expected_test[:, scaled] = scaler.transform(expected_test[:, scaled])
+
+    np.testing.assert_allclose(X_train, expected_train, rtol=0, atol=1e-5)
+    np.testing.assert_allclose(X_test, expected_test, rtol=0, atol=1e-5)
+    np.testing.assert_array_equal(y_train, y[~is_test])
+    np.testing.assert_array_equal(y_test, y[is_test])
+
+
+def test_streaming_rejects_sample_size(diabetes_csv, tmp_path):
+    with pytest.raises(ValueError):
+        load_and_preprocess_data(
+            diabetes_csv, sample_size=100, cache=PreprocessingCache(tmp_path), chunk_size=50
+        )
@@ -0,0 +1,59 @@
+import pytest
+import torch
+from fluke.data import FastDataLoader
+
+from src.fairness.evaluator import FairnessEvaluator
+
+N_FEATURES = 6
+SIZES = [40, 75, 23]
+
+
+def _loader(X: torch.Tensor, y: torch.Tensor) -> FastDataLoader:
+    return FastDataLoader(X, y, num_labels=2, batch_size=16)
+
+
+def _client_data(seed: int = 0):
+    generator = torch.Generator().manual_seed(seed)
+    data = []
+    for size in SIZES:
+        X = torch.randn(size, N_FEATURES, generator=generator)
+        # Column 0 is the binary protected attribute
+        X[:, 0] = torch.randint(0, 2, (size,), generator=generator).float()
+        y = torch.randint(0, 2, (size,), generator=generator)
+        data.append((X, y))
+    return data
+
+
+def _evaluator() -> FairnessEvaluator:
+    return FairnessEvaluator(
+        eval_every=1, n_classes=2, protected_attr_index=0, sensitive_group_val=1
+    )
+
+
+def test_collection_gives_pooled_and_per_client_results():
+    torch.manual_seed(0)
+    model = torch.nn.Linear(N_FEATURES, 2)
+    data = _client_data()
+    loaders = [_loader(X, y) for X, y in data]
+    evaluator = _evaluator()
+
+    results = evaluator.evaluate(1, model, loaders, loss_fn=torch.nn.CrossEntropyLoss())
+    clients = results.pop("clients")
+    # The pooled loss averages the batch losses of every loader, not the concatenation's
+    results.pop("loss")
+
+    concatenated = _loader(torch.cat([X for X, _ in data]), torch.cat([y for _, y in data]))
+    assert results == pytest.approx(evaluator.evaluate(1, model, concatenated))
+
+    assert len(clients) == len(loaders)
+    for client, loader in zip(clients, loaders):
+        single = evaluator.evaluate(1, model, loader, loss_fn=torch.nn.CrossEntropyLoss())
+        assert client == pytest.approx(single)
+
+
+def test_single_loader_results_stay_flat():
+    model = torch.nn.Linear(N_FEATURES, 2)
+    X, y = _client_data()[0]
+    results = _evaluator().evaluate(1, model, _loader(X, y))
+    assert "clients" not in results
+    assert all(isinstance(value, float) for value in results.values())
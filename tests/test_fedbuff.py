@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+import torch
+from fluke import DDict
+
+from src.fedbuff import FedBuffMixin
+
+
+def _server(rounds: int, lr: float, staleness_exponent: float):
+    torch.manual_seed(0)
+    return SimpleNamespace(
+        model=torch.nn.Linear(4, 2),
+        hyper_params=DDict(lr=lr),
+        rounds=rounds,
+        staleness_exponent=staleness_exponent,
+    )
+
+
+def _update(server, version: int, seed: int):
+    generator = torch.Generator().manual_seed(seed)
+    delta = [torch.randn(p.shape, generator=generator) for p in server.model.parameters()]
+    return version, delta, server.model
+
+
+@pytest.mark.parametrize("staleness_exponent", [0.0, 0.5, 1.0])
+def test_updates_are_discounted_by_their_staleness(staleness_exponent):
+    server = _server(rounds=6, lr=0.8, staleness_exponent=staleness_exponent)
+    before = [p.detach().clone() for p in server.model.parameters()]
+    # Staleness 0, 2 and 5 server steps
+    updates = [_update(server, version, seed) for seed, version in enumerate((6, 4, 1))]
+
+    FedBuffMixin._apply(server, updates)
+
+    for i, p in enumerate(server.model.parameters()):
+        expected = before[i] + 0.8 / 3 * sum(
+            (1 + 6 - version) ** -staleness_exponent * delta[i] for version, delta, _ in updates
+        )
+        assert torch.allclose(p, expected, rtol=0, atol=1e-6)
+
+
+def test_fresh_updates_are_averaged():
+    server = _server(rounds=2, lr=1.0, staleness_exponent=0.5)
+    before = [p.detach().clone() for p in server.model.parameters()]
+    updates = [_update(server, 2, seed) for seed in range(4)]
+
+    FedBuffMixin._apply(server, updates)
+
+    for i, p in enumerate(server.model.parameters()):
+        mean = torch.stack([delta[i] for _, delta, _ in updates]).mean(dim=0)
+        assert torch.allclose(p, before[i] + mean, rtol=0, atol=1e-6)
@@ -0,0 +1,35 @@
+import pytest
+import torch
+
+from src.simulation import run_experiment
+
+
+@pytest.fixture
+def one_thread():
+    # Parallel and sequential runs only match with the same number of torch threads
+    previous = torch.get_num_threads()
+    torch.set_num_threads(1)
+    yield
+    torch.set_num_threads(previous)
+
+
+def _run(diabetes_csv, client_workers):
+    algo, metrics = run_experiment(
+        n_clients=4,
+        n_rounds=3,
+        batch_size=16,
+        seed=9,
+        eligible_perc=0.75,
+        data=dict(filepath=diabetes_csv, cache_dir=None, partition_dir=None),
+        server=dict(client_workers=client_workers, threads_per_worker=1),
+    )
+    metrics = {name: value for name, value in metrics.items() if not name.endswith("seconds")}
+    return algo.server.model.state_dict(), metrics
+
+
+def test_worker_processes_match_the_in_process_run(diabetes_csv, one_thread):
+    sequential_model, sequential_metrics = _run(diabetes_csv, client_workers=0)
+    parallel_model, parallel_metrics = _run(diabetes_csv, client_workers=2)
+    assert parallel_metrics == sequential_metrics
+    for name, value in parallel_model.items():
+        assert torch.equal(value, sequential_model[name])
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from src.partition import partition
+
+N_ROWS = 2000
+N_CLIENTS = 10
+
+
+def _labels(n_rows: int = N_ROWS, n_classes: int = 3, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, n_classes, size=n_rows)
+
+
+def _check_rows(parts, n_rows: int, client_split: float = 0.2) -> None:
+    """Every row goes to exactly one client, and client_split of each client's rows to its test set."""
+    rows = np.concatenate([parts.train_rows, parts.test_rows])
+    assert np.array_equal(np.sort(rows), np.arange(n_rows))
+    for client in range(parts.n_clients):
+        n = len(parts.train(client)) + len(parts.test(client))
+        assert len(parts.test(client)) == int(np.floor(n * client_split))
+
+
+@pytest.mark.parametrize("distribution", ["iid", "dir", "qnt"])
+def test_partition_covers_every_row_once(distribution):
+    parts = partition(_labels(), N_CLIENTS, distribution, seed=1)
+    assert parts.n_clients == N_CLIENTS
+    _check_rows(parts, N_ROWS)
+
+
+@pytest.mark.parametrize("distribution", ["iid", "dir", "qnt"])
+def test_partition_depends_on_the_seed_only(distribution):
+    labels = _labels()
+    a = partition(labels, N_CLIENTS, distribution, seed=1)
+    b = partition(labels, N_CLIENTS, distribution, seed=1)
+    c = partition(labels, N_CLIENTS, distribution, seed=2)
+    assert np.array_equal(a.train_rows, b.train_rows)
+    assert np.array_equal(a.test_rows, b.test_rows)
+    assert not np.array_equal(a.train_rows, c.train_rows)
+
+
+def test_iid_sizes_differ_by_at_most_one():
+    sizes = partition(_labels(), N_CLIENTS, "iid", seed=1).sizes()
+    assert sizes.max() - sizes.min() <= 1
+
+
+def test_dir_gives_every_client_min_ex_class_of_every_class():
+    labels = _labels()
+    parts = partition(labels, N_CLIENTS, "dir", seed=1, beta=0.1, min_ex_class=2)
+    for client in range(N_CLIENTS):
+        rows = np.concatenate([parts.train(client), parts.test(client)])
+        assert (np.bincount(labels[rows], minlength=3) >= 2).all()
+
+
+def test_qnt_gives_every_client_min_quantity():
+    parts = partition(_labels(), N_CLIENTS, "qnt", seed=1, min_quantity=20)
+    assert parts.sizes().min() >= 20
+
+
+def test_natural_keeps_each_group_on_one_client():
+    groups = np.random.default_rng(0).integers(0, 25, size=N_ROWS)
+    parts = partition(_labels(), N_CLIENTS, "natural", seed=1, groups=groups)
+    _check_rows(parts, N_ROWS)
+    seen = set()
+    for client in range(N_CLIENTS):
+        rows = np.concatenate([parts.train(client), parts.test(client)])
+        assert set(np.unique(groups[rows]).tolist()) == set(parts.groups[client])
+        assert seen.isdisjoint(parts.groups[client])
+        seen.update(parts.groups[client])
+    assert seen == set(range(25))
+
+
+def test_natural_needs_enough_groups():
+    groups = np.arange(N_ROWS) % 5
+    with pytest.raises(ValueError):
+        partition(_labels(), N_CLIENTS, "natural", groups=groups)
+
+
+def test_unknown_distribution():
+    with pytest.raises(ValueError):
+        partition(_labels(), N_CLIENTS, "pathological")
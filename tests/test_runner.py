@@ -0,0 +1,24 @@
+from src.runner import Scenario, run_scenarios
+
+
+def _metrics(result):
+    # Wall-clock timings differ from run to run
+    return {name: value for name, value in result.metrics.items() if not name.endswith("seconds")}
+
+
+def test_in_process_and_pool_runs_match(diabetes_csv):
+    scenario = Scenario(
+        name="fedavg",
+        title="FedAVG",
+        params=dict(
+            n_clients=3,
+            n_rounds=2,
+            batch_size=16,
+            seed=3,
+            data=dict(filepath=diabetes_csv, cache_dir=None, partition_dir=None),
+        ),
+    )
+    # The same thread count in both runs (see the runner module docstring)
+    [in_process] = run_scenarios([scenario], workers=1, threads_per_worker=1)
+    [pooled] = run_scenarios([scenario], workers=2, threads_per_worker=1)
+    assert _metrics(in_process) == _metrics(pooled)
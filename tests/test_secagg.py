@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+import torch
+
+from src.secagg import mask_pairs, mask_updates, unmask_sum
+
+N_CLIENTS = 8
+SIZE = 1000
+# Small blocks, so the masks are expanded over several blocks
+BLOCK_SIZE = 4096
+
+
+def _key_agreement(n: int, neighbours, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    first, second = mask_pairs(n, neighbours, rng)
+    high = np.iinfo(np.uint64).max
+    pair_seeds = rng.integers(0, high, size=len(first), dtype=np.uint64, endpoint=True)
+    self_seeds = rng.integers(0, high, size=n, dtype=np.uint64, endpoint=True)
+    return first, second, pair_seeds, self_seeds
+
+
+def _alive(n: int, dropped) -> np.ndarray:
+    alive = np.ones(n, dtype=bool)
+    alive[list(dropped)] = False
+    return alive
+
+
+@pytest.mark.parametrize("neighbours", [None, 2, 4])
+@pytest.mark.parametrize("dropped", [(), (1,), (0, 3, 5)])
+def test_unmasked_sum_is_the_survivors_sum(neighbours, dropped):
+    generator = torch.Generator().manual_seed(0)
+    # Large values: the sum wraps around modulo 2**64, as the masked one does
+    updates = torch.randint(-(2**62), 2**62, (N_CLIENTS, SIZE), generator=generator)
+    first, second, pair_seeds, self_seeds = _key_agreement(N_CLIENTS, neighbours)
+
+    masked = updates.clone()
+    mask_updates(masked, self_seeds, first, second, pair_seeds, BLOCK_SIZE)
+    assert (masked != updates).all()
+
+    alive = _alive(N_CLIENTS, dropped)
+    total = unmask_sum(masked, alive, self_seeds, first, second, pair_seeds, BLOCK_SIZE)
+    assert torch.equal(total[0], updates[torch.from_numpy(alive)].sum(dim=0))
+
+
+def test_ring_pairs_give_every_client_its_neighbours():
+    first, second = mask_pairs(N_CLIENTS, 4, np.random.default_rng(0))
+    assert len(first) == N_CLIENTS * 4 // 2
+    degree = np.bincount(np.concatenate([first, second]), minlength=N_CLIENTS)
+    assert (degree == 4).all()
+
+
+def test_fixed_point_average_matches_fedavg():
+    precision = 32
+    scale = 2.0**precision
+    generator = torch.Generator().manual_seed(1)
+    updates = torch.randn(N_CLIENTS, SIZE, dtype=torch.float64, generator=generator)
+    weights = torch.rand(N_CLIENTS, dtype=torch.float64, generator=generator)
+    weights /= weights.sum()
+
+    # Encoded as SecAggServer.aggregate does
+    masked = (updates * weights[:, None] * scale).round().to(torch.int64)
+    first, second, pair_seeds, self_seeds = _key_agreement(N_CLIENTS, None)
+    mask_updates(masked, self_seeds, first, second, pair_seeds, BLOCK_SIZE)
+
+    alive = _alive(N_CLIENTS, (2,))
+    total = unmask_sum(masked, alive, self_seeds, first, second, pair_seeds, BLOCK_SIZE)
+    kept = torch.from_numpy(alive)
+    weight = weights[kept].sum()
+    average = total[0].to(torch.float64) / (scale * weight)
+
+    expected = weights[kept] @ updates[kept] / weight
+    # Each encoded value is off by at most half a unit in the last place
+    assert torch.allclose(average, expected, rtol=0, atol=N_CLIENTS / (2 * scale * weight))
@@ -0,0 +1,115 @@
+from types import SimpleNamespace
+
+import pytest
+from fluke.server import EarlyStopping
+
+import src.stopping
+from src.stopping import EarlyStopper, TargetTracker
+
+
+def _evaluate(stopper, round: int, value: float, metric: str = "accuracy") -> None:
+    stopper.start_round(round, global_model=None)
+    stopper.server_evaluation(round, "global", {metric: value})
+    stopper.end_round(round)
+
+
+def _run(stopper, values):
+    """Feed one global evaluation per round; returns the round that was refused."""
+    for round, value in enumerate(values, start=1):
+        _evaluate(stopper, round, value)
+    try:
+        stopper.start_round(len(values) + 1, global_model=None)
+    except EarlyStopping:
+        return len(values) + 1
+    return None
+
+
+def test_target_tracker_records_the_first_round_reaching_it():
+    tracker = TargetTracker(0.7)
+    for round, value in enumerate([0.5, 0.72, 0.65, 0.8], start=1):
+        tracker.server_evaluation(round, "global", {"accuracy": value})
+    assert tracker.round == 2
+
+
+def test_target_tracker_ignores_local_evaluations():
+    tracker = TargetTracker(0.7)
+    tracker.server_evaluation(1, "locals", {"accuracy": 0.9})
+    assert tracker.round is None
+
+
+def test_target_stops_at_the_next_round():
+    stopper = EarlyStopper(target=0.7)
+    with pytest.raises(EarlyStopping):
+        for round, value in enumerate([0.5, 0.6, 0.75, 0.8], start=1):
+            _evaluate(stopper, round, value)
+    assert stopper.summary()["rounds_to_target"] == 3
+    assert stopper.summary()["stop_reason"] == "target"
+
+
+def test_target_is_only_recorded_without_stop_at_target():
+    stopper = EarlyStopper(target=0.7, stop_at_target=False)
+    assert _run(stopper, [0.5, 0.75, 0.8]) is None
+    assert stopper.summary()["rounds_to_target"] == 2
+    assert "stop_reason" not in stopper.summary()
+
+
+def test_lower_is_better_target():
+    stopper = EarlyStopper(target=0.3, metric="loss", higher_is_better=False)
+    stopper.server_evaluation(1, "global", {"loss": 0.5})
+    stopper.server_evaluation(2, "global", {"loss": 0.25})
+    assert stopper.round == 2
+
+
+@pytest.mark.parametrize(
+    "values, min_delta, stopped",
+    [
+        # Best at round 2, no improvement in rounds 3 and 4
+        ([0.5, 0.6, 0.59, 0.6], 0.0, 5),
+        # The improvements of round 3 and 4 are below min_delta
+        ([0.5, 0.6, 0.605, 0.61], 0.02, 5),
+        # Still improving
+        ([0.5, 0.6, 0.65, 0.7], 0.0, None),
+    ],
+)
+def test_plateau_stops_after_patience_rounds(values, min_delta, stopped):
+    stopper = EarlyStopper(patience=2, min_delta=min_delta)
+    assert _run(stopper, values) == stopped
+    assert stopper.summary().get("stop_reason") == ("plateau" if stopped else None)
+
+
+def test_time_budget(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(src.stopping.time, "perf_counter", lambda: now[0])
+    stopper = EarlyStopper(max_seconds=10.0)
+    stopper.start_round(1, global_model=None)
+    now[0] += 9.0
+    stopper.start_round(2, global_model=None)
+    now[0] += 1.0
+    with pytest.raises(EarlyStopping):
+        stopper.start_round(3, global_model=None)
+    assert stopper.summary()["stop_reason"] == "time_budget"
+
+
+def test_client_work_is_counted():
+    stopper = EarlyStopper()
+    clients = [
+        SimpleNamespace(
+            train_set=SimpleNamespace(size=size), hyper_params=SimpleNamespace(local_epochs=2)
+        )
+        for size in (10, 30)
+    ]
+    stopper.selected_clients(1, clients)
+    stopper.selected_clients(2, clients[:1])
+    assert stopper.summary() == {"client_updates": 3, "client_samples": 100}
+
+
+def test_state_dict_round_trip():
+    stopper = EarlyStopper(patience=2)
+    _run(stopper, [0.5, 0.6, 0.59])
+    resumed = EarlyStopper(patience=2)
+    resumed.load_state_dict(stopper.state_dict())
+    # The plateau started before the state was saved
+    with pytest.raises(EarlyStopping):
+        _evaluate(resumed, 4, 0.6)
+        resumed.start_round(5, global_model=None)
+    assert resumed.summary()["stop_reason"] == "plateau"
@@ -0,0 +1,68 @@
+import copy
+
+import torch
+from fluke import DDict
+from fluke.client import Client
+from fluke.config import OptimizerConfigurator
+from fluke.data import FastDataLoader
+
+from src.models import BinaryClassifier
+from src.parallel import seeded_local_update
+from src.vmap_engine import supports_vmap, train_clients_vmap
+
+N_FEATURES = 8
+SIZES = [37, 64, 50]
+SEED = 11
+ROUND = 3
+
+
+def _clients():
+    generator = torch.Generator().manual_seed(0)
+    clients = []
+    for index, size in enumerate(SIZES):
+        X = torch.randn(size, N_FEATURES, generator=generator)
+        y = torch.randint(0, 2, (size,), generator=generator)
+        clients.append(
+            Client(
+                index=index,
+                train_set=FastDataLoader(X, y, num_labels=2, batch_size=16, shuffle=True),
+                test_set=None,
+                optimizer_cfg=OptimizerConfigurator(DDict(name="SGD", lr=0.05, momentum=0.9)),
+                loss_fn=torch.nn.CrossEntropyLoss(),
+                local_epochs=2,
+                clipping=1.0,
+            )
+        )
+    return clients
+
+
+def _model(dropout: float) -> torch.nn.Module:
+    torch.manual_seed(0)
+    return BinaryClassifier(input_dim=N_FEATURES, dropout=dropout)
+
+
+def test_vmap_matches_the_per_client_loop_without_dropout():
+    model = _model(dropout=0.0)
+    clients = _clients()
+    assert all(supports_vmap(client) for client in clients)
+    states = train_clients_vmap(model, clients, ROUND, SEED, momentum_buffers={})
+
+    for client in _clients():
+        client.model = copy.deepcopy(model)
+        seeded_local_update(client, ROUND, SEED, lambda round: client.fit())
+        for name, value in client.model.state_dict().items():
+            assert torch.allclose(states[client.index][name], value, rtol=0, atol=1e-5)
+
+
+def test_vmap_dropout_leaves_the_global_rng_alone():
+    model = _model(dropout=0.3)
+    torch.manual_seed(5)
+    before = torch.get_rng_state()
+    first = train_clients_vmap(model, _clients(), ROUND, SEED, momentum_buffers={})
+    assert torch.equal(torch.get_rng_state(), before)
+
+    # The masks only depend on the seed, the round and the clients
+    second = train_clients_vmap(model, _clients(), ROUND, SEED, momentum_buffers={})
+    for index, state in first.items():
+        for name, value in state.items():
+            assert torch.equal(second[index][name], value)